@@ -7,14 +7,17 @@
 
 from __future__ import print_function
 
+import itertools
 import os
 import shutil
+import stat
 import filecmp
+from multiprocessing.pool import ThreadPool
 
 from llnl.util.filesystem import traverse_tree, mkdirp, touch
 import llnl.util.tty as tty
 
-__all__ = ['LinkTree']
+__all__ = ['LinkTree', 'LinkPlan']
 
 empty_file_name = '.spack-empty'
 
@@ -131,26 +134,27 @@ def merge(self, dest_root, ignore_conflicts=False, ignore=None,
             (default False)
 
         """
-        if ignore is None:
-            ignore = lambda x: False
-
-        conflict = self.find_conflict(
-            dest_root, ignore=ignore, ignore_file_conflicts=ignore_conflicts)
-        if conflict:
-            raise MergeConflictError(conflict)
-
-        self.merge_directories(dest_root, ignore)
-        existing = []
-        for src, dst in self.get_file_map(dest_root, ignore).items():
-            if os.path.exists(dst):
-                existing.append(dst)
-            elif relative:
-                abs_src = os.path.abspath(src)
-                dst_dir = os.path.dirname(os.path.abspath(dst))
-                rel = os.path.relpath(abs_src, dst_dir)
-                link(rel, dst)
-            else:
-                link(src, dst)
+        with LinkPlan() as plan:
+            merge_map, = plan.add_trees([(self._root, dest_root, ignore)])
+            existing = plan.check_destination()
+
+            conflicts = list(plan.conflicts)
+            if not ignore_conflicts:
+                conflicts.extend(
+                    dst for dst in merge_map.values() if dst in existing)
+            if conflicts:
+                raise MergeConflictError(conflicts[0])
+
+            plan.make_directories()
+            links = []
+            for src, dst in merge_map.items():
+                if dst in existing:
+                    continue
+                if relative:
+                    dst_dir = os.path.dirname(os.path.abspath(dst))
+                    src = os.path.relpath(os.path.abspath(src), dst_dir)
+                links.append((src, dst))
+            plan.link_files(links, link)
 
         for c in existing:
             tty.warn("Could not merge: %s" % c)
@@ -168,6 +172,219 @@ def unmerge(self, dest_root, ignore=None, remove_file=remove_link):
         self.unmerge_directories(dest_root, ignore)
 
 
+class LinkPlan(object):
+    """Plan to merge several source trees into one destination.
+
+    Each source tree is walked once, and the directories and links of all
+    trees are checked against each other and against the destination at
+    once. The plan then creates them with a pool of ``jobs`` threads.
+    Use it as a context manager, so the threads are stopped when done::
+
+        with LinkPlan(jobs=8) as plan:
+            merge_maps = plan.add_trees(trees)
+            existing = plan.check_destination()
+            if plan.conflicts:
+                raise MergeConflictError(plan.conflicts[0])
+            plan.make_directories()
+            plan.link_files(links)
+    """
+    def __init__(self, jobs=1):
+        self.jobs = jobs
+        self._pool = None
+
+        #: Destination directories, parents first
+        self.directories = []
+        #: Destination directories of each tree, parents first
+        self.tree_directories = []
+        #: Destination files, mapped to the source of the first tree with it
+        self.files = {}
+        #: Destination files that are in more than one tree
+        self.duplicates = []
+        #: Directories that are blocked by files, in the plan or in the
+        #: destination, and files that are blocked by directories
+        self.conflicts = []
+
+        self._directory_set = set()
+        self._missing = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+    def map(self, function, items):
+        """Call ``function`` on all the ``items``, ``jobs`` at a time."""
+        items = list(items)
+        if self.jobs <= 1 or len(items) <= 1:
+            return [function(item) for item in items]
+        if self._pool is None:
+            self._pool = ThreadPool(self.jobs)
+        return self._pool.map(function, items)
+
+    def add_trees(self, trees):
+        """Add source trees to the plan.
+
+        Arguments:
+            trees (list): ``(source_root, dest_root, ignore)`` tuples, where
+                ``ignore`` is a callable that returns True for paths
+                relative to ``source_root`` which are not merged, or None
+
+        Returns:
+            (list): a ``{source file: destination file}`` dictionary for
+                each tree
+        """
+        walked = self.map(lambda tree: walk_tree(*tree), trees)
+
+        merge_maps = []
+        for directories, files in walked:
+            self.tree_directories.append([dst for src, dst in directories])
+            for src, dst in directories:
+                if dst in self.files:
+                    self.conflicts.append("File blocks directory: %s" % dst)
+                elif dst not in self._directory_set:
+                    self._directory_set.add(dst)
+                    self.directories.append(dst)
+
+            merge_map = {}
+            for src, dst in files:
+                merge_map[src] = dst
+                if dst in self._directory_set:
+                    self.conflicts.append("Directory blocks file: %s" % dst)
+                elif dst in self.files:
+                    self.duplicates.append(dst)
+                else:
+                    self.files[dst] = src
+            merge_maps.append(merge_map)
+        return merge_maps
+
+    def check_destination(self):
+        """Find the planned paths that are in the destination already.
+
+        Paths in directories that are missing from the destination are
+        not looked up. Directories that are blocked by files, and files
+        that are blocked by directories, are added to ``conflicts``.
+
+        Returns:
+            (set): the planned files that exist in the destination
+        """
+        self._missing = set()
+        existing = set()
+
+        paths = sorted(itertools.chain(self.directories, self.files),
+                       key=_depth)
+        for _, level in itertools.groupby(paths, key=_depth):
+            to_check = []
+            for path in level:
+                if os.path.dirname(path) not in self._missing:
+                    to_check.append(path)
+                elif path in self._directory_set:
+                    self._missing.add(path)
+
+            found = self.map(_path_kind, to_check)
+            for path, kind in zip(to_check, found):
+                if path in self._directory_set:
+                    if kind is None:
+                        self._missing.add(path)
+                    elif kind != 'directory':
+                        self.conflicts.append(
+                            "File blocks directory: %s" % path)
+                elif kind == 'directory':
+                    self.conflicts.append(
+                        "Directory blocks file: %s" % path)
+                elif kind is not None:
+                    existing.add(path)
+        return existing
+
+    def make_directories(self):
+        """Create the planned directories that don't exist, and mark the
+        empty ones that do so they aren't removed on unmerge."""
+        if self._missing is None:
+            self.check_destination()
+
+        # Mark the empty directories before any are filled with new ones
+        existing = [d for d in self.directories if d not in self._missing]
+        self.map(_mark_if_empty, existing)
+
+        missing = sorted((d for d in self.directories if d in self._missing),
+                         key=_depth)
+        for _, level in itertools.groupby(missing, key=_depth):
+            self.map(mkdirp, level)
+
+    def link_files(self, links, link=os.symlink):
+        """Create the ``(source, destination, ...)`` links with ``link``,
+        which is called with the items of each link."""
+        self.map(lambda args: link(*args), links)
+
+
+def walk_tree(source_root, dest_root, ignore=None):
+    """Walk a source tree once, like ``traverse_tree``.
+
+    Links to directories are not followed, and count as directories.
+
+    Returns:
+        (tuple): two lists of ``(source, destination)`` pairs, for the
+            directories (parents first) and for the files of the tree
+    """
+    ignore = ignore or (lambda filename: False)
+    directories, files = [], []
+
+    stack = ['']
+    while stack:
+        rel_path = stack.pop()
+        if ignore(rel_path):
+            continue
+        source_path = os.path.join(source_root, rel_path).rstrip(os.sep)
+        dest_path = os.path.join(dest_root, rel_path).rstrip(os.sep)
+        directories.append((source_path, dest_path))
+
+        subdirs = []
+        for name, is_dir, is_link in _list_dir(source_path):
+            rel_child = os.path.join(rel_path, name)
+            if is_dir and not is_link:
+                subdirs.append(rel_child)
+            elif not ignore(rel_child):
+                pair = (os.path.join(source_path, name),
+                        os.path.join(dest_path, name))
+                (directories if is_dir else files).append(pair)
+        stack.extend(reversed(subdirs))
+    return directories, files
+
+
+def _list_dir(path):
+    """Names in a directory, with whether they are a directory (following
+    links) and whether they are a link."""
+    if hasattr(os, 'scandir'):
+        for entry in os.scandir(path):
+            yield entry.name, entry.is_dir(), entry.is_symlink()
+        return
+
+    for name in os.listdir(path):
+        child = os.path.join(path, name)
+        mode = os.lstat(child).st_mode
+        is_link = stat.S_ISLNK(mode)
+        is_dir = os.path.isdir(child) if is_link else stat.S_ISDIR(mode)
+        yield name, is_dir, is_link
+
+
+def _depth(path):
+    return path.count(os.sep)
+
+
+def _path_kind(path):
+    if not os.path.exists(path):
+        return None
+    return 'directory' if os.path.isdir(path) else 'file'
+
+
+def _mark_if_empty(path):
+    if not os.listdir(path):
+        touch(os.path.join(path, empty_file_name))
+
+
 class MergeConflictError(Exception):
 
     def __init__(self, path):
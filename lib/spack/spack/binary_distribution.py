@@ -10,6 +10,9 @@
 import shutil
 import tempfile
 import hashlib
+import gzip
+import multiprocessing.pool
+import zlib
 from contextlib import closing
 import ruamel.yaml as yaml
 
@@ -20,13 +23,17 @@
 import llnl.util.tty as tty
 from llnl.util.filesystem import mkdirp, install_tree
 
+import spack.caches
 import spack.cmd
 import spack.config as config
 import spack.fetch_strategy as fs
 import spack.util.gpg as gpg_util
 import spack.relocate as relocate
+import spack.util.spack_json as sjson
 import spack.util.spack_yaml as syaml
 import spack.mirror
+import spack.stage
+import spack.util.compression
 import spack.util.url as url_util
 import spack.util.web as web_util
 
@@ -37,6 +44,18 @@
 
 _build_cache_relative_path = 'build_cache'
 
+#: Name of the compressed JSON index of all specs in a build cache
+_build_cache_index_name = 'index.json.gz'
+
+#: Version of the JSON index format; bump on incompatible changes
+_build_cache_index_version = 1
+
+#: Directory of the build cache holding content-addressed file blobs
+_build_cache_blobs_path = 'blobs'
+
+#: Version of the blob manifest format; bump on incompatible changes
+_blob_manifest_version = 1
+
 BUILD_CACHE_INDEX_TEMPLATE = '''
 <html>
 <head>
@@ -110,6 +129,13 @@ class NewLayoutException(spack.error.SpackError):
     pass
 
 
+class UnsafeBlobManifestError(spack.error.SpackError):
+    """
+    Raised if a blob manifest has paths outside of the prefix.
+    """
+    pass
+
+
 def has_gnupg2():
     try:
         gpg_util.Gpg.gpg()('--version', output=os.devnull)
@@ -229,6 +255,33 @@ def tarball_path_name(spec, ext):
                         tarball_name(spec, ext))
 
 
+class _HashingWriter(object):
+    """Wraps a file open for writing and computes the sha256 of all the
+    data written through it, so files needn't be read back to checksum
+    them."""
+
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+        self.hasher = hashlib.sha256()
+
+    def write(self, data):
+        self.hasher.update(data)
+        return self._fileobj.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._fileobj, name)
+
+
+def _extract_with_checksum(tar, member, path):
+    """Extract a regular file from an open tar archive to ``path`` and
+    return its sha256 checksum."""
+    with closing(tar.extractfile(member)) as src:
+        with open(path, 'wb') as dst:
+            writer = _HashingWriter(dst)
+            shutil.copyfileobj(src, writer, 65536)
+    return writer.hasher.hexdigest()
+
+
 def checksum_tarball(file):
     # calculate sha256 hash of tar file
     block_size = 65536
@@ -267,21 +320,182 @@ def sign_tarball(key, force, specfile_path):
     Gpg.sign(key, specfile_path, '%s.asc' % specfile_path)
 
 
-def generate_package_index(cache_prefix):
-    """Create the build cache index page.
+def _load_spec_index(data):
+    """Decode the contents of a compressed build cache index.
+
+    Returns the index dictionary, or ``None`` if the index was written in
+    a format this version of Spack does not understand.
+    """
+    text = zlib.decompress(data, 16 + zlib.MAX_WBITS).decode('utf-8')
+    index = sjson.load(text).get('buildcache_index', {})
+    if index.get('version') != _build_cache_index_version:
+        tty.debug('Ignoring build cache index with version {0}'.format(
+            index.get('version')))
+        return None
+    return index
+
+
+def _index_cache_key(index_url):
+    """Key of the ``misc_cache`` entry holding a copy of a remote index."""
+    url_hash = hashlib.sha1(index_url.encode('utf-8')).hexdigest()
+    return os.path.join('buildcache', 'index-%s.json' % url_hash)
+
+
+def read_spec_index(cache_prefix, force=False):
+    """Read the JSON index of the build cache at ``cache_prefix``.
+
+    Indices of remote build caches are kept in the ``misc_cache`` along
+    with their ETag, so that an unchanged index costs a single conditional
+    request.  Set ``force`` to ignore the cached copy.
+
+    Returns the index dictionary, which maps the name of each
+    ``.spec.yaml`` file to its ``spec`` nodes and ``full_hash``, or
+    ``None`` if the build cache has no (usable) index.
+    """
+    index_url = url_util.join(cache_prefix, _build_cache_index_name)
+
+    local_path = url_util.local_file_path(index_url)
+    if local_path:
+        if not os.path.exists(local_path):
+            return None
+        with open(local_path, 'rb') as f:
+            return _load_spec_index(f.read())
+
+    cache = spack.caches.misc_cache
+    cache_key = _index_cache_key(index_url)
+    cached = None
+    if not force and cache.init_entry(cache_key):
+        with cache.read_transaction(cache_key) as f:
+            cached = sjson.load(f)
+
+    headers = {}
+    if cached and cached.get('etag'):
+        headers['If-None-Match'] = cached['etag']
+
+    try:
+        _, response_headers, response = web_util.read_from_url(
+            index_url, headers=headers)
+    except (URLError, web_util.SpackWebError) as e:
+        tty.debug('No build cache index at {0}: {1}'.format(
+            url_util.format(index_url), e))
+        return None
+
+    if response is None:
+        tty.debug('Build cache index at {0} is unchanged'.format(
+            url_util.format(index_url)))
+        return cached['index']
+
+    index = _load_spec_index(response.read())
+    if index is None:
+        return None
+
+    try:
+        etag = web_util.get_header(response_headers, 'ETag')
+    except KeyError:
+        etag = None
+
+    cache.init_entry(cache_key)
+    with cache.write_transaction(cache_key) as (old, new):
+        sjson.dump({'etag': etag, 'index': index}, new)
+
+    return index
+
+
+def _index_entry(spec_yaml):
+    """Entry of the spec index for the contents of a ``.spec.yaml`` file."""
+    return {
+        'spec': spec_yaml['spec'],
+        'full_hash': spec_yaml.get('full_hash'),
+    }
+
+
+def _write_spec_index(specs, index_path):
+    index = {
+        'buildcache_index': {
+            'version': _build_cache_index_version,
+            'specs': specs,
+        }
+    }
+    with closing(gzip.open(index_path, 'wb')) as f:
+        f.write(sjson.dump(index).encode('utf-8'))
+
+
+def _generate_spec_index(cache_prefix, specfile_names, index_path,
+                         refresh=()):
+    """Write the compressed JSON index for the given ``.spec.yaml`` files.
+
+    Entries of an already existing index are reused, so only the spec
+    files pushed since the last index generation need to be read.  Callers
+    must name the spec files they overwrote in ``refresh``, so that their
+    stale entries are read again.
+    """
+    old_index = read_spec_index(cache_prefix, force=True) or {}
+    old_specs = old_index.get('specs', {})
+
+    specs = {}
+    for name in specfile_names:
+        if name in old_specs and name not in refresh:
+            specs[name] = old_specs[name]
+            continue
+
+        specfile_url = url_util.join(cache_prefix, name)
+        try:
+            _, _, yaml_file = web_util.read_from_url(specfile_url)
+            spec_yaml = syaml.load(
+                codecs.getreader('utf-8')(yaml_file).read())
+        except (URLError, web_util.SpackWebError) as e:
+            tty.warn('Unable to read {0}: {1}'.format(specfile_url, e))
+            continue
+
+        specs[name] = _index_entry(spec_yaml)
+
+    _write_spec_index(specs, index_path)
+
+
+def _update_spec_index(cache_prefix, specfile_name, spec_yaml):
+    """Replace the entry of ``specfile_name`` in the index of the build
+    cache at ``cache_prefix``, if it has one, with ``spec_yaml``."""
+    index = read_spec_index(cache_prefix, force=True)
+    if index is None:
+        return
+
+    specs = index.get('specs', {})
+    specs[specfile_name] = _index_entry(spec_yaml)
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        index_path = os.path.join(tmpdir, _build_cache_index_name)
+        _write_spec_index(specs, index_path)
+        web_util.push_to_url(
+            index_path,
+            url_util.join(cache_prefix, _build_cache_index_name),
+            keep_original=False,
+            extra_args={'ContentType': 'application/gzip'})
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def generate_package_index(cache_prefix, refresh=()):
+    """Create the build cache index page and the JSON spec index.
 
     Creates (or replaces) the "index.html" page at the location given in
     cache_prefix.  This page contains a link for each binary package (*.yaml)
     and public key (*.key) under cache_prefix.
+
+    Also creates (or replaces) the compressed "index.json.gz" file, which
+    holds every concrete spec in the build cache along with its full hash,
+    so that clients can read the whole build cache with a single request.
+    The ``.spec.yaml`` files named in ``refresh`` are read again even if
+    the previous index has them.
     """
     tmpdir = tempfile.mkdtemp()
     try:
         index_html_path = os.path.join(tmpdir, 'index.html')
-        file_list = (
+        file_list = [
             entry
             for entry in web_util.list_url(cache_prefix)
             if (entry.endswith('.yaml')
-                or entry.endswith('.key')))
+                or entry.endswith('.key'))]
 
         with open(index_html_path, 'w') as f:
             f.write(BUILD_CACHE_INDEX_TEMPLATE.format(
@@ -290,20 +504,220 @@ def generate_package_index(cache_prefix):
                     BUILD_CACHE_INDEX_ENTRY_TEMPLATE.format(path=path)
                     for path in file_list)))
 
+        index_json_path = os.path.join(tmpdir, _build_cache_index_name)
+        _generate_spec_index(
+            cache_prefix,
+            [entry for entry in file_list if entry.endswith('.spec.yaml')],
+            index_json_path, refresh=refresh)
+
         web_util.push_to_url(
             index_html_path,
             url_util.join(cache_prefix, 'index.html'),
             keep_original=False,
             extra_args={'ContentType': 'text/html'})
+
+        web_util.push_to_url(
+            index_json_path,
+            url_util.join(cache_prefix, _build_cache_index_name),
+            keep_original=False,
+            extra_args={'ContentType': 'application/gzip'})
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def _blob_url(blobs_url, digest):
+    """URL of the compressed blob with the given sha256 digest."""
+    return url_util.join(blobs_url, digest[:2], digest + '.gz')
+
+
+def _map_blobs(function, items):
+    """Call ``function`` on all the ``items``, ``config:download_jobs`` at
+    a time."""
+    items = list(items)
+    jobs = min(config.get('config:download_jobs', 8), len(items))
+    if jobs <= 1:
+        return [function(item) for item in items]
+    pool = multiprocessing.pool.ThreadPool(jobs)
+    try:
+        return pool.map(function, items)
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def write_blob_manifest(workdir, manifest_path, blobs_url):
+    """Push the files under ``workdir`` as blobs and write their manifest.
+
+    Each regular file is stored once, compressed, under ``blobs_url`` and
+    keyed by the sha256 of its contents, so identical files are shared by
+    all the build cache entries that contain them.  Blobs that already
+    exist are not pushed again, and the others are pushed concurrently.
+    The manifest records directories, symlinks and files (with their mode
+    and digest) relative to ``workdir``.
+    """
+    entries = []
+    blobs = {}
+    for root, dirs, files in os.walk(workdir):
+        dirs.sort()
+        for name in dirs + sorted(files):
+            path = os.path.join(root, name)
+            rel_path = os.path.relpath(path, workdir)
+            if os.path.islink(path):
+                entries.append({'path': rel_path, 'type': 'link',
+                                'target': os.readlink(path)})
+            elif os.path.isdir(path):
+                entries.append({'path': rel_path, 'type': 'dir',
+                                'mode': os.stat(path).st_mode & 0o7777})
+            else:
+                digest = checksum_tarball(path)
+                entries.append({'path': rel_path, 'type': 'file',
+                                'mode': os.stat(path).st_mode & 0o7777,
+                                'sha256': digest})
+                blobs.setdefault(digest, path)
+
+    tmpdir = tempfile.mkdtemp()
+
+    def push(blob):
+        digest, path = blob
+        blob_url = _blob_url(blobs_url, digest)
+        if web_util.url_exists(blob_url):
+            return
+        blob_path = os.path.join(tmpdir, digest + '.gz')
+        with open(path, 'rb') as src:
+            with closing(gzip.open(blob_path, 'wb')) as dst:
+                shutil.copyfileobj(src, dst)
+        web_util.push_to_url(blob_path, blob_url, keep_original=False)
+
+    try:
+        _map_blobs(push, sorted(blobs.items()))
     finally:
         shutil.rmtree(tmpdir)
 
+    manifest = {
+        'blob_manifest': {
+            'version': _blob_manifest_version,
+            'entries': entries,
+        }
+    }
+    with open(manifest_path, 'w') as f:
+        sjson.dump(manifest, f)
+
+
+def _fetch_blob(digest):
+    """Return the path of the blob with the given digest in the local blob
+    cache, downloading it from the first mirror that has it if needed."""
+    cache = spack.caches.blob_cache
+    path = cache.path_for(digest)
+    if os.path.exists(path):
+        return path
+
+    for mirror in spack.mirror.MirrorCollection().values():
+        blob_url = _blob_url(
+            url_util.join(mirror.fetch_url, _build_cache_relative_path,
+                          _build_cache_blobs_path),
+            digest)
+        try:
+            _, _, response = web_util.read_from_url(blob_url)
+        except (URLError, web_util.SpackWebError) as e:
+            tty.debug(e)
+            continue
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            compressed = os.path.join(tmpdir, digest + '.gz')
+            with open(compressed, 'wb') as f:
+                shutil.copyfileobj(response, f)
+            with closing(gzip.open(compressed, 'rb')) as src:
+                return cache.store(digest, src)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    raise fs.FetchError('Unable to find blob %s on any mirror' % digest)
+
+
+def restore_from_blob_manifest(manifest_path, workdir):
+    """Recreate in ``workdir`` the prefix described by a blob manifest.
+
+    The blobs that are not in the local blob cache are downloaded
+    concurrently.  Entries that would be written outside of ``workdir``,
+    and relative links that point outside of it, are refused.
+    """
+    with open(manifest_path, 'r') as f:
+        manifest = sjson.load(f).get('blob_manifest', {})
+    if manifest.get('version') != _blob_manifest_version:
+        raise NewLayoutException(
+            'Unsupported blob manifest version: %s' % manifest.get('version'))
+
+    entries = manifest['entries']
+    for entry in entries:
+        _check_blob_manifest_entry(entry)
+
+    digests = sorted(set(e['sha256'] for e in entries if e['type'] == 'file'))
+    blob_paths = dict(zip(digests, _map_blobs(_fetch_blob, digests)))
+
+    mkdirp(workdir)
+    destination = os.path.realpath(workdir)
+    checked = {}
+    dirs = []
+    for entry in entries:
+        # Links created before may lead outside of the prefix
+        if not spack.util.compression.path_inside(
+                destination, entry['path'], checked):
+            raise UnsafeBlobManifestError(
+                'Blob manifest entry is outside of the prefix: %s' %
+                entry['path'])
+
+        path = os.path.join(destination, entry['path'])
+        if entry['type'] == 'dir':
+            mkdirp(path)
+            dirs.append((path, entry['mode']))
+        elif entry['type'] == 'link':
+            os.symlink(entry['target'], path)
+            checked.clear()
+        else:
+            shutil.copyfile(blob_paths[entry['sha256']], path)
+            os.chmod(path, entry['mode'])
+
+    # Set directory modes last, as they may forbid writing their contents
+    for path, mode in reversed(dirs):
+        os.chmod(path, mode)
+
+
+def _check_blob_manifest_entry(entry):
+    """Refuse entries, and relative link targets, with paths that are not
+    relative to the prefix.  Absolute link targets are kept: they point to
+    install prefixes, and are relocated like those of tarballs."""
+    path = entry['path']
+    if os.path.isabs(path) or '..' in path.split('/'):
+        raise UnsafeBlobManifestError(
+            'Blob manifest entry is outside of the prefix: %s' % path)
+
+    target = entry.get('target')
+    if entry['type'] == 'link' and not os.path.isabs(target):
+        resolved = os.path.normpath(
+            os.path.join(os.path.dirname(path), target))
+        if resolved == '..' or resolved.startswith('..' + os.sep):
+            raise UnsafeBlobManifestError(
+                'Blob manifest link %s points outside of the prefix: %s' %
+                (path, target))
+
 
 def build_tarball(spec, outdir, force=False, rel=False, unsigned=False,
-                  allow_root=False, key=None, regenerate_index=False):
+                  allow_root=False, key=None, regenerate_index=False,
+                  dedup=False, update_index=True):
     """
     Build a tarball from given spec and put it into the directory structure
     used at the mirror (following <tarball_directory_name>).
+
+    With ``dedup``, the files of the install prefix are pushed as
+    content-addressed blobs shared by all build cache entries, and the
+    tarball only contains a manifest of the prefix referencing them.
+
+    Unless ``regenerate_index`` is set, the entry of the spec in an
+    existing index is replaced.  Callers pushing several specs at once
+    should set ``update_index`` to ``False`` instead, and regenerate the
+    index once with the pushed spec files in ``refresh``, since concurrent
+    updates of the index would lose entries.
     """
     if not spec.concrete:
         raise ValueError('spec must be concrete to build tarball')
@@ -371,16 +785,27 @@ def build_tarball(spec, outdir, force=False, rel=False, unsigned=False,
             shutil.rmtree(tmpdir)
             tty.die(e)
 
-    # create compressed tarball of the install prefix
-    with closing(tarfile.open(tarfile_path, 'w:gz')) as tar:
-        tar.add(name='%s' % workdir,
-                arcname='%s' % os.path.basename(spec.prefix))
+    if dedup:
+        # push the files as blobs and describe the prefix in a manifest
+        tarfile_name = tarball_name(spec, '.blobs.json')
+        tarfile_path = os.path.join(tarfile_dir, tarfile_name)
+        write_blob_manifest(
+            workdir, tarfile_path,
+            url_util.join(outdir, build_cache_relative_path(),
+                          _build_cache_blobs_path))
+        checksum = checksum_tarball(tarfile_path)
+    else:
+        # create compressed tarball of the install prefix, and get its
+        # sha256 checksum as it is written
+        with open(tarfile_path, 'wb') as f:
+            writer = _HashingWriter(f)
+            with closing(tarfile.open(fileobj=writer, mode='w:gz')) as tar:
+                tar.add(name='%s' % workdir,
+                        arcname='%s' % os.path.basename(spec.prefix))
+        checksum = writer.hasher.hexdigest()
     # remove copy of install directory
     shutil.rmtree(workdir)
 
-    # get the sha256 checksum of the tarball
-    checksum = checksum_tarball(tarfile_path)
-
     # add sha256 checksum to spec.yaml
     with open(spec_file, 'r') as inputfile:
         content = inputfile.read()
@@ -429,10 +854,15 @@ def build_tarball(spec, outdir, force=False, rel=False, unsigned=False,
 
     try:
         # create an index.html for the build_cache directory so specs can be
-        # found
+        # found; otherwise keep the entry of this spec in an existing index
+        # up to date, as it may have been pushed before with another hash
+        remote_cache_prefix = url_util.join(
+            outdir, os.path.relpath(cache_prefix, tmpdir))
         if regenerate_index:
-            generate_package_index(url_util.join(
-                outdir, os.path.relpath(cache_prefix, tmpdir)))
+            generate_package_index(
+                remote_cache_prefix, refresh=[specfile_name])
+        elif update_index:
+            _update_spec_index(remote_cache_prefix, specfile_name, spec_dict)
     finally:
         shutil.rmtree(tmpdir)
 
@@ -448,8 +878,12 @@ def download_tarball(spec):
         tty.die("Please add a spack mirror to allow " +
                 "download of pre-compiled packages.")
 
-    tarball = tarball_path_name(spec, '.spack')
+    return _download_tarball(tarball_path_name(spec, '.spack'))
 
+
+def _download_tarball(tarball):
+    """Download the tarball at the given path relative to the build cache
+    from the first mirror that has it.  Return the local path, or None."""
     for mirror in spack.mirror.MirrorCollection().values():
         url = url_util.join(
             mirror.fetch_url, _build_cache_relative_path, tarball)
@@ -457,6 +891,7 @@ def download_tarball(spec):
         # stage the tarball into standard place
         stage = Stage(url, name="build_cache", keep=True)
         try:
+            stage.create()
             stage.fetch()
             return stage.save_filename
         except fs.FetchError:
@@ -465,6 +900,68 @@ def download_tarball(spec):
     return None
 
 
+def _prefetch_tarball_wrapper(args):
+    """Wrapper for downloading tarballs with multiprocessing."""
+    tarball, retries = args
+    for attempt in range(retries):
+        path = _download_tarball(tarball)
+        if path:
+            return path
+        tty.debug('Download of {0} failed (attempt {1} of {2})'.format(
+            tarball, attempt + 1, retries))
+    return None
+
+
+def prefetch_tarballs(specs, jobs=None, retries=3):
+    """Download the binary tarballs of many specs concurrently.
+
+    Only specs available in the build caches of the configured mirrors
+    are downloaded.  Tarballs land in the same stage area used by
+    ``download_tarball()``, so installing them afterwards does not touch
+    the network again.
+
+    Args:
+        specs (list): concrete specs whose tarballs should be downloaded
+        jobs (int): maximum number of concurrent downloads.  Defaults to
+            ``config:download_jobs``.
+        retries (int): number of attempts for each tarball
+
+    Returns:
+        dict: maps the DAG hash of each available spec to the local path
+            of its tarball, or to None if the download failed.
+    """
+    if not spack.mirror.MirrorCollection():
+        return {}
+
+    available = set(s.dag_hash() for s in get_specs())
+    to_fetch = [s for s in specs if s.dag_hash() in available]
+    if not to_fetch:
+        return {}
+
+    if jobs is None:
+        jobs = spack.config.get('config:download_jobs', 8)
+    jobs = max(1, min(jobs, len(to_fetch)))
+
+    tty.msg('Downloading {0} binary packages ({1} at a time)'.format(
+        len(to_fetch), jobs))
+    args = [(tarball_path_name(s, '.spack'), retries) for s in to_fetch]
+
+    # Create the shared stage directory up front, so workers don't race
+    mkdirp(os.path.join(spack.stage.get_stage_root(), 'build_cache'))
+
+    if jobs == 1:
+        paths = [_prefetch_tarball_wrapper(a) for a in args]
+    else:
+        pool = multiprocessing.pool.Pool(processes=jobs)
+        try:
+            paths = pool.map(_prefetch_tarball_wrapper, args)
+        finally:
+            pool.terminate()
+            pool.join()
+
+    return dict((s.dag_hash(), path) for s, path in zip(to_fetch, paths))
+
+
 def make_package_relative(workdir, spec, allow_root):
     """
     Change paths in binaries to relative paths. Change absolute symlinks
@@ -588,8 +1085,20 @@ def extract_tarball(spec, filename, allow_root=False, unsigned=False,
     specfile_name = tarball_name(spec, '.spec.yaml')
     specfile_path = os.path.join(tmpdir, specfile_name)
 
+    # get the sha256 checksum of the tarball while it is extracted
+    checksum = None
     with closing(tarfile.open(spackfile_path, 'r')) as tar:
-        tar.extractall(tmpdir)
+        for member in tar.getmembers():
+            if member.name == tarfile_name and member.isfile():
+                checksum = _extract_with_checksum(tar, member, tarfile_path)
+            else:
+                tar.extract(member, tmpdir)
+
+    # entries created with dedup carry a blob manifest instead of a tarball
+    manifest_path = os.path.join(tmpdir, tarball_name(spec, '.blobs.json'))
+    if os.path.exists(manifest_path):
+        tarfile_path = manifest_path
+        checksum = checksum_tarball(manifest_path)
     if not unsigned:
         if os.path.exists('%s.asc' % specfile_path):
             try:
@@ -604,8 +1113,6 @@ def extract_tarball(spec, filename, allow_root=False, unsigned=False,
                 "Package spec file failed signature verification.\n"
                 "Use spack buildcache keys to download "
                 "and install a key for verification from the mirror.")
-    # get the sha256 checksum of the tarball
-    checksum = checksum_tarball(tarfile_path)
 
     # get the sha256 checksum recorded at creation
     spec_dict = {}
@@ -635,13 +1142,20 @@ def extract_tarball(spec, filename, allow_root=False, unsigned=False,
         msg += "It cannot be relocated."
         raise NewLayoutException(msg)
 
-    # extract the tarball in a temp directory
-    with closing(tarfile.open(tarfile_path, 'r')) as tar:
-        tar.extractall(path=tmpdir)
     # the base of the install prefix is used when creating the tarball
     # so the pathname should be the same now that the directory layout
     # is confirmed
     workdir = os.path.join(tmpdir, os.path.basename(spec.prefix))
+    if tarfile_path == manifest_path:
+        try:
+            restore_from_blob_manifest(manifest_path, workdir)
+        except Exception:
+            shutil.rmtree(tmpdir)
+            raise
+    else:
+        # extract the tarball in a temp directory
+        with closing(tarfile.open(tarfile_path, 'r')) as tar:
+            tar.extractall(path=tmpdir)
     install_tree(workdir, spec.prefix, symlinks=True)
 
     # cleanup
@@ -682,11 +1196,25 @@ def get_specs(force=False):
         tty.debug("No Spack mirrors are currently configured")
         return {}
 
+    _cached_specs = []
     urls = set()
     for mirror in spack.mirror.MirrorCollection().values():
         fetch_url_build_cache = url_util.join(
             mirror.fetch_url, _build_cache_relative_path)
 
+        index = read_spec_index(fetch_url_build_cache, force=force)
+        if index is not None:
+            tty.msg("Reading buildcache index at %s" %
+                    url_util.format(fetch_url_build_cache))
+            for entry in index['specs'].values():
+                # All specs in build caches are concrete (as they are
+                # built) so we need to mark this spec concrete on read-in.
+                spec = Spec.from_dict(entry)
+                spec._mark_concrete()
+                _cached_specs.append(spec)
+            continue
+
+        # Build caches without an index: find the spec files one by one
         mirror_dir = url_util.local_file_path(fetch_url_build_cache)
         if mirror_dir:
             tty.msg("Finding buildcaches in %s" % mirror_dir)
@@ -705,7 +1233,6 @@ def get_specs(force=False):
                 if re.search("spec.yaml", link):
                     urls.add(link)
 
-    _cached_specs = []
     for link in urls:
         with Stage(link, name="build_cache", keep=True) as stage:
             if force and os.path.exists(stage.save_filename):
@@ -839,6 +1366,16 @@ def needs_rebuild(spec, mirror_url, rebuild_on_errors=False):
     return False
 
 
+def _up_to_date_in_index(spec, index):
+    """True if the mirror index lists ``spec`` with its current full hash.
+
+    Any other answer from the index may come from an index that is older
+    than the build cache, so callers must check those specs directly.
+    """
+    entry = index['specs'].get(tarball_name(spec, '.spec.yaml'))
+    return entry is not None and entry.get('full_hash') == spec.full_hash()
+
+
 def check_specs_against_mirrors(mirrors, specs, output_file=None,
                                 rebuild_on_errors=False):
     """Check all the given specs against buildcaches on the given mirrors and
@@ -857,14 +1394,32 @@ def check_specs_against_mirrors(mirrors, specs, output_file=None,
 
     Returns: 1 if any spec was out-of-date on any mirror, 0 otherwise.
 
+    Mirrors with a build cache index are checked against the index, which
+    is fetched once per mirror.  Only specs the index does not show as up
+    to date cost a request for their ``.spec.yaml`` file.
     """
+    # Full hashes are cached on the specs, so compute them once up front
+    # instead of once per spec and mirror.
+    for spec in specs:
+        if not spec.concrete:
+            raise ValueError('spec must be concrete to check against mirror')
+        spec.full_hash()
+
     rebuilds = {}
     for mirror in spack.mirror.MirrorCollection(mirrors).values():
         tty.msg('Checking for built specs at %s' % mirror.fetch_url)
 
+        index = read_spec_index(build_cache_prefix(mirror.fetch_url))
+        if index is None:
+            tty.debug('No build cache index at {0}, checking each spec '
+                      'individually'.format(mirror.fetch_url))
+
         rebuild_list = []
 
         for spec in specs:
+            if index is not None and _up_to_date_in_index(spec, index):
+                continue
+
             if needs_rebuild(spec, mirror.fetch_url, rebuild_on_errors):
                 rebuild_list.append({
                     'short_spec': spec.short_spec,
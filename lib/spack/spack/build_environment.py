@@ -44,22 +44,27 @@
 
 import llnl.util.tty as tty
 from llnl.util.tty.color import cescape, colorize
-from llnl.util.filesystem import mkdirp, install, install_tree
-from llnl.util.lang import dedupe
+from llnl.util.filesystem import mkdirp, install, install_tree, working_dir
+from llnl.util.lang import dedupe, memoized
 
+import spack
 import spack.build_systems.cmake
 import spack.build_systems.meson
+import spack.caches
 import spack.config
+import spack.error
 import spack.main
 import spack.paths
+import spack.repo
 import spack.store
+import spack.util.spack_json as sjson
 from spack.util.string import plural
 from spack.util.environment import (
     env_flag, filter_system_paths, get_path, is_system_path,
     EnvironmentModifications, validate, preserve_environment)
 from spack.util.environment import system_dirs
 from spack.error import NoLibrariesError, NoHeadersError
-from spack.util.executable import Executable
+from spack.util.executable import Executable, which
 from spack.util.module_cmd import load_module, get_path_from_module
 from spack.util.log_parse import parse_log_events, make_log_context
 
@@ -771,6 +776,119 @@ def modifications_from_dependencies(spec, context):
     return env
 
 
+def _run_environment_key(spec):
+    """Key of the ``misc_cache`` entry with the run environment
+    modifications of an installed spec, for each prefix it had."""
+    return os.path.join('run_environment', spec.dag_hash() + '.json')
+
+
+def run_environment_modifications(spec, view=None):
+    """Returns the modifications to the run environment of a spec that
+    its dependencies and its own package make.
+
+    The modifications of installed specs are cached in the ``misc_cache``,
+    for each prefix they are asked for. The cache is rebuilt when the spec
+    is reinstalled, when Spack is updated, when the ``package.py`` of a
+    package in its link and run dependencies or any of its base classes
+    changes, and when ``view`` changes.
+
+    Args:
+        spec (Spec): concrete spec, whose prefix may be its projection
+            in a view
+        view (FilesystemView): view whose projection of the spec is its
+            prefix, if any
+    """
+    key = _run_environment_cache_key(spec, view)
+    cache = spack.caches.misc_cache
+    cache_key = _run_environment_key(spec)
+    prefix = str(spec.prefix)
+    if key and cache.init_entry(cache_key):
+        try:
+            with cache.read_transaction(cache_key) as f:
+                entry = sjson.load(f).get(prefix, {})
+            if entry.get('key') == key:
+                return EnvironmentModifications.from_list(
+                    entry['modifications'])
+        except (IOError, ValueError, KeyError, TypeError, AttributeError,
+                spack.error.SpackError) as e:
+            tty.debug('Cannot read the cached run environment of {0}: {1}'
+                      .format(spec.name, e))
+
+    env = modifications_from_dependencies(spec, context='run')
+    set_module_variables_for_package(spec.package)
+    spec.package.setup_run_environment(env)
+
+    if key:
+        try:
+            modifications = env.to_list()
+            cache.init_entry(cache_key)
+            with cache.write_transaction(cache_key) as (old, new):
+                try:
+                    entries = sjson.load(old) if old else {}
+                except ValueError:
+                    entries = {}
+                entries[prefix] = {'key': key, 'modifications': modifications}
+                sjson.dump(entries, new)
+        except (IOError, OSError, TypeError, ValueError,
+                spack.error.SpackError) as e:
+            # A read-only cache, or values that aren't JSON
+            tty.debug('Cannot cache the run environment of {0}: {1}'.format(
+                spec.name, e))
+    return env
+
+
+@memoized
+def _spack_commit():
+    """Commit of the Spack instance running, or None."""
+    git = which('git')
+    if not git or not os.path.isdir(os.path.join(spack.paths.prefix, '.git')):
+        return None
+    with working_dir(spack.paths.prefix):
+        commit = git('rev-parse', 'HEAD', output=str, error=str,
+                     fail_on_error=False).strip()
+    return commit if git.returncode == 0 else None
+
+
+def _package_sources(spec):
+    """Files with the package class of ``spec`` and all its bases, like
+    build systems and the packages it inherits from."""
+    sources = set()
+    for cls in inspect.getmro(spec.package_class):
+        if cls is not object:
+            sources.add(inspect.getsourcefile(cls))
+    return sources
+
+
+def _run_environment_cache_key(spec, view):
+    """Key of the cached run environment of ``spec``, or ``None`` if it
+    can't be cached."""
+    if spec.external:
+        return None
+    upstream, record = spack.store.db.query_by_spec_hash(spec.dag_hash())
+    if upstream or record is None or not record.installed:
+        return None
+
+    sources = {}
+    try:
+        for dep in spec.traverse(deptype=('link', 'run')):
+            for filename in _package_sources(dep):
+                sources[filename] = os.stat(filename).st_mtime
+    except (OSError, TypeError, spack.repo.RepoError):
+        return None
+
+    key = {
+        'spack': [spack.spack_version, _spack_commit()],
+        'installed': record.installation_time,
+        'sources': sources,
+    }
+    if view is not None:
+        manifest = getattr(view, 'manifest_path', None)
+        if not manifest or not os.path.exists(manifest):
+            return None
+        key['view'] = os.stat(manifest).st_mtime
+    return key
+
+
 def fork(pkg, function, dirty, fake):
     """Fork a child process to do part of a spack build.
 
@@ -868,7 +986,21 @@ def child_process(child_pipe, input_stream):
         if input_stream is not None:
             input_stream.close()
 
-    child_result = parent_pipe.recv()
+    # Only the child writes to the pipe, so that reading from it fails
+    # instead of waiting forever if the child is killed
+    child_pipe.close()
+    try:
+        child_result = parent_pipe.recv()
+    except EOFError:
+        p.join()
+        if p.exitcode < 0:
+            status = 'was killed by signal {0}'.format(-p.exitcode)
+        else:
+            status = 'exited with status {0}'.format(p.exitcode)
+        error = InstallError(
+            'The build process of {0} {1}'.format(pkg.name, status))
+        error.pkg = pkg
+        raise error
     p.join()
 
     # let the caller know which package went wrong.
@@ -4,7 +4,9 @@
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
 """Caches used by Spack to store data"""
+import hashlib
 import os
+import tempfile
 
 import llnl.util.lang
 from llnl.util.filesystem import mkdirp
@@ -15,6 +17,7 @@
 import spack.fetch_strategy
 import spack.util.file_cache
 import spack.util.path
+import spack.util.string
 
 
 def _misc_cache():
@@ -39,14 +42,86 @@ def _fetch_cache():
     """Filesystem cache of downloaded archives.
 
     This prevents Spack from repeatedly fetch the same files when
-    building the same package different ways or multiple times.
+    building the same package different ways or multiple times.  Its
+    size is capped by ``config:source_cache_max_size``, if set.
     """
     path = spack.config.get('config:source_cache')
     if not path:
         path = os.path.join(spack.paths.var_path, "cache")
     path = spack.util.path.canonicalize_path(path)
 
-    return spack.fetch_strategy.FsCache(path)
+    max_size = spack.config.get('config:source_cache_max_size')
+    if max_size is not None:
+        max_size = spack.util.string.parse_size(max_size)
+
+    return spack.fetch_strategy.FsCache(path, max_size)
+
+
+def _blob_cache():
+    """Content-addressed cache of files from deduplicated build caches.
+
+    Files shared by several binary packages are downloaded only once.
+    The blob cache lives in the source cache, so it is purged by
+    ``spack clean --downloads`` as well.
+    """
+    path = spack.config.get('config:source_cache')
+    if not path:
+        path = os.path.join(spack.paths.var_path, "cache")
+    path = spack.util.path.canonicalize_path(path)
+
+    return BlobCache(os.path.join(path, 'blobs'))
+
+
+def _git_repo_cache():
+    """Bare mirrors of the git repositories Spack clones.
+
+    They live in the source cache, so they are purged by
+    ``spack clean --downloads`` as well.
+    """
+    path = spack.config.get('config:source_cache')
+    if not path:
+        path = os.path.join(spack.paths.var_path, "cache")
+    path = spack.util.path.canonicalize_path(path)
+
+    return spack.fetch_strategy.GitRepoCache(os.path.join(path, 'git-repos'))
+
+
+class BlobCache(object):
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+
+    def path_for(self, digest):
+        """Path of the blob with the given sha256 digest."""
+        return os.path.join(self.root, digest[:2], digest)
+
+    def store(self, digest, stream):
+        """Copy a blob from a file object into the cache.
+
+        The contents are checked against the digest while they are copied,
+        and the blob is moved into place atomically, so concurrent Spack
+        processes never see partial blobs.  Returns the path of the blob.
+        """
+        path = self.path_for(digest)
+        mkdirp(os.path.dirname(path))
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            hasher = hashlib.sha256()
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in iter(lambda: stream.read(65536), b''):
+                    hasher.update(chunk)
+                    f.write(chunk)
+
+            if hasher.hexdigest() != digest:
+                raise spack.error.SpackError(
+                    'Checksum of blob %s failed' % digest,
+                    'Got %s instead' % hasher.hexdigest())
+            os.rename(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        return path
 
 
 class MirrorCache(object):
@@ -86,3 +161,9 @@ def symlink(self, mirror_ref):
 fetch_cache = llnl.util.lang.Singleton(_fetch_cache)
 
 mirror_cache = None
+
+#: Spack's local cache for files of deduplicated binary packages
+blob_cache = llnl.util.lang.Singleton(_blob_cache)
+
+#: Spack's local mirrors of git repositories, used if config:git_cache is set
+git_repo_cache = llnl.util.lang.Singleton(_git_repo_cache)
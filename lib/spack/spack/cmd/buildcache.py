@@ -4,6 +4,7 @@
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
 import argparse
+import multiprocessing.pool
 import os
 import shutil
 import sys
@@ -59,6 +60,12 @@ def setup_parser(subparser):
     create.add_argument('--no-rebuild-index', action='store_true',
                         default=False, help="skip rebuilding index after " +
                                             "building package(s)")
+    create.add_argument('--dedup', action='store_true',
+                        help="store files as content-addressed blobs " +
+                             "shared with other buildcache entries")
+    create.add_argument('-j', '--jobs', type=int, default=1,
+                        help="number of binary packages to create in " +
+                             "parallel")
     create.add_argument('-y', '--spec-yaml', default=None,
                         help='Create buildcache entry for spec from yaml file')
     create.add_argument(
@@ -365,15 +372,58 @@ def createtarball(args):
 
     tty.debug('writing tarballs to %s/build_cache' % outdir)
 
-    for spec in specs:
-        tty.msg('creating binary cache file for package %s ' % spec.format())
+    specs = list(specs)
+    jobs = max(1, min(args.jobs, len(specs)))
+    create_args = [
+        (spec.dag_hash(), outdir, args.force, args.rel, args.unsigned,
+         args.allow_root, signkey, args.dedup)
+        for spec in specs]
+
+    if jobs == 1:
+        errors = [_create_tarball_wrapper(a) for a in create_args]
+    else:
+        tty.msg('creating {0} binary cache files, {1} at a time'.format(
+            len(specs), jobs))
+        pool = multiprocessing.pool.Pool(processes=jobs)
         try:
-            bindist.build_tarball(spec, outdir, args.force, args.rel,
-                                  args.unsigned, args.allow_root, signkey,
-                                  not args.no_rebuild_index)
-        except Exception as e:
-            tty.warn('%s' % e)
-            pass
+            errors = pool.map(_create_tarball_wrapper, create_args)
+        finally:
+            pool.terminate()
+            pool.join()
+
+    for error in errors:
+        if error:
+            tty.warn(error)
+
+    # Update the index once, after all the tarballs have been pushed,
+    # reading again the spec files that may have been overwritten
+    if specs and not args.no_rebuild_index:
+        bindist.generate_package_index(
+            url_util.join(outdir, bindist.build_cache_relative_path()),
+            refresh=[bindist.tarball_name(spec, '.spec.yaml')
+                     for spec, error in zip(specs, errors) if not error])
+
+
+def _create_tarball_wrapper(args):
+    """Create the binary cache file of an installed spec.
+
+    Takes the DAG hash of the spec rather than the spec itself, so that it
+    can be used with multiprocessing.  Returns an error message on failure.
+    """
+    dag_hash, outdir, force, rel, unsigned, allow_root, key, dedup = args
+    try:
+        matches = spack.store.db.get_by_hash(dag_hash)
+        if not matches:
+            return 'no installed spec with hash %s' % dag_hash
+        spec = matches[0]
+        tty.msg('creating binary cache file for package %s ' % spec.format())
+        bindist.build_tarball(spec, outdir, force, rel, unsigned,
+                              allow_root, key, regenerate_index=False,
+                              dedup=dedup, update_index=False)
+    except (Exception, SystemExit) as e:
+        # build_tarball calls tty.die() on relocation errors, which must
+        # not take down a pool worker.
+        return '%s' % e
 
 
 def installtarball(args):
@@ -6,13 +6,18 @@
 from __future__ import print_function
 
 import argparse
+import sys
+
+from ordereddict_backport import OrderedDict
 
 import llnl.util.tty as tty
 
 import spack.cmd
+import spack.package
 import spack.repo
 import spack.stage
 import spack.util.crypto
+import spack.util.spack_json as sjson
 from spack.util.naming import valid_fully_qualified_module_name
 from spack.version import ver, Version
 
@@ -28,15 +33,69 @@ def setup_parser(subparser):
     subparser.add_argument(
         '--keep-stage', action='store_true',
         help="don't clean up staging area when command completes")
+    subparser.add_argument(
+        '-b', '--batch', action='store_true',
+        help="checksum the new versions of all the packages given, "
+             "without prompting, and print the results as JSON")
     subparser.add_argument(
         'versions', nargs=argparse.REMAINDER,
-        help='versions to generate checksums for')
+        help='versions to generate checksums for '
+             '(more packages with --batch)')
+
+
+def checksum_batch(names, keep_stage=False):
+    """Checksum the remote versions that packages don't list yet.
+
+    Packages are spidered, and archives downloaded, at the same time for
+    all packages.  Prints a JSON object that maps each package name to its
+    new versions, each with its URL and either its ``sha256`` or the
+    ``error`` that prevented downloading it.
+    """
+    pkgs = [spack.repo.get(name) for name in names]
+    remote_versions = spack.package.find_remote_versions(pkgs)
+
+    new_versions = []
+    for name, pkg, (versions, error) in zip(names, pkgs, remote_versions):
+        if versions is None:
+            tty.warn("Could not find versions for {0}: {1}".format(
+                name, error))
+            versions = {}
+        new_versions.append(dict((v, url) for v, url in versions.items()
+                                 if v not in pkg.versions))
+
+    urls = set(url for versions in new_versions
+               for url in versions.values())
+    with tty.SuppressOutput(msg_enabled=False):
+        checksums = spack.stage.checksum_urls(
+            sorted(urls), keep_stage=keep_stage)
+
+    results = OrderedDict()
+    for name, versions in zip(names, new_versions):
+        results[name] = OrderedDict()
+        for version in sorted(versions, reverse=True):
+            url = versions[version]
+            sha256, error = checksums[url]
+            result = OrderedDict([('url', url)])
+            if sha256:
+                result['sha256'] = sha256
+            else:
+                result['error'] = error
+            results[name][str(version)] = result
+
+    sjson.dump(results, sys.stdout)
+    print()
 
 
 def checksum(parser, args):
-    # Make sure the user provided a package and not a URL
-    if not valid_fully_qualified_module_name(args.package):
-        tty.die("`spack checksum` accepts package names, not URLs.")
+    # Make sure the user provided packages and not URLs
+    names = [args.package] + (args.versions if args.batch else [])
+    for name in names:
+        if not valid_fully_qualified_module_name(name):
+            tty.die("`spack checksum` accepts package names, not URLs.")
+
+    if args.batch:
+        checksum_batch(names, keep_stage=args.keep_stage)
+        return
 
     # Get the package we're going to generate checksums for
     pkg = spack.repo.get(args.package)
@@ -13,6 +13,7 @@
 import spack.cmd
 import spack.repo
 import spack.stage
+import spack.util.string
 from spack.paths import lib_path, var_path
 
 
@@ -34,6 +35,10 @@ def setup_parser(subparser):
     subparser.add_argument(
         '-d', '--downloads', action='store_true',
         help="remove cached downloads")
+    subparser.add_argument(
+        '--max-size', metavar='SIZE',
+        help="with --downloads, only remove the least recently used"
+             " downloads until the cache is smaller than SIZE (e.g. 10G)")
     subparser.add_argument(
         '-m', '--misc-cache', action='store_true',
         help="remove long-lived caches, like the virtual package index")
@@ -69,7 +74,16 @@ def clean(parser, args):
         tty.msg('Removing all temporary build stages')
         spack.stage.purge()
 
-    if args.downloads:
+    if args.downloads and args.max_size is not None:
+        try:
+            max_size = spack.util.string.parse_size(args.max_size)
+        except ValueError as e:
+            tty.die(str(e))
+        tty.msg('Trimming cached downloads to {0}'.format(args.max_size))
+        freed = spack.caches.fetch_cache.trim(max_size)
+        tty.msg('Removed {0:.1f} MB of cached downloads'.format(
+            freed / float(2 ** 20)))
+    elif args.downloads:
         tty.msg('Removing cached downloads')
         spack.caches.fetch_cache.destroy()
 
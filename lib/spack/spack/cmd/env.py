@@ -114,6 +114,10 @@ def env_activate(args):
     )
     sys.stdout.write(cmds)
 
+    # Let the shell support activate the environment by itself next time
+    if not active_env.activation_scripts_up_to_date():
+        active_env.write_activation_scripts()
+
 
 #
 # env deactivate
@@ -114,6 +114,10 @@ def setup_parser(subparser):
     subparser.add_argument(
         '--only-concrete', action='store_true', default=False,
         help='(with environment) only install already concretized specs')
+    subparser.add_argument(
+        '-p', '--parallel', type=int, metavar='N', default=None,
+        help='(with environment) install N packages of the environment at '
+             'a time, and keep going past failures')
     subparser.add_argument(
         '-f', '--file', action='append', default=[],
         dest='specfiles', metavar='SPEC_YAML_FILE',
@@ -272,8 +276,11 @@ def install(parser, args, **kwargs):
                 env.write(regenerate_views=False)
 
             tty.msg("Installing environment %s" % env.name)
-            env.install_all(args)
+            failed = env.install_all(args, jobs=args.parallel)
             env.regenerate_views()
+            if failed:
+                tty.die('{0} of the roots of environment {1} were not '
+                        'installed'.format(len(failed), env.name))
             return
         else:
             tty.die("install requires a package argument or a spack.yaml file")
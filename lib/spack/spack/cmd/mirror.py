@@ -57,6 +57,10 @@ def setup_parser(subparser):
         '-n', '--versions-per-spec',
         help="the number of versions to fetch for each spec, choose 'all' to"
              " retrieve all versions of each package")
+    create_parser.add_argument(
+        '-j', '--jobs', type=int, default=None,
+        help="number of specs to fetch concurrently"
+             " (default: config:download_jobs)")
 
     # used to construct scope arguments below
     scopes = spack.config.scopes()
@@ -308,7 +312,11 @@ def mirror_create(args):
     existed = web_util.url_exists(directory)
 
     # Actually do the work to create the mirror
-    present, mirrored, error = spack.mirror.create(directory, mirror_specs)
+    jobs = args.jobs
+    if jobs is None:
+        jobs = spack.config.get('config:download_jobs', 8)
+    present, mirrored, error = spack.mirror.create(
+        directory, mirror_specs, jobs=jobs)
     p, m, e = len(present), len(mirrored), len(error)
 
     verb = "updated" if existed else "created"
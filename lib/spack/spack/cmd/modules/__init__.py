@@ -6,6 +6,7 @@
 """Implementation details of the ``spack module`` command."""
 
 import collections
+import multiprocessing.pool
 import os.path
 import shutil
 import sys
@@ -16,6 +17,7 @@
 import spack.modules
 import spack.repo
 import spack.modules.common
+import spack.store
 
 import spack.cmd.common.arguments as arguments
 
@@ -39,7 +41,7 @@ def setup_parser(subparser):
         action='store_true'
     )
     arguments.add_common_arguments(
-        refresh_parser, ['constraint', 'yes_to_all']
+        refresh_parser, ['constraint', 'yes_to_all', 'jobs']
     )
 
     find_parser = sp.add_parser('find', help='find module files for packages')
@@ -297,14 +299,78 @@ def refresh(module_type, specs, args):
     if os.path.isdir(module_type_root) and args.delete_tree:
         shutil.rmtree(module_type_root, ignore_errors=False)
     filesystem.mkdirp(module_type_root)
+
+    # Leave alone the module files whose inputs didn't change
+    outdated = [x for x in writers if not _up_to_date(x)]
+    if len(outdated) < len(writers):
+        tty.msg('{0} of {1} module files are up to date'.format(
+            len(writers) - len(outdated), len(writers)))
+    writers = outdated
+
+    # Compile the templates once, before the workers are forked
     for x in writers:
         try:
-            x.write(overwrite=True)
-        except Exception as e:
-            tty.debug(e)
+            x.load_template()
+        except spack.modules.common.ModulesTemplateNotFoundError:
+            pass  # reported when the module is written
+
+    if not writers:
+        return
+
+    jobs = max(1, min(args.jobs, len(writers)))
+    if jobs == 1:
+        errors = [_write_module(x) for x in writers]
+    else:
+        tty.msg('Writing {0} module files, {1} at a time'.format(
+            len(writers), jobs))
+        write_args = [(module_type, x.spec.dag_hash()) for x in writers]
+        pool = multiprocessing.pool.Pool(processes=jobs)
+        try:
+            errors = pool.map(_write_module_wrapper, write_args)
+        finally:
+            pool.terminate()
+            pool.join()
+
+    for x, error in zip(writers, errors):
+        if error:
             msg = 'Could not write module file [{0}]'
             tty.warn(msg.format(x.layout.filename))
-            tty.warn('\t--> {0} <--'.format(str(e)))
+            tty.warn('\t--> {0} <--'.format(error))
+
+
+def _up_to_date(writer):
+    try:
+        return writer.up_to_date()
+    except Exception as e:
+        # The error is reported when the module file is written
+        tty.debug(e)
+        return False
+
+
+def _write_module(writer):
+    """Write a module file, and return an error message on failure."""
+    try:
+        writer.write(overwrite=True)
+    except Exception as e:
+        tty.debug(e)
+        return str(e)
+
+
+def _write_module_wrapper(args):
+    """Write the module file of an installed spec.
+
+    Takes the module type and the DAG hash of the spec rather than a
+    writer, so that it can be used with multiprocessing. Returns an error
+    message on failure.
+    """
+    module_type, dag_hash = args
+    try:
+        spec = spack.store.db.get_by_hash(dag_hash)[0]
+        writer = spack.modules.module_types[module_type](spec)
+    except Exception as e:
+        tty.debug(e)
+        return str(e)
+    return _write_module(writer)
 
 
 #: Dictionary populated with the list of sub-commands.
@@ -5,10 +5,14 @@
 
 from __future__ import print_function
 
+from ordereddict_backport import OrderedDict
+
 from llnl.util.tty.colify import colify
 import llnl.util.tty as tty
 
+import spack.package
 import spack.repo
+import spack.util.spack_json as sjson
 import sys
 
 description = "list available versions of a package"
@@ -17,15 +21,58 @@
 
 
 def setup_parser(subparser):
-    subparser.add_argument('package', metavar='PACKAGE',
-                           help='package to list versions for')
+    subparser.add_argument('packages', nargs='+', metavar='PACKAGE',
+                           help='packages to list versions for')
     subparser.add_argument('-s', '--safe-only', action='store_true',
                            help='only list safe versions of the package')
+    subparser.add_argument('-j', '--json', action='store_true',
+                           help='print the versions of all packages as JSON')
 
 
 def versions(parser, args):
-    pkg = spack.repo.get(args.package)
+    pkgs = [spack.repo.get(name) for name in args.packages]
+
+    # Look for the remote versions of all packages at the same time
+    remote_versions = [({}, None)] * len(pkgs)
+    if not args.safe_only:
+        remote_versions = spack.package.find_remote_versions(pkgs)
+
+    failed = []
+    for name, (fetched, error) in zip(args.packages, remote_versions):
+        if fetched is None:
+            tty.error('Could not fetch the remote versions of {0}: {1}'
+                      .format(name, error))
+            failed.append(name)
+
+    if args.json:
+        results = OrderedDict()
+        for name, pkg, (fetched, error) in zip(
+                args.packages, pkgs, remote_versions):
+            results[name] = OrderedDict([
+                ('safe', [str(v) for v in sorted(pkg.versions,
+                                                 reverse=True)])])
+            if args.safe_only:
+                continue
+            if fetched is None:
+                results[name]['error'] = error
+            else:
+                remote = set(fetched).difference(pkg.versions)
+                results[name]['remote'] = [
+                    str(v) for v in sorted(remote, reverse=True)]
+        sjson.dump(results, sys.stdout)
+        print()
+    else:
+        for pkg, (fetched, error) in zip(pkgs, remote_versions):
+            if len(pkgs) > 1 and sys.stdout.isatty():
+                tty.msg(pkg.name)
+            print_versions(pkg, fetched or {},
+                           args.safe_only or fetched is None)
+
+    if failed:
+        sys.exit(1)
+
 
+def print_versions(pkg, fetched_versions, safe_only=False):
     if sys.stdout.isatty():
         tty.msg('Safe versions (already checksummed):')
 
@@ -38,13 +85,12 @@ def versions(parser, args):
     else:
         colify(sorted(safe_versions, reverse=True), indent=2)
 
-    if args.safe_only:
+    if safe_only:
         return
 
     if sys.stdout.isatty():
         tty.msg('Remote versions (not yet checksummed):')
 
-    fetched_versions = pkg.fetch_remote_versions()
     remote_versions = set(fetched_versions).difference(safe_versions)
 
     if not remote_versions:
@@ -23,6 +23,12 @@
 
 - hardlink :: like the symlink view but hardlinks are used.
 
+- copy :: like the symlink view but files are copied, and the prefixes of
+  the packages in the view are relocated in text files.
+
+- reflink :: like the copy view but the copies share their data with the
+  installed files, on filesystems that can clone files.
+
 - statlink :: a view producing a status report of a symlink or
   hardlink view.
 
@@ -33,7 +39,6 @@
 YamlFilesystemView.
 
 '''
-import os
 
 import llnl.util.tty as tty
 from llnl.util.link_tree import MergeConflictError
@@ -41,6 +46,7 @@
 
 import spack.environment as ev
 import spack.cmd
+import spack.config
 import spack.store
 import spack.schema.projections
 from spack.config import validate
@@ -51,11 +57,20 @@
 section = "environments"
 level = "short"
 
-actions_link = ["symlink", "add", "soft", "hardlink", "hard"]
+actions_link = ["symlink", "add", "soft", "hardlink", "hard",
+                "copy", "relocate", "reflink", "clone"]
 actions_remove = ["remove", "rm"]
 actions_status = ["statlink", "status", "check"]
 
 
+#: Link type of the view for each link action that isn't a symlink
+link_types = {
+    "hardlink": "hardlink", "hard": "hardlink",
+    "copy": "copy", "relocate": "copy",
+    "reflink": "reflink", "clone": "reflink",
+}
+
+
 def disambiguate_in_view(specs, view):
     """
         When dealing with querying actions (remove/status) we only need to
@@ -112,6 +127,14 @@ def setup_parser(sp):
         "hardlink": ssp.add_parser(
             'hardlink', aliases=['hard'],
             help='add packages files to a filesystem via via hard links'),
+        "copy": ssp.add_parser(
+            'copy', aliases=['relocate'],
+            help='add package files to a filesystem view via copies, '
+                 'relocated to the view'),
+        "reflink": ssp.add_parser(
+            'reflink', aliases=['clone'],
+            help='add package files to a filesystem view via cloned copies, '
+                 'relocated to the view'),
         "remove": ssp.add_parser(
             'remove', aliases=['rm'],
             help='remove packages from a filesystem view'),
@@ -125,7 +148,7 @@ def setup_parser(sp):
         act.add_argument('path', nargs=1,
                          help="path to file system view directory")
 
-        if cmd in ("symlink", "hardlink"):
+        if cmd in ("symlink", "hardlink", "copy", "reflink"):
             # invalid for remove/statlink, for those commands the view needs to
             # already know its own projections.
             help_msg = "Initialize view using projections from file."
@@ -157,7 +180,7 @@ def setup_parser(sp):
             so["nargs"] = "+"
             act.add_argument('specs', **so)
 
-    for cmd in ["symlink", "hardlink"]:
+    for cmd in ["symlink", "hardlink", "copy", "reflink"]:
         act = file_system_view_actions[cmd]
         act.add_argument("-i", "--ignore-conflicts", action='store_true')
 
@@ -183,7 +206,7 @@ def view(parser, args):
         path, spack.store.layout,
         projections=ordered_projections,
         ignore_conflicts=getattr(args, "ignore_conflicts", False),
-        link=os.link if args.action in ["hardlink", "hard"] else os.symlink,
+        link_type=link_types.get(args.action, "symlink"),
         verbose=args.verbose)
 
     # Process common args and specs
@@ -215,7 +238,8 @@ def view(parser, args):
         try:
             view.add_specs(*specs,
                            with_dependencies=with_dependencies,
-                           exclude=args.exclude)
+                           exclude=args.exclude,
+                           jobs=spack.config.get('config:view_jobs', 8))
         except MergeConflictError:
             tty.info("Some file blocked the merge, adding the '-i' flag will "
                      "ignore this conflict. For more information see e.g. "
@@ -4,6 +4,9 @@
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
 import collections
+import hashlib
+import itertools
+import multiprocessing
 import os
 import re
 import sys
@@ -13,13 +16,20 @@
 
 import six
 
+try:
+    from collections.abc import MutableMapping  # novm
+except ImportError:
+    from collections import MutableMapping
+
 from ordereddict_backport import OrderedDict
 
 import llnl.util.filesystem as fs
 import llnl.util.tty as tty
+from llnl.util.link_tree import empty_file_name
 from llnl.util.tty.color import colorize
 
 import spack.concretize
+import spack.dependency as dp
 import spack.error
 import spack.hash_types as ht
 import spack.repo
@@ -90,6 +100,14 @@
 default_view_name = 'default'
 # Default behavior to link all packages into views (vs. only root packages)
 default_view_link = 'all'
+# Default behavior to update views in place (vs. swapping in a new view)
+default_view_update = 'incremental'
+# Default way to add files to views (vs. hard links, copies or clones)
+default_view_link_type = 'symlink'
+#: File recording the specs linked into a generation of an atomic view
+_generation_path = '.spack/generation.json'
+#: Shells for which environments write activation scripts
+script_shells = ('sh', 'csh')
 
 
 def valid_env_name(name):
@@ -134,36 +152,7 @@ def activate(
 
     tty.debug("Using environmennt '%s'" % _active_environment.name)
 
-    # Construct the commands to run
-    cmds = ''
-    if shell == 'csh':
-        # TODO: figure out how to make color work for csh
-        cmds += 'setenv SPACK_ENV %s;\n' % env.path
-        cmds += 'alias despacktivate "spack env deactivate";\n'
-        if prompt:
-            cmds += 'if (! $?SPACK_OLD_PROMPT ) '
-            cmds += 'setenv SPACK_OLD_PROMPT "${prompt}";\n'
-            cmds += 'set prompt="%s ${prompt}";\n' % prompt
-    else:
-        if os.getenv('TERM') and 'color' in os.getenv('TERM') and prompt:
-            prompt = colorize('@G{%s} ' % prompt, color=True)
-
-        cmds += 'export SPACK_ENV=%s;\n' % env.path
-        cmds += "alias despacktivate='spack env deactivate';\n"
-        if prompt:
-            cmds += 'if [ -z ${SPACK_OLD_PS1+x} ]; then\n'
-            cmds += '    if [ -z ${PS1+x} ]; then\n'
-            cmds += "        PS1='$$$$';\n"
-            cmds += '    fi;\n'
-            cmds += '    export SPACK_OLD_PS1="${PS1}";\n'
-            cmds += 'fi;\n'
-            cmds += 'export PS1="%s ${PS1}";\n' % prompt
-
-    if add_view and default_view_name in env.views:
-        with spack.store.db.read_transaction():
-            cmds += env.add_default_view_to_shell(shell)
-
-    return cmds
+    return _activate_commands(env, add_view, shell, prompt)
 
 
 def deactivate(shell='sh'):
@@ -218,6 +207,41 @@ def deactivate(shell='sh'):
     return cmds
 
 
+def _activate_commands(env, add_view, shell, prompt, portable=False):
+    """Returns the commands that activate ``env`` in ``shell``, for any
+    shell environment if ``portable`` is True."""
+    # Construct the commands to run
+    cmds = ''
+    if shell == 'csh':
+        # TODO: figure out how to make color work for csh
+        cmds += 'setenv SPACK_ENV %s;\n' % env.path
+        cmds += 'alias despacktivate "spack env deactivate";\n'
+        if prompt:
+            cmds += 'if (! $?SPACK_OLD_PROMPT ) '
+            cmds += 'setenv SPACK_OLD_PROMPT "${prompt}";\n'
+            cmds += 'set prompt="%s ${prompt}";\n' % prompt
+    else:
+        if os.getenv('TERM') and 'color' in os.getenv('TERM') and prompt:
+            prompt = colorize('@G{%s} ' % prompt, color=True)
+
+        cmds += 'export SPACK_ENV=%s;\n' % env.path
+        cmds += "alias despacktivate='spack env deactivate';\n"
+        if prompt:
+            cmds += 'if [ -z ${SPACK_OLD_PS1+x} ]; then\n'
+            cmds += '    if [ -z ${PS1+x} ]; then\n'
+            cmds += "        PS1='$$$$';\n"
+            cmds += '    fi;\n'
+            cmds += '    export SPACK_OLD_PS1="${PS1}";\n'
+            cmds += 'fi;\n'
+            cmds += 'export PS1="%s ${PS1}";\n' % prompt
+
+    if add_view and default_view_name in env.views:
+        with spack.store.db.read_transaction():
+            cmds += env.add_default_view_to_shell(shell, portable)
+
+    return cmds
+
+
 def find_environment(args):
     """Find active environment from args, spack.yaml, or environment variable.
 
@@ -447,7 +471,8 @@ def _eval_conditional(string):
 
 class ViewDescriptor(object):
     def __init__(self, root, projections={}, select=[], exclude=[],
-                 link=default_view_link):
+                 link=default_view_link, update=default_view_update,
+                 link_type=default_view_link_type):
         self.root = root
         self.projections = projections
         self.select = select
@@ -456,13 +481,17 @@ def __init__(self, root, projections={}, select=[], exclude=[],
         self.exclude_fn = lambda x: not any(x.satisfies(e)
                                             for e in self.exclude)
         self.link = link
+        self.update = update
+        self.link_type = link_type
 
     def __eq__(self, other):
         return all([self.root == other.root,
                     self.projections == other.projections,
                     self.select == other.select,
                     self.exclude == other.exclude,
-                    self.link == other.link])
+                    self.link == other.link,
+                    self.update == other.update,
+                    self.link_type == other.link_type])
 
     def to_dict(self):
         ret = {'root': self.root}
@@ -474,6 +503,10 @@ def to_dict(self):
             ret['exclude'] = self.exclude
         if self.link != default_view_link:
             ret['link'] = self.link
+        if self.update != default_view_update:
+            ret['update'] = self.update
+        if self.link_type != default_view_link_type:
+            ret['link_type'] = self.link_type
         return ret
 
     @staticmethod
@@ -482,12 +515,41 @@ def from_dict(d):
                               d.get('projections', {}),
                               d.get('select', []),
                               d.get('exclude', []),
-                              d.get('link', default_view_link))
+                              d.get('link', default_view_link),
+                              d.get('update', default_view_update),
+                              d.get('link_type', default_view_link_type))
 
-    def view(self):
-        return YamlFilesystemView(self.root, spack.store.layout,
+    def view(self, root=None):
+        return YamlFilesystemView(root or self.root, spack.store.layout,
                                   ignore_conflicts=True,
-                                  projections=self.projections)
+                                  projections=self.projections,
+                                  link_type=self.link_type)
+
+    @property
+    def generations_path(self):
+        """Directory with the generations of a view updated atomically."""
+        root_dir, root_name = os.path.split(os.path.normpath(self.root))
+        return os.path.join(root_dir, '._' + root_name)
+
+    def current_generation(self):
+        """Path to the generation the root of an atomic view points to, or
+        None if the root is not a link to one."""
+        if not os.path.islink(self.root):
+            return None
+        target = os.path.join(os.path.dirname(os.path.normpath(self.root)),
+                              os.readlink(self.root))
+        target = os.path.normpath(target)
+        if os.path.dirname(target) != self.generations_path:
+            return None
+        return target
+
+    def remove(self):
+        """Remove the view, with all its generations."""
+        if os.path.islink(self.root):
+            os.remove(self.root)
+        elif os.path.exists(self.root):
+            shutil.rmtree(self.root)
+        shutil.rmtree(self.generations_path, ignore_errors=True)
 
     def __contains__(self, spec):
         """Is the spec described by the view descriptor
@@ -527,6 +589,10 @@ def regenerate(self, all_specs, roots):
             installed_specs_for_view = set(
                 s for s in specs_for_view if s in self and s.package.installed)
 
+            if self.update == 'atomic':
+                self._swap_in(installed_specs_for_view)
+                return
+
             view = self.view()
 
             view.clean()
@@ -540,7 +606,229 @@ def regenerate(self, all_specs, roots):
             # spec.yaml files twice.
             view.remove_specs(*rm_specs, with_dependents=False,
                               all_specs=specs_in_view)
-            view.add_specs(*add_specs, with_dependencies=False)
+            view.add_specs(*add_specs, with_dependencies=False,
+                           jobs=spack.config.get('config:view_jobs', 8))
+
+    def _swap_in(self, specs):
+        """Link ``specs`` into a new generation of the view, and point the
+        root of the view to it in a single rename.
+
+        Generations are named by their content, so a view that didn't
+        change is not rebuilt. All other generations are removed once the
+        root points to the new one.
+        """
+        hashes = sorted(s.dag_hash() for s in specs)
+        content = sjson.dump({'descriptor': self.to_dict(), 'specs': hashes})
+        digest = hashlib.sha256(content.encode('utf-8')).hexdigest()[:32]
+        new_root = os.path.join(self.generations_path, digest)
+
+        old_root = self.current_generation()
+        if new_root != old_root:
+            if not os.path.exists(os.path.join(new_root, _generation_path)):
+                tty.msg("Updating view at {0}".format(self.root))
+                self._build_generation(specs, new_root, old_root)
+            self._point_root_to(new_root)
+
+        for name in os.listdir(self.generations_path):
+            path = os.path.join(self.generations_path, name)
+            if path == new_root:
+                continue
+            if os.path.isdir(path) and not os.path.islink(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                os.remove(path)
+
+    def _build_generation(self, specs, new_root, old_root):
+        """Link ``specs`` into the empty generation at ``new_root``.
+
+        Packages whose projection is a directory of their own, which they
+        had in the old generation too, are copied from there instead of
+        being linked again from their prefix.
+        """
+        if os.path.exists(new_root):
+            # Left behind by an update that didn't finish
+            shutil.rmtree(new_root)
+        fs.mkdirp(new_root)
+        view = self.view(new_root)
+
+        paths = dict((s.dag_hash(), os.path.relpath(
+            view.get_projection_for_spec(s), new_root)) for s in specs)
+
+        reused = set()
+        old_paths = self._read_generation(old_root)
+        if old_paths is not None:
+            shared = _overlapping_paths(
+                list(paths.items()) + list(old_paths.items()))
+            for spec in specs:
+                path = paths[spec.dag_hash()]
+                reusable = (path != os.curdir and path not in shared and
+                            old_paths.get(spec.dag_hash()) == path and
+                            not spec.package.is_extension and
+                            not spec.package.extendable)
+                if reusable and _copy_links(os.path.join(old_root, path),
+                                            os.path.join(new_root, path),
+                                            old_root):
+                    reused.add(spec)
+            view.adopt(self.view(old_root), reused)
+            tty.debug('Reused {0} packages from {1}'.format(
+                len(reused), old_root))
+
+        jobs = spack.config.get('config:view_jobs', 8)
+        view.add_specs(*(set(specs) - reused), with_dependencies=False,
+                       jobs=jobs)
+
+        # The generation is complete once it records its specs
+        generation_file = os.path.join(new_root, _generation_path)
+        fs.mkdirp(os.path.dirname(generation_file))
+        with open(generation_file, 'w') as f:
+            sjson.dump({'descriptor': self.to_dict(), 'specs': paths}, f)
+
+    def _read_generation(self, path):
+        """Projections of the specs in the generation at ``path``, if its
+        view was described like this one."""
+        if not path:
+            return None
+        try:
+            with open(os.path.join(path, _generation_path)) as f:
+                generation = sjson.load(f)
+        except (IOError, ValueError):
+            return None
+        if generation.get('descriptor') != self.to_dict():
+            return None
+        return generation['specs']
+
+    def _point_root_to(self, new_root):
+        """Atomically make the root of the view a link to ``new_root``."""
+        if os.path.exists(self.root) and not os.path.islink(self.root):
+            # The view was updated in place until now: a directory can't
+            # be replaced atomically, so move it out of the way first.
+            tty.debug('Moving view at {0} to {1}'.format(
+                self.root, self.generations_path))
+            os.rename(self.root, os.path.join(
+                self.generations_path, 'incremental-{0}'.format(os.getpid())))
+
+        root_dir = os.path.dirname(os.path.normpath(self.root))
+        tmp_link = os.path.join(
+            self.generations_path, 'link-{0}'.format(os.getpid()))
+        if os.path.lexists(tmp_link):
+            os.remove(tmp_link)
+        os.symlink(os.path.relpath(new_root, root_dir), tmp_link)
+        os.rename(tmp_link, self.root)
+
+
+def _overlapping_paths(owned_paths):
+    """Paths of ``(spec hash, path)`` pairs that are owned by more than one
+    spec, or that contain or are contained in the path of another spec."""
+    owners = collections.defaultdict(set)
+    for dag_hash, path in owned_paths:
+        owners[path].add(dag_hash)
+    shared = set(path for path, hashes in owners.items() if len(hashes) > 1)
+    for path in owners:
+        parent = os.path.dirname(path)
+        while parent:
+            if parent in owners:
+                shared.update((parent, path))
+            parent = os.path.dirname(parent)
+    return shared
+
+
+def _copy_links(src, dst, old_root):
+    """Copy the directories and links under ``src`` to ``dst``.
+
+    Returns False, and leaves nothing at ``dst``, if ``src`` has files or
+    links into ``old_root``, which can't be copied verbatim.
+    """
+    if not os.path.isdir(src) or os.path.islink(src):
+        return False
+    old_root = os.path.join(old_root, '')
+    try:
+        for dirpath, dirnames, filenames in os.walk(src):
+            target_dir = os.path.join(dst, os.path.relpath(dirpath, src))
+            fs.mkdirp(target_dir)
+            for name in dirnames + filenames:
+                path = os.path.join(dirpath, name)
+                if os.path.islink(path):
+                    target = os.readlink(path)
+                    if os.path.normpath(target).startswith(old_root):
+                        raise ValueError(path)
+                    os.symlink(target, os.path.join(target_dir, name))
+                elif name == empty_file_name:
+                    fs.touch(os.path.join(target_dir, name))
+                elif name not in dirnames:
+                    raise ValueError(path)
+    except (OSError, ValueError) as e:
+        tty.debug('Cannot reuse {0}: {1}'.format(src, str(e)))
+        shutil.rmtree(dst, ignore_errors=True)
+        return False
+    return True
+
+
+class _LockfileSpecs(MutableMapping):
+    """Concrete specs of the roots of an environment by build hash, which
+    are read from the nodes of its lockfile only when they are needed.
+
+    Nodes are read once, so the DAGs of all roots share their specs.
+    """
+
+    def __init__(self, nodes, root_hashes):
+        self._nodes = nodes               # node dicts by build hash
+        self._unread = set(root_hashes)   # roots not read into specs yet
+        self._roots = {}                  # roots read, or set, by hash
+        self._specs = {}                  # all nodes read, by build hash
+
+    def _read(self, build_hash):
+        spec = self._specs.get(build_hash)
+        if spec is None:
+            node_dict = self._nodes[build_hash]
+            spec = self._specs[build_hash] = Spec.from_node_dict(node_dict)
+            for _, dep_hash, deptypes in Spec.dependencies_from_node_dict(
+                    node_dict):
+                spec._add_dependency(self._read(dep_hash), deptypes)
+        return spec
+
+    def unread_nodes(self, build_hash, deptype='all'):
+        """Node dicts of the DAG of a root, by build hash, if the root has
+        not been read yet, or None.
+
+        Like ``Spec.traverse()``, only dependencies of ``deptype`` are
+        followed.
+        """
+        if build_hash not in self._unread:
+            return None
+        deptype = dp.canonical_deptype(deptype)
+        nodes, stack = {}, [build_hash]
+        while stack:
+            h = stack.pop()
+            if h not in nodes:
+                nodes[h] = self._nodes[h]
+                stack.extend(
+                    dep_hash for _, dep_hash, deptypes
+                    in Spec.dependencies_from_node_dict(nodes[h])
+                    if any(d in deptype for d in deptypes))
+        return nodes
+
+    def __getitem__(self, build_hash):
+        if build_hash in self._unread:
+            self._roots[build_hash] = self._read(build_hash)
+            self._unread.remove(build_hash)
+        return self._roots[build_hash]
+
+    def __setitem__(self, build_hash, spec):
+        self._unread.discard(build_hash)
+        self._roots[build_hash] = spec
+
+    def __delitem__(self, build_hash):
+        if build_hash in self._unread:
+            self._unread.remove(build_hash)
+        else:
+            del self._roots[build_hash]
+
+    def __iter__(self):
+        # Reading a root while iterating moves it between the two
+        return iter(list(itertools.chain(self._roots, self._unread)))
+
+    def __len__(self):
+        return len(self._roots) + len(self._unread)
 
 
 class Environment(object):
@@ -1050,7 +1338,7 @@ def default_view(self):
     def update_default_view(self, viewpath):
         name = default_view_name
         if name in self.views and self.default_view.root != viewpath:
-            shutil.rmtree(self.default_view.root)
+            self.default_view.remove()
 
         if viewpath:
             if name in self.views:
@@ -1064,11 +1352,54 @@ def regenerate_views(self):
         if not self.views:
             tty.debug("Skip view update, this environment does not"
                       " maintain a view")
-            return
+        else:
+            specs = self._get_environment_specs()
+            for view in self.views.values():
+                view.regenerate(specs, self.roots())
+
+        self.write_activation_scripts()
 
-        specs = self._get_environment_specs()
-        for view in self.views.values():
-            view.regenerate(specs, self.roots())
+    def activation_script_path(self, shell):
+        """Path of the script that activates the environment in ``shell``,
+        which is one of ``script_shells``."""
+        return os.path.join(self.env_subdir_path, 'activate.' + shell)
+
+    def activation_scripts_up_to_date(self):
+        """Whether the activation scripts are newer than the manifest and
+        the lockfile, which is what the shell support checks."""
+        try:
+            written = min(os.path.getmtime(self.activation_script_path(x))
+                          for x in script_shells)
+        except OSError:
+            return False
+        return all(written > os.path.getmtime(x)
+                   for x in (self.manifest_path, self.lock_path)
+                   if os.path.exists(x))
+
+    def write_activation_scripts(self):
+        """Writes the commands of ``spack env activate`` to scripts in the
+        environment directory.
+
+        The shell support sources them without running Spack, as long as
+        they are newer than the manifest and the lockfile. They are
+        rewritten whenever the lockfile or the views change.
+        """
+        scripts = [self.activation_script_path(x) for x in script_shells]
+        try:
+            fs.mkdirp(self.env_subdir_path)
+            with spack.store.db.read_transaction():
+                cmds = [_activate_commands(self, True, shell, None, True)
+                        for shell in script_shells]
+            for script, text in zip(scripts, cmds):
+                with fs.write_tmp_and_move(script) as f:
+                    f.write(text)
+        except (IOError, OSError, ValueError, spack.error.SpackError) as e:
+            # Stale scripts must go, so that the shell asks Spack instead
+            tty.debug('Cannot write activation scripts of {0}: {1}'.format(
+                self.name, e))
+            for script in scripts:
+                if os.path.exists(script):
+                    os.remove(script)
 
     prefix_inspections = {
         'bin': ['PATH'],
@@ -1102,8 +1433,10 @@ def environment_modifications_for_spec(self, spec, view=None):
         This list is specific to the location of the spec or its projection in
         the view."""
         spec = spec.copy()
+        fs_view = None
         if view:
-            spec.prefix = Prefix(view.view().get_projection_for_spec(spec))
+            fs_view = view.view()
+            spec.prefix = Prefix(fs_view.get_projection_for_spec(spec))
 
         # generic environment modifications determined by inspecting the spec
         # prefix
@@ -1113,20 +1446,19 @@ def environment_modifications_for_spec(self, spec, view=None):
             exclude=spack.util.environment.is_system_path
         )
 
-        # Let the extendee/dependency modify their extensions/dependents
-        # before asking for package-specific modifications
-        env.extend(
-            build_env.modifications_from_dependencies(
-                spec, context='run'
-            )
-        )
-        # Package specific modifications
-        build_env.set_module_variables_for_package(spec.package)
-        spec.package.setup_run_environment(env)
+        # Modifications of the extendee/dependencies and of the package
+        # itself, cached for installed specs
+        env.extend(build_env.run_environment_modifications(spec, fs_view))
 
         return env
 
-    def add_default_view_to_shell(self, shell):
+    def add_default_view_to_shell(self, shell, portable=False):
+        """Returns the commands that add the default view to ``shell``.
+
+        If ``portable`` is True, the commands modify the variables of the
+        shell they run in, rather than setting the values they would have
+        in the current environment.
+        """
         env_mod = spack.util.environment.EnvironmentModifications()
 
         if default_view_name not in self.views:
@@ -1145,6 +1477,8 @@ def add_default_view_to_shell(self, shell):
         for env_var in env_mod.group_by_name():
             env_mod.prune_duplicate_paths(env_var)
 
+        if portable:
+            return env_mod.shell_script(shell)
         return env_mod.shell_modifications(shell)
 
     def rm_default_view_from_shell(self, shell):
@@ -1189,32 +1523,173 @@ def _add_concrete_spec(self, spec, concrete, new=True):
         self.concretized_order.append(h)
         self.specs_by_hash[h] = concrete
 
-    def install_all(self, args=None):
+    def install_all(self, args=None, jobs=None):
         """Install all concretized specs in an environment.
 
+        By default the roots are installed one after the other, and the
+        first failure stops the install. If ``jobs`` is given, the union of
+        the DAGs of all roots is installed instead, ``jobs`` packages at a
+        time. The dependents of packages that fail are skipped, everything
+        else is installed, and a summary is printed for each root.
+
         Note: this does not regenerate the views for the environment;
         that needs to be done separately with a call to write().
 
+        Args:
+            args (Namespace): arguments of ``spack install``
+            jobs (int): number of packages to install at once
+
+        Returns:
+            (dict): reasons why roots were not installed, by build hash
         """
+        # Parse cli arguments and construct a dictionary
+        # that will be passed to Package.do_install API
+        kwargs = dict()
+        if args:
+            spack.cmd.install.update_kwargs_from_args(args, kwargs)
+
+        if jobs is not None:
+            return self._install_dag(kwargs, jobs)
+
         with spack.store.db.read_transaction():
             for concretized_hash in self.concretized_order:
                 spec = self.specs_by_hash[concretized_hash]
+                self._install(spec, **kwargs)
+                self._link_build_log(spec)
+        return {}
 
-                # Parse cli arguments and construct a dictionary
-                # that will be passed to Package.do_install API
-                kwargs = dict()
-                if args:
-                    spack.cmd.install.update_kwargs_from_args(args, kwargs)
+    def _link_build_log(self, spec):
+        if not spec.external:
+            # Link the resulting log file into logs dir
+            fs.mkdirp(self.log_path)
+            log_name = '%s-%s' % (spec.name, spec.dag_hash(7))
+            build_log_link = os.path.join(self.log_path, log_name)
+            if os.path.lexists(build_log_link):
+                os.remove(build_log_link)
+            os.symlink(spec.package.build_log_path, build_log_link)
 
-                self._install(spec, **kwargs)
+    def _install_dag(self, kwargs, jobs):
+        """Installs the union of the DAGs of the roots, ``jobs`` packages
+        at a time, skipping the dependents of packages that fail."""
+        jobs = max(1, jobs)
+        roots = dict((h, self.specs_by_hash[h])
+                     for h in self.concretized_order)
+
+        # Nodes are shared by DAG hash, and wait for all their dependencies
+        nodes, dependencies = {}, {}
+        dependents = collections.defaultdict(set)
+        for root in roots.values():
+            for spec in root.traverse():
+                h = spec.dag_hash()
+                if h not in nodes:
+                    nodes[h] = spec
+                    dependencies[h] = set(
+                        d.dag_hash() for d in spec.dependencies())
+                    for d in dependencies[h]:
+                        dependents[d].add(h)
+
+        # Roots are installed even if they are already there, so that they
+        # are marked explicit
+        root_hashes = set(x.dag_hash() for x in roots.values())
+        with spack.store.db.read_transaction():
+            done = set(h for h, spec in nodes.items()
+                       if h not in root_hashes and spec.package.installed)
+
+        waiting, running, errors = set(nodes) - done, {}, {}
+        results = multiprocessing.Queue()
+        tty.msg('Installing {0} of {1} packages, {2} at a time'.format(
+            len(waiting), len(nodes), jobs))
+        try:
+            while waiting or running:
+                ready = sorted(h for h in waiting if dependencies[h] <= done)
+                for h in ready[:max(0, jobs - len(running))]:
+                    waiting.remove(h)
+                    node_kwargs = dict(kwargs, install_deps=False,
+                                       explicit=h in root_hashes)
+                    if h not in root_hashes:
+                        node_kwargs.pop('install_package', None)
+                    args = (nodes[h], node_kwargs, results)
+                    if jobs == 1:
+                        _install_node(*args)
+                        running[h] = None
+                    else:
+                        running[h] = multiprocessing.Process(
+                            target=_install_node, args=args)
+                        running[h].start()
+
+                if not running:
+                    break
+                try:
+                    h, error = self._next_install_result(results, running)
+                except six.moves.queue.Empty:
+                    continue
+                process = running.pop(h)
+                if process is not None:
+                    process.join()
+                if error is None:
+                    done.add(h)
+                    continue
+
+                errors[h] = error
+                tty.error('Failed to install {0}: {1}'.format(
+                    nodes[h].format('{name}{/hash:7}'), error))
+                skipped = [h]
+                while skipped:
+                    for d in dependents[skipped.pop()]:
+                        if d in waiting:
+                            waiting.remove(d)
+                            errors[d] = 'depends on {0}, which failed'.format(
+                                nodes[h].format('{name}{/hash:7}'))
+                            skipped.append(d)
+        finally:
+            for process in running.values():
+                if process is not None:
+                    process.terminate()
+                    process.join()
+
+        # Summary of each root
+        failed, lines = {}, []
+        for build_hash in self.concretized_order:
+            spec = roots[build_hash]
+            name = spec.format('{name}{@version}{/hash:7}')
+            error = errors.get(spec.dag_hash())
+            if error is None:
+                self._link_build_log(spec)
+                lines.append('[+] {0}'.format(name))
+            else:
+                failed[build_hash] = error
+                lines.append('[x] {0}: {1}'.format(name, error))
+        tty.msg('Installed {0} of {1} roots of environment {2}'.format(
+            len(roots) - len(failed), len(roots), self.name), *lines)
+        return failed
 
-                if not spec.external:
-                    # Link the resulting log file into logs dir
-                    log_name = '%s-%s' % (spec.name, spec.dag_hash(7))
-                    build_log_link = os.path.join(self.log_path, log_name)
-                    if os.path.lexists(build_log_link):
-                        os.remove(build_log_link)
-                    os.symlink(spec.package.build_log_path, build_log_link)
+    @staticmethod
+    def _next_install_result(results, running, timeout=1):
+        """Waits up to ``timeout`` seconds for the next ``(hash, error)``
+        result of the ``running`` install processes.
+
+        Processes that were killed, e.g. by the OOM killer, never post a
+        result, and are reported as failed once they are dead.
+        """
+        try:
+            return results.get(timeout=timeout)
+        except six.moves.queue.Empty:
+            dead = [(h, p) for h, p in running.items()
+                    if p is not None and not p.is_alive()]
+            if not dead:
+                raise
+
+        # The result of a process that put it right before exiting is in
+        # the queue by now
+        try:
+            return results.get(timeout=timeout)
+        except six.moves.queue.Empty:
+            h, process = dead[0]
+            if process.exitcode < 0:
+                return h, 'install process was killed by signal {0}'.format(
+                    -process.exitcode)
+            return h, 'install process exited with status {0}'.format(
+                process.exitcode)
 
     def all_specs_by_hash(self):
         """Map of hashes to spec for all specs in this environment."""
@@ -1235,7 +1710,17 @@ def all_specs(self):
 
     def all_hashes(self):
         """Return all specs, even those a user spec would shadow."""
-        return list(self.all_specs_by_hash().keys())
+        hashes = set()
+        for h in self.concretized_order:
+            nodes = self._unread_nodes(h, deptype=('link', 'run'))
+            if nodes is None:
+                specs = self.specs_by_hash[h].traverse(
+                    deptype=('link', 'run'))
+                hashes.update(spec.dag_hash() for spec in specs)
+            else:
+                hashes.update(next(iter(node.values()))['hash']
+                              for node in nodes.values())
+        return list(hashes)
 
     def roots(self):
         """Specs explicitly requested by the user *in this environment*.
@@ -1305,7 +1790,15 @@ def _get_environment_specs(self, recurse_dependencies=True):
     def _to_lockfile_dict(self):
         """Create a dictionary to store a lockfile for this environment."""
         concrete_specs = {}
-        for spec in self.specs_by_hash.values():
+        for build_hash in self.specs_by_hash:
+            # Roots that weren't used are written as they were read
+            nodes = self._unread_nodes(build_hash)
+            if nodes is not None:
+                for h, node_dict in nodes.items():
+                    concrete_specs.setdefault(h, node_dict)
+                continue
+
+            spec = self.specs_by_hash[build_hash]
             for s in spec.traverse():
                 dag_hash_all = s.build_hash()
                 if dag_hash_all not in concrete_specs:
@@ -1343,12 +1836,23 @@ def _read_lockfile(self, file_or_json):
         return lockfile_dict['_meta']['lockfile-version']
 
     def _read_lockfile_dict(self, d):
-        """Read a lockfile dictionary into this environment."""
+        """Read a lockfile dictionary into this environment.
+
+        The concrete specs of the roots are only built from the lockfile
+        when they are first used.
+        """
         roots = d['roots']
         self.concretized_user_specs = [Spec(r['spec']) for r in roots]
         self.concretized_order = [r['hash'] for r in roots]
 
         json_specs_by_hash = d['concrete_specs']
+        if d['_meta']['lockfile-version'] > 1:
+            self.specs_by_hash = _LockfileSpecs(
+                json_specs_by_hash, self.concretized_order)
+            return
+
+        # Older lockfiles use dag hashes that exclude build deps, which
+        # are known only once the specs are built
         root_hashes = set(self.concretized_order)
 
         specs_by_hash = {}
@@ -1381,6 +1885,13 @@ def _read_lockfile_dict(self, d):
             self.concretized_order = [
                 old_hash_to_new.get(h, h) for h in self.concretized_order]
 
+    def _unread_nodes(self, build_hash, deptype='all'):
+        """Lockfile nodes of the DAG of a root that wasn't read into a
+        spec yet, by build hash, or None."""
+        if isinstance(self.specs_by_hash, _LockfileSpecs):
+            return self.specs_by_hash.unread_nodes(build_hash, deptype)
+        return None
+
     def write(self, regenerate_views=True):
         """Writes an in-memory environment to its location on disk.
 
@@ -1507,6 +2018,8 @@ def write(self, regenerate_views=True):
         # special case?
         if regenerate_views:
             self.regenerate_views()
+        else:
+            self.write_activation_scripts()
 
     def __enter__(self):
         self._previous_active = _active_environment
@@ -1519,6 +2032,23 @@ def __exit__(self, exc_type, exc_val, exc_tb):
             activate(self._previous_active)
 
 
+def _install_node(spec, kwargs, results):
+    """Installs a single node of the DAG of an environment, and puts its
+    DAG hash and an error message, or None, in the ``results`` queue."""
+    error = None
+    try:
+        spec.package.do_install(**kwargs)
+    except spack.error.SpackError as e:
+        error = e.message
+    except SystemExit as e:
+        # do_install calls tty.die() on some errors, which must not take
+        # down the other installs.
+        error = 'install exited with status {0}'.format(e.code)
+    except Exception as e:
+        error = str(e) or type(e).__name__
+    results.put((spec.dag_hash(), error))
+
+
 def display_specs(concretized_specs):
     """Displays the list of specs returned by `Environment.concretize()`.
 
@@ -24,25 +24,35 @@
 """
 import copy
 import functools
+import hashlib
 import os
 import os.path
 import re
 import shutil
+import socket
+import ssl
 import sys
+import tempfile
 import xml.etree.ElementTree
 
 import llnl.util.tty as tty
 import six
 import six.moves.urllib.parse as urllib_parse
+from six.moves import http_client
+from six.moves.urllib.error import URLError, HTTPError
+import spack.caches
 import spack.config
 import spack.error
+import spack.util.compression as compression
 import spack.util.crypto as crypto
+import spack.util.lock
 import spack.util.pattern as pattern
 import spack.util.url as url_util
 import spack.util.web as web_util
 from llnl.util.filesystem import (
     working_dir, mkdirp, temp_rename, temp_cwd, get_single_file)
-from spack.util.compression import decompressor_for, extension
+from llnl.util.lock import ReadTransaction, WriteTransaction
+from spack.util.compression import extension
 from spack.util.executable import which
 from spack.util.string import comma_and, quote
 from spack.version import Version, ver
@@ -62,6 +72,59 @@ def warn_content_type_mismatch(subject, content_type='HTML'):
         subject=subject, content_type=content_type))
 
 
+#: Size of the blocks read from the network when fetching with urllib
+_chunk_size = 2 ** 20
+
+#: Connections kept open across fetches, see _connection_cache()
+_connections = None
+_connections_pid = None
+
+
+def _connection_cache():
+    """Return the connection cache for fetches made by this process."""
+    global _connections, _connections_pid
+    if _connections is None or _connections_pid != os.getpid():
+        # Never share the sockets of a parent process after a fork
+        _connections = web_util.ConnectionCache()
+        _connections_pid = os.getpid()
+    return _connections
+
+
+def _native_expand():
+    """Whether archives are expanded by Spack itself, not tar or unzip."""
+    return spack.config.get('config:expand_method', 'executable') == 'python'
+
+
+def _open_url(connections, url, partial_file):
+    """Open ``url`` to download it into ``partial_file``.
+
+    HTTP(S) downloads continue an existing ``partial_file`` with a range
+    request, like ``curl -C -``.  Returns a tuple with the final URL, the
+    response headers, a file-like object with the body, and whether the
+    body continues the data already in ``partial_file``.
+    """
+    if not connections.handles(url):
+        response_url, headers, stream = web_util.read_from_url(url)
+        return response_url, headers, stream, False
+
+    offset = 0
+    if os.path.exists(partial_file):
+        offset = os.path.getsize(partial_file)
+    if offset:
+        try:
+            response_url, response = connections.urlopen(
+                url, {'Range': 'bytes=%d-' % offset})
+            return (response_url, response.msg, response,
+                    response.status == 206)
+        except HTTPError as e:
+            # 416 means the partial file can't be continued; start over
+            if e.code != 416:
+                raise
+
+    response_url, response = connections.urlopen(url)
+    return response_url, response.msg, response, False
+
+
 def _needs_stage(fun):
     """Many methods on fetch strategies require a stage to be set
        using set_stage().  This decorator adds a check for self.stage."""
@@ -259,6 +322,8 @@ def __init__(self, url=None, checksum=None, **kwargs):
         self.expand_archive = kwargs.get('expand', True)
         self.extra_curl_options = kwargs.get('curl_options', [])
         self._curl = None
+        self._fetched_sum = None
+        self._expanded_container = None
 
         self.extension = kwargs.get('extension', None)
 
@@ -307,6 +372,13 @@ def fetch(self):
             raise FailedDownloadError(self.url)
 
     def _fetch_from_url(self, url):
+        self._fetched_sum = None
+        self._expanded_container = None
+        if spack.config.get('config:url_fetch_method', 'curl') == 'urllib':
+            return self._fetch_urllib(url)
+        return self._fetch_curl(url)
+
+    def _fetch_curl(self, url):
         save_file = None
         partial_file = None
         if self.stage.save_filename:
@@ -386,6 +458,93 @@ def _fetch_from_url(self, url):
             warn_content_type_mismatch(self.archive_file or "the archive")
         return partial_file, save_file
 
+    def _fetch_urllib(self, url):
+        save_file = self.stage.save_filename
+        if not save_file:
+            save_file = os.path.join(
+                self.stage.path, os.path.basename(url_util.parse(url).path))
+        partial_file = save_file + '.part'
+        tty.msg("Fetching %s" % url)
+
+        # Hash the archive as it is written, so check() needn't reread it
+        hasher = None
+        if self.digest:
+            try:
+                hasher = crypto.hash_fun_for_digest(self.digest)()
+            except ValueError:
+                pass
+
+        connections = _connection_cache()
+        try:
+            response_url, headers, stream, resume = _open_url(
+                connections, url, partial_file)
+        except HTTPError as e:
+            if os.path.exists(partial_file):
+                os.remove(partial_file)
+            if e.code == 404:
+                raise FailedDownloadError(
+                    self.url, "URL %s was not found!" % url)
+            raise FailedDownloadError(
+                self.url, "Failed to fetch %s: %s" % (url, e))
+        except (URLError, web_util.SpackWebError) as e:
+            if isinstance(getattr(e, 'reason', None), ssl.SSLError):
+                raise FailedDownloadError(
+                    self.url,
+                    "Spack was unable to fetch due to an invalid "
+                    "certificate. This is either an attack, or your "
+                    "cluster's SSL configuration is bad.  If you believe "
+                    "your SSL configuration is bad, you can try running "
+                    "spack -k, which will not check SSL certificates."
+                    "Use this at your own risk.")
+            raise FailedDownloadError(
+                self.url, "Failed to fetch %s: %s" % (url, e))
+
+        # Extract tarballs while they download if Spack extracts them
+        extractor = None
+        if (not resume and self.expand_archive and _native_expand() and
+                compression.streamable(url, self.extension)):
+            shutil.rmtree(self._tarball_container, ignore_errors=True)
+            extractor = compression.StreamingExtractor(
+                self._tarball_container)
+
+        complete = False
+        try:
+            if resume and hasher:
+                # Continuing a partial download: hash what we already have
+                with open(partial_file, 'rb') as f:
+                    for chunk in iter(lambda: f.read(_chunk_size), b''):
+                        hasher.update(chunk)
+
+            with open(partial_file, 'ab' if resume else 'wb') as f:
+                for chunk in iter(lambda: stream.read(_chunk_size), b''):
+                    f.write(chunk)
+                    if hasher:
+                        hasher.update(chunk)
+                    if extractor:
+                        extractor.write(chunk)
+            complete = True
+        except (socket.error, http_client.HTTPException) as e:
+            # Keep the partial file, the next attempt will continue it
+            connections.discard(response_url)
+            raise FailedDownloadError(
+                self.url, "Failed to fetch %s: %s" % (url, e))
+        finally:
+            if extractor and extractor.close() and complete:
+                self._expanded_container = extractor.destination
+            elif extractor:
+                # expand() will extract the saved archive instead
+                tty.debug("Could not extract %s while fetching it: %s" %
+                          (url, extractor.error))
+                shutil.rmtree(extractor.destination, ignore_errors=True)
+
+        if hasher:
+            self._fetched_sum = hasher.hexdigest()
+
+        content_type = headers.get('Content-Type') if headers else None
+        if content_type and 'text/html' in content_type:
+            warn_content_type_mismatch(self.archive_file or "the archive")
+        return partial_file, save_file
+
     @property
     @_needs_stage
     def archive_file(self):
@@ -396,6 +555,11 @@ def archive_file(self):
     def cachable(self):
         return self.cache_enabled and bool(self.digest)
 
+    @property
+    def _tarball_container(self):
+        """Directory in the stage the archive is first extracted into."""
+        return os.path.join(self.stage.path, "spack-expanded-archive")
+
     @_needs_stage
     def expand(self):
         if not self.expand_archive:
@@ -422,16 +586,21 @@ def expand(self):
             tty.debug('Source already staged to %s' % self.stage.source_path)
             return
 
-        decompress = decompressor_for(self.archive_file, self.extension)
-
         # Expand all tarballs in their own directory to contain
         # exploding tarballs.
-        tarball_container = os.path.join(self.stage.path,
-                                         "spack-expanded-archive")
+        tarball_container = self._tarball_container
 
-        mkdirp(tarball_container)
-        with working_dir(tarball_container):
-            decompress(self.archive_file)
+        if (self._expanded_container == tarball_container and
+                os.path.isdir(tarball_container)):
+            tty.debug("Archive was expanded while it was fetched")
+        else:
+            # Don't expand over the leftovers of an interrupted expansion
+            shutil.rmtree(tarball_container, ignore_errors=True)
+            mkdirp(tarball_container)
+            compression.extract_archive(
+                self.archive_file, tarball_container, self.extension,
+                native=_native_expand())
+        self._expanded_container = None
 
         # Check for an exploding tarball, i.e. one that doesn't expand to
         # a single directory.  If the tarball *didn't* explode, move its
@@ -485,7 +654,19 @@ def check(self):
                 "Attempt to check URLFetchStrategy with no digest.")
 
         checker = crypto.Checker(self.digest)
-        if not checker.check(self.archive_file):
+        if self._fetched_sum:
+            # The archive was hashed while it was downloaded, or was
+            # already checked: don't read it again
+            checker.sum = self._fetched_sum
+            matches = checker.sum == checker.hexdigest
+        else:
+            matches = checker.check(self.archive_file)
+            if matches:
+                self._fetched_sum = checker.sum
+        if not matches:
+            if self._expanded_container:
+                shutil.rmtree(self._expanded_container, ignore_errors=True)
+                self._expanded_container = None
             raise ChecksumError(
                 "%s checksum failed for %s" %
                 (checker.hash_name, self.archive_file),
@@ -525,8 +706,21 @@ def __str__(self):
 class CacheURLFetchStrategy(URLFetchStrategy):
     """The resource associated with a cache URL may be out of date."""
 
+    #: Read lock of a cache that may be trimmed, held while the archive is
+    #: taken from it
+    cache_lock = None
+
     @_needs_stage
     def fetch(self):
+        if self.cache_lock is None:
+            self._fetch_from_cache()
+        else:
+            with ReadTransaction(self.cache_lock):
+                self._fetch_from_cache()
+
+    def _fetch_from_cache(self):
+        self._fetched_sum = None
+        self._expanded_container = None
         path = re.sub('^file://', '', self.url)
 
         # check whether the cache file exists.
@@ -535,11 +729,19 @@ def fetch(self):
 
         # remove old symlink if one is there.
         filename = self.stage.save_filename
-        if os.path.exists(filename):
+        if os.path.lexists(filename):
             os.remove(filename)
 
-        # Symlink to local cached archive.
-        os.symlink(path, filename)
+        if self.cache_lock is None:
+            # Symlink to local cached archive.
+            os.symlink(path, filename)
+        else:
+            # A link would break if the archive is trimmed from the cache
+            try:
+                os.link(path, filename)
+            except OSError:
+                shutil.copy(path, filename)
+        _touch(path)
 
         # Remove link if checksum fails, or subsequent fetchers
         # will assume they don't need to download.
@@ -786,7 +988,10 @@ def fetch(self):
         tty.msg("Cloning git repository: {0}".format(self._repo_info()))
 
         git = self.git
-        if self.commit:
+        if spack.config.get('config:git_cache', False):
+            self._clone_from_repo_cache()
+
+        elif self.commit:
             # Need to do a regular clone and check out everything if
             # they asked for a particular commit.
             debug = spack.config.get('config:debug')
@@ -866,6 +1071,39 @@ def fetch(self):
                     args.insert(1, '--quiet')
                 git(*args)
 
+    def _clone_from_repo_cache(self):
+        """Clone the repository from its bare copy in the repository cache.
+
+        The cached copy only fetches what's new from the remote, and the
+        local clone hardlinks its objects, so the stage doesn't depend on
+        the cache once it is cloned.
+        """
+        git = self.git
+        ref = self.commit or self.tag
+        cached_repo = spack.caches.git_repo_cache.update(git, self.url, ref)
+
+        quiet = [] if spack.config.get('config:debug') else ['--quiet']
+        args = ['clone'] + quiet
+        if self.branch:
+            args.extend(['--branch', self.branch])
+
+        # Name the clone as a clone of the remote would be, since it is
+        # the placement of resources and the top directory of archives
+        repo_name = re.split(r'[/:]', self.url.rstrip('/'))[-1]
+        if repo_name.endswith('.git'):
+            repo_name = repo_name[:-len('.git')]
+        repo_name = repo_name or 'repo'
+
+        with temp_cwd():
+            git(*(args + [cached_repo, repo_name]))
+            with working_dir(repo_name):
+                # Fetch submodules and later updates from the real remote
+                git('remote', 'set-url', 'origin', self.url)
+                if ref:
+                    git(*(['checkout'] + quiet + [ref]))
+            self.stage.srcdir = repo_name
+            shutil.move(repo_name, self.stage.source_path)
+
     def archive(self, destination):
         super(GitFetchStrategy, self).archive(destination, exclude='.git')
 
@@ -1368,9 +1606,64 @@ def from_list_url(pkg):
 
 
 class FsCache(object):
+    """Local cache of downloaded archives.
 
-    def __init__(self, root):
+    Archives are stored under their mirror storage path, which contains
+    their checksum, and are published atomically, so concurrent Spack
+    processes can share the cache.  If ``max_size`` is set, the cache
+    keeps a running total of the size of the archives it stores, and the
+    least recently used archives are removed when it grows larger.
+    """
+
+    #: Directories of other caches kept in the root of this one
+    other_caches = ('blobs', 'git-repos')
+
+    def __init__(self, root, max_size=None):
         self.root = os.path.abspath(root)
+        self.max_size = max_size
+        self._lock = None
+        self._size_lock = None
+
+    @property
+    def lock(self):
+        """Lock on the whole cache.  Archives are stored and read with a
+        read lock held, and removed with a write lock."""
+        if self._lock is None:
+            mkdirp(self.root)
+            self._lock = spack.util.lock.Lock(
+                os.path.join(self.root, '.lock'), start=0, length=1)
+        return self._lock
+
+    @property
+    def _size_path(self):
+        return os.path.join(self.root, '.size')
+
+    @property
+    def size_lock(self):
+        """Lock on the running total of the cache size."""
+        if self._size_lock is None:
+            self._size_lock = spack.util.lock.Lock(
+                self.lock.path, start=1, length=1)
+        return self._size_lock
+
+    def _add_size(self, size):
+        """Add ``size`` bytes to the running total of the cache size, and
+        return the new total.  The total is computed from the cached files
+        the first time."""
+        with WriteTransaction(self.size_lock):
+            try:
+                with open(self._size_path) as f:
+                    total = int(f.read()) + size
+            except (IOError, ValueError):
+                total = self.size()
+            self._write_size(total)
+        return total
+
+    def _write_size(self, total):
+        tmp = '{0}.tmp{1}'.format(self._size_path, os.getpid())
+        with open(tmp, 'w') as f:
+            f.write(str(total))
+        os.rename(tmp, self._size_path)
 
     def store(self, fetcher, relative_dest):
         # skip fetchers that aren't cachable
@@ -1382,17 +1675,166 @@ def store(self, fetcher, relative_dest):
             return
 
         dst = os.path.join(self.root, relative_dest)
-        mkdirp(os.path.dirname(dst))
-        fetcher.archive(dst)
+        stored = False
+        with ReadTransaction(self.lock):
+            if os.path.exists(dst):
+                # Another process published it already
+                _touch(dst)
+            else:
+                mkdirp(os.path.dirname(dst))
+                fd, tmp = tempfile.mkstemp(
+                    dir=os.path.dirname(dst), prefix='.tmp-')
+                os.close(fd)
+                try:
+                    fetcher.archive(tmp)
+                    os.rename(tmp, dst)
+                    stored = True
+                finally:
+                    if os.path.exists(tmp):
+                        os.remove(tmp)
+
+        # Only walk the cache to trim it when it is over budget
+        if stored and self.max_size is not None:
+            if self._add_size(os.path.getsize(dst)) > self.max_size:
+                self.trim(self.max_size)
 
     def fetcher(self, target_path, digest, **kwargs):
         path = os.path.join(self.root, target_path)
-        return CacheURLFetchStrategy(path, digest, **kwargs)
+        fetcher = CacheURLFetchStrategy(path, digest, **kwargs)
+        if self.max_size is not None:
+            # Archives may be trimmed by other processes while staged
+            fetcher.cache_lock = self.lock
+        return fetcher
+
+    def size(self):
+        """Total size in bytes of the files in the cache."""
+        return sum(size for _, size, _ in self._entries())
+
+    def _entries(self):
+        """Yield the path, size and last use time of all cached files.
+
+        The caches sharing the root of this one, the git mirrors and blobs
+        of ``spack.caches``, manage their own files and are left out, as
+        are lock files and hidden files, like archives being stored.
+        """
+        for root, dirs, files in os.walk(self.root):
+            dirs[:] = [d for d in dirs
+                       if not (d.startswith('.') or d.endswith('.git') or
+                               root == self.root and d in self.other_caches)]
+            for name in files:
+                if name.startswith('.') or name.endswith('.lock'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.lstat(path)
+                except OSError:
+                    continue
+                yield path, st.st_size, st.st_mtime
+
+    def trim(self, max_size):
+        """Remove the least recently used files until the cache is not
+        larger than ``max_size`` bytes.
+
+        Returns the number of bytes freed.
+        """
+        freed = 0
+        with WriteTransaction(self.lock):
+            entries = sorted(self._entries(), key=lambda e: e[2])
+            total = sum(size for _, size, _ in entries)
+            for path, size, _ in entries:
+                if total <= max_size:
+                    break
+                tty.debug('Removing cached file %s' % path)
+                os.remove(path)
+                total -= size
+                freed += size
+
+            # Files added by other means are counted here
+            with WriteTransaction(self.size_lock):
+                self._write_size(total)
+        return freed
 
     def destroy(self):
         shutil.rmtree(self.root, ignore_errors=True)
 
 
+class GitRepoCache(object):
+    """Bare mirrors of git repositories, one per remote URL.
+
+    Stages clone from the mirror instead of the remote, and the mirror
+    only fetches what's new from the remote.  Each mirror is locked while
+    it is created or updated, so concurrent Spack processes can share it.
+    """
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self._locks = {}
+        self._updated = set()
+
+    def path_for(self, url):
+        """Path of the bare mirror of the repository at ``url``."""
+        name = os.path.basename(url.rstrip('/'))
+        if name.endswith('.git'):
+            name = name[:-4]
+        digest = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.root, '%s-%s.git' % (name, digest[:12]))
+
+    def _lock(self, url):
+        if url not in self._locks:
+            mkdirp(self.root)
+            digest = hashlib.sha1(url.encode('utf-8')).digest()
+            self._locks[url] = spack.util.lock.Lock(
+                os.path.join(self.root, '.lock'),
+                start=crypto.prefix_bits(
+                    digest, crypto.bit_length(sys.maxsize)),
+                length=1)
+        return self._locks[url]
+
+    def update(self, git, url, ref=None):
+        """Create or update the mirror of ``url`` and return its path.
+
+        Nothing is fetched if the mirror already has ``ref``, a commit or
+        a tag, or if it was already updated by this process.
+        """
+        path = self.path_for(url)
+        quiet = [] if spack.config.get('config:debug') else ['--quiet']
+        with WriteTransaction(self._lock(url)):
+            if not os.path.isdir(path):
+                tty.msg('Creating git mirror of {0}'.format(url))
+                tmp = tempfile.mkdtemp(dir=self.root, prefix='.tmp-')
+                try:
+                    git(*(['clone', '--mirror'] + quiet + [url, tmp]))
+                    os.rename(tmp, path)
+                finally:
+                    shutil.rmtree(tmp, ignore_errors=True)
+
+            elif url not in self._updated and not (
+                    ref and self._has_ref(git, path, ref)):
+                tty.msg('Updating git mirror of {0}'.format(url))
+                git(*(['--git-dir', path, 'fetch', '--prune'] + quiet +
+                      ['origin']))
+
+        self._updated.add(url)
+        return path
+
+    def _has_ref(self, git, path, ref):
+        git('--git-dir', path, 'rev-parse', '--quiet', '--verify',
+            ref + '^{commit}', output=str, error=str, fail_on_error=False)
+        return git.returncode == 0
+
+    def destroy(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+def _touch(path):
+    """Mark a cached file as recently used."""
+    try:
+        os.utime(path, None)
+    except OSError:
+        # e.g. a cache shared read-only
+        pass
+
+
 class FetchError(spack.error.SpackError):
     """Superclass fo fetcher errors."""
 
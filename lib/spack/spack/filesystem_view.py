@@ -3,6 +3,9 @@
 #
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
+import contextlib
+import errno
+import fcntl
 import filecmp
 import functools as ft
 import os
@@ -10,13 +13,14 @@
 import shutil
 import sys
 
-from llnl.util.link_tree import LinkTree, MergeConflictError
+from llnl.util.link_tree import LinkTree, LinkPlan, MergeConflictError
 from llnl.util import tty
 from llnl.util.lang import match_predicate, index_by
 from llnl.util.tty.color import colorize
 from llnl.util.filesystem import (
     mkdirp, remove_dead_links, remove_empty_directories)
 
+import spack.util.spack_json as sjson
 import spack.util.spack_yaml as s_yaml
 
 import spack.spec
@@ -38,6 +42,7 @@
 
 
 _projections_path = '.spack/projections.yaml'
+_manifest_path = '.spack/manifest.json'
 
 
 class FilesystemView(object):
@@ -58,7 +63,9 @@ def __init__(self, root, layout, **kwargs):
             Initialize a filesystem view under the given `root` directory with
             corresponding directory `layout`.
 
-            Files are linked by method `link` (os.symlink by default).
+            Files are added by the method for `link_type`, one of
+            `view_link_types` ("symlink" by default), unless a `link`
+            method is given.
         """
         self._root = root
         self.layout = layout
@@ -66,7 +73,8 @@ def __init__(self, root, layout, **kwargs):
         self.projections = kwargs.get('projections', {})
 
         self.ignore_conflicts = kwargs.get("ignore_conflicts", False)
-        self.link = kwargs.get("link", os.symlink)
+        self.link_type = kwargs.get("link_type", "symlink")
+        self.link = kwargs.get("link", view_func_parser(self.link_type))
         self.verbose = kwargs.get("verbose", False)
 
     def add_specs(self, *specs, **kwargs):
@@ -83,6 +91,9 @@ def add_specs(self, *specs, **kwargs):
             Should except an `exclude` keyword argument containing a list of
             regexps that filter out matching spec names.
 
+            May accept a `jobs` keyword argument (default 1) with the number
+            of packages to link at the same time.
+
             This method should make use of `activate_{extension,standalone}`.
         """
         raise NotImplementedError
@@ -207,6 +218,14 @@ def __init__(self, root, layout, **kwargs):
 
         self._croot = colorize_root(self._root) + " "
 
+        # Specs in the view, and the links they own, by the path of their
+        # meta folder relative to the root. Read when first needed.
+        self.manifest_path = os.path.join(self._root, _manifest_path)
+        self._manifest = None
+        self._manifest_specs = {}
+        self._manifest_changed = False
+        self._manifest_transactions = 0
+
     def write_projections(self):
         if self.projections:
             mkdirp(os.path.dirname(self.projections_path))
@@ -223,7 +242,99 @@ def read_projections(self):
         else:
             return {}
 
+    @property
+    def manifest(self):
+        """Entries of the specs in the view, by the path of their meta
+        folder relative to the root of the view.
+
+        Each entry has the ``spec`` as a dictionary, the ``prefix`` its
+        files are merged into, and the ``files`` it linked there relative
+        to the prefix, if they are known. Views without a manifest are
+        scanned once to make one.
+        """
+        if self._manifest is None:
+            try:
+                with open(self.manifest_path) as f:
+                    self._manifest = sjson.load(f)['specs']
+            except (IOError, ValueError, KeyError):
+                self._manifest = {}
+                for path, spec in self._scan_specs():
+                    key = os.path.relpath(path, self._root)
+                    self._manifest[key] = {'spec': spec.to_dict()}
+                    self._manifest_specs[key] = spec
+        return self._manifest
+
+    @contextlib.contextmanager
+    def _manifest_transaction(self):
+        """Write the manifest once, after all the changes made within."""
+        self._manifest_transactions += 1
+        try:
+            yield
+        finally:
+            self._manifest_transactions -= 1
+            if self._manifest_transactions == 0 and self._manifest_changed:
+                self._write_manifest()
+
+    def _write_manifest(self):
+        self._manifest_changed = False
+        if not self.manifest:
+            if os.path.exists(self.manifest_path):
+                os.remove(self.manifest_path)
+                try:
+                    os.rmdir(os.path.dirname(self.manifest_path))
+                except OSError:
+                    pass
+            return
+        mkdirp(os.path.dirname(self.manifest_path))
+        tmp_path = '{0}.tmp{1}'.format(self.manifest_path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            sjson.dump({'specs': self.manifest}, f)
+        os.rename(tmp_path, self.manifest_path)
+
+    def _manifest_key(self, spec):
+        return os.path.relpath(self.get_path_meta_folder(spec), self._root)
+
+    def _record(self, spec, prefix=None, files=None, directories=()):
+        """Add ``spec`` to the manifest, with the ``files`` and
+        ``directories`` it merged into ``prefix`` if they are known."""
+        key = self._manifest_key(spec)
+        entry = {'spec': spec.to_dict()}
+        if files is not None:
+            entry['prefix'] = os.path.relpath(prefix, self._root)
+            entry['files'] = sorted(os.path.relpath(f, prefix) for f in files)
+            entry['directories'] = sorted(
+                os.path.relpath(d, prefix) for d in directories
+                if os.path.normpath(d) != os.path.normpath(prefix))
+        self.manifest[key] = entry
+        self._manifest_specs[key] = spec
+        self._manifest_changed = True
+        if not self._manifest_transactions:
+            self._write_manifest()
+
+    def _forget(self, spec):
+        """Remove ``spec`` from the manifest."""
+        key = self._manifest_key(spec)
+        self.manifest.pop(key, None)
+        self._manifest_specs.pop(key, None)
+        self._manifest_changed = True
+        if not self._manifest_transactions:
+            self._write_manifest()
+
+    def adopt(self, view, specs):
+        """Record ``specs``, whose links were copied from the same paths in
+        another ``view``, in the manifest of this view."""
+        for spec in specs:
+            key = self._manifest_key(spec)
+            self.manifest[key] = view.manifest[view._manifest_key(spec)]
+        self._manifest_changed = True
+        if not self._manifest_transactions:
+            self._write_manifest()
+
     def add_specs(self, *specs, **kwargs):
+        with self._manifest_transaction():
+            self._add_specs(*specs, **kwargs)
+
+    def _add_specs(self, *specs, **kwargs):
         assert all((s.concrete for s in specs))
         specs = set(specs)
 
@@ -245,7 +356,7 @@ def add_specs(self, *specs, **kwargs):
 
         set(map(self._check_no_ext_conflicts, extensions))
         # fail on first error, otherwise link extensions as well
-        if all(map(self.add_standalone, standalones)):
+        if self._add_standalones(standalones, kwargs.get("jobs", 1)):
             all(map(self.add_extension, extensions))
 
     def add_extension(self, spec):
@@ -271,72 +382,180 @@ def add_extension(self, spec):
         return True
 
     def add_standalone(self, spec):
-        if spec.package.is_extension:
-            tty.error(self._croot + 'Package %s is an extension.'
-                      % spec.name)
-            return False
-
-        if spec.external:
-            tty.warn(self._croot + 'Skipping external package: %s'
-                     % colorize_spec(spec))
-            return True
+        return self._add_standalones([spec])
 
-        if self.check_added(spec):
-            tty.warn(self._croot + 'Skipping already linked package: %s'
-                     % colorize_spec(spec))
-            return True
+    def _add_standalones(self, specs, jobs=1):
+        """Link standalone packages into the view.
 
-        if spec.package.extendable:
-            # Check for globally activated extensions in the extendee that
-            # we're looking at.
-            activated = [p.spec for p in
-                         spack.store.db.activated_extensions_for(spec)]
-            if activated:
-                tty.error("Globally activated extensions cannot be used in "
-                          "conjunction with filesystem views. "
-                          "Please deactivate the following specs: ")
-                spack.cmd.display_specs(activated, flags=True, variants=True,
-                                        long=False)
+        All packages are merged with a single link plan: each prefix is
+        walked once, and ``jobs`` threads create the directories and
+        links. Extensions change files of their extendee, and are
+        activated one after the other instead.
+        """
+        to_merge = []
+        for spec in specs:
+            if spec.package.is_extension:
+                tty.error(self._croot + 'Package %s is an extension.'
+                          % spec.name)
                 return False
 
-        self.merge(spec)
-
-        self.link_meta_folder(spec)
+            if spec.external:
+                tty.warn(self._croot + 'Skipping external package: %s'
+                         % colorize_spec(spec))
+                continue
+
+            if self.check_added(spec):
+                tty.warn(self._croot + 'Skipping already linked package: %s'
+                         % colorize_spec(spec))
+                continue
+
+            if spec.package.extendable:
+                # Check for globally activated extensions in the extendee
+                # that we're looking at.
+                activated = [p.spec for p in
+                             spack.store.db.activated_extensions_for(spec)]
+                if activated:
+                    tty.error("Globally activated extensions cannot be used "
+                              "in conjunction with filesystem views. "
+                              "Please deactivate the following specs: ")
+                    spack.cmd.display_specs(activated, flags=True,
+                                            variants=True, long=False)
+                    return False
+
+            to_merge.append(spec)
+
+        with self._manifest_transaction():
+            self._merge(to_merge, with_meta_folders=True, jobs=jobs)
 
         if self.verbose:
-            tty.info(self._croot + 'Linked package: %s' % colorize_spec(spec))
+            for spec in to_merge:
+                tty.info(self._croot + 'Linked package: %s'
+                         % colorize_spec(spec))
         return True
 
     def merge(self, spec, ignore=None):
-        pkg = spec.package
-        view_source = pkg.view_source()
-        view_dst = pkg.view_destination(self)
+        self._merge([spec], ignore=ignore)
 
-        tree = LinkTree(view_source)
+    def _merge(self, specs, ignore=None, with_meta_folders=False, jobs=1):
+        """Merge the prefixes of ``specs``, and optionally their metadata,
+        into the view.
 
+        Conflicts between the packages, and with the view, are found
+        before anything is linked. Packages that customize how their
+        files are added to views are linked by their own hooks, after
+        the others.
+
+        Views that copy files relocate the prefixes of the packages in
+        the view, in the text files of each package. Files copied before
+        their dependencies were added are relocated when they are.
+        """
         ignore = ignore or (lambda f: False)
         ignore_file = match_predicate(
             self.layout.hidden_file_paths, ignore)
 
-        # check for dir conflicts
-        conflicts = tree.find_dir_conflicts(view_dst, ignore_file)
-
-        merge_map = tree.get_file_map(view_dst, ignore_file)
-        if not self.ignore_conflicts:
-            conflicts.extend(pkg.view_file_conflicts(self, merge_map))
-
-        if conflicts:
-            raise MergeConflictError(conflicts[0])
-
-        # merge directories with the tree
-        tree.merge_directories(view_dst, ignore_file)
-
-        pkg.add_files_to_view(self, merge_map)
+        pkgs = [spec.package for spec in specs]
+        trees = [(pkg.view_source(), pkg.view_destination(self), ignore_file)
+                 for pkg in pkgs]
+        if with_meta_folders:
+            trees.extend((spack.store.layout.metadata_path(spec),
+                          self.get_path_meta_folder(spec), None)
+                         for spec in specs)
+
+        prefixes = [None] * len(trees)
+        if self.link_type in view_copy_types:
+            in_view = set(specs).union(self.get_all_specs())
+            for i, spec in enumerate(specs):
+                prefixes[i] = self._projected_prefixes(spec, in_view)
+
+        with LinkPlan(jobs=jobs) as plan:
+            merge_maps = plan.add_trees(trees)
+            existing = plan.check_destination()
+            conflicts = list(plan.conflicts)
+
+            links, linked, customized = [], set(), []
+            for i, merge_map in enumerate(merge_maps):
+                pkg = pkgs[i] if i < len(pkgs) else None
+                if pkg and not _default_view_hooks(pkg):
+                    if not self.ignore_conflicts:
+                        conflicts.extend(
+                            pkg.view_file_conflicts(self, merge_map))
+                    customized.append((pkg, merge_map))
+                    continue
+
+                # there should be no conflicts when linking the meta folder
+                check = not (pkg and self.ignore_conflicts)
+                for src, dst in merge_map.items():
+                    if dst in existing or dst in linked:
+                        if check:
+                            conflicts.append(dst)
+                        continue
+                    linked.add(dst)
+                    links.append((src, dst, prefixes[i]))
+
+            if conflicts:
+                raise MergeConflictError(conflicts[0])
+
+            plan.make_directories()
+            plan.link_files(links, self._link)
+            tree_directories = plan.tree_directories
+
+        for pkg, merge_map in customized:
+            pkg.add_files_to_view(self, merge_map)
+
+        if with_meta_folders:
+            # Remember which links each package owns, so they can be
+            # removed without walking its prefix again
+            owned = set(link[1] for link in links)
+            for spec, pkg, merge_map, directories in zip(
+                    specs, pkgs, merge_maps, tree_directories):
+                files = None
+                if _default_view_hooks(pkg):
+                    files = [d for d in merge_map.values() if d in owned]
+                self._record(spec, pkg.view_destination(self), files,
+                             directories)
+
+            if self.link_type in view_copy_types:
+                self._relocate_dependents(specs)
+
+    def _link(self, src, dst, prefixes=None):
+        if prefixes:
+            self.link(src, dst, prefixes=prefixes)
+        else:
+            self.link(src, dst)
+
+    def _projected_prefixes(self, spec, in_view):
+        """Map the prefixes of ``spec`` and its dependencies in the view
+        to their projections."""
+        return dict((str(dep.prefix), self.get_projection_for_spec(dep))
+                    for dep in spec.traverse()
+                    if dep in in_view and not dep.external)
+
+    def _relocate_dependents(self, specs):
+        """Relocate the files of packages in the view that depend on
+        ``specs``, which were copied before ``specs`` were added."""
+        added = set(specs)
+        for key, entry in self.manifest.items():
+            spec = self._manifest_spec(key)
+            if spec in added or 'files' not in entry:
+                continue
+            prefixes = self._projected_prefixes(spec, added)
+            if prefixes:
+                prefix = os.path.join(self._root, entry['prefix'])
+                for name in entry['files']:
+                    _relocate_file(os.path.join(prefix, name), prefixes)
 
     def unmerge(self, spec, ignore=None):
+        entry = self.manifest.get(self._manifest_key(spec), {})
+        if 'files' in entry and ignore is None:
+            self._unmerge_from_manifest(entry)
+            return
+
         pkg = spec.package
         view_source = pkg.view_source()
         view_dst = pkg.view_destination(self)
+        if not os.path.isdir(view_source):
+            tty.debug('Not unmerging uninstalled package: %s' % spec.name)
+            return
 
         tree = LinkTree(view_source)
 
@@ -350,11 +569,42 @@ def unmerge(self, spec, ignore=None):
         # now unmerge the directory tree
         tree.unmerge_directories(view_dst, ignore_file)
 
+    def _unmerge_from_manifest(self, entry):
+        """Remove the links of a manifest entry, and the directories that
+        are left empty, without looking at the package prefix."""
+        prefix = os.path.join(self._root, entry['prefix'])
+        directories = set(entry.get('directories', []))
+        for name in entry['files']:
+            path = os.path.join(prefix, name)
+            try:
+                os.remove(path)
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    raise
+            parent = os.path.dirname(name)
+            while parent and parent not in directories:
+                directories.add(parent)
+                parent = os.path.dirname(parent)
+
+        # Directories with files of other packages are not empty
+        for name in sorted(directories, reverse=True) + ['']:
+            path = os.path.join(prefix, name).rstrip(os.sep)
+            if os.path.normpath(path) == os.path.normpath(self._root):
+                continue
+            try:
+                os.rmdir(path)
+            except OSError:
+                pass
+
     def remove_file(self, src, dest):
         if not os.path.lexists(dest):
             tty.warn("Tried to remove %s which does not exist" % dest)
             return
-        if not os.path.islink(dest):
+        if self.link_type in view_copy_types:
+            # copies may have been relocated, and differ from src
+            os.remove(dest)
+            return
+        if self.link_type == "symlink" and not os.path.islink(dest):
             raise ValueError("%s is not a link tree!" % dest)
         # remove if dest is a hardlink/symlink to src; this will only
         # be false if two packages are merged into a prefix and have a
@@ -367,6 +617,10 @@ def check_added(self, spec):
         return spec == self.get_spec(spec)
 
     def remove_specs(self, *specs, **kwargs):
+        with self._manifest_transaction():
+            self._remove_specs(*specs, **kwargs)
+
+    def _remove_specs(self, *specs, **kwargs):
         assert all((s.concrete for s in specs))
         with_dependents = kwargs.get("with_dependents", True)
         with_dependencies = kwargs.get("with_dependencies", False)
@@ -419,13 +673,18 @@ def remove_specs(self, *specs, **kwargs):
         assert set(to_deactivate_sorted) == to_deactivate
 
         # Remove the packages from the view
+        scanned = False
         for spec in to_deactivate_sorted:
+            if 'files' not in self.manifest.get(self._manifest_key(spec), {}):
+                scanned = True
             if spec.package.is_extension:
                 self.remove_extension(spec, with_dependents=with_dependents)
             else:
                 self.remove_standalone(spec)
 
-        self._purge_empty_directories()
+        # Packages removed from the manifest leave no empty directories
+        if scanned:
+            self._purge_empty_directories()
 
     def remove_extension(self, spec, with_dependents=True):
         """
@@ -481,6 +740,16 @@ def get_projection_for_spec(self, spec):
         return self._root
 
     def get_all_specs(self):
+        return [self._manifest_spec(key) for key in self.manifest]
+
+    def _manifest_spec(self, key):
+        if key not in self._manifest_specs:
+            self._manifest_specs[key] = spack.spec.Spec.from_dict(
+                self.manifest[key]['spec'])
+        return self._manifest_specs[key]
+
+    def _scan_specs(self):
+        """Find the meta folders, and the specs in them, under the root."""
         md_dirs = []
         for root, dirs, files in os.walk(self._root):
             if spack.store.layout.metadata_dir in dirs:
@@ -491,11 +760,12 @@ def get_all_specs(self):
         for md_dir in md_dirs:
             if os.path.exists(md_dir):
                 for name_dir in os.listdir(md_dir):
-                    filename = os.path.join(md_dir, name_dir,
+                    path = os.path.join(md_dir, name_dir)
+                    filename = os.path.join(path,
                                             spack.store.layout.spec_file_name)
                     spec = get_spec_from_file(filename)
                     if spec:
-                        specs.append(spec)
+                        specs.append((path, spec))
         return specs
 
     def get_conflicts(self, *specs):
@@ -514,11 +784,10 @@ def get_path_meta_folder(self, spec):
                             getattr(spec, "name", spec))
 
     def get_spec(self, spec):
-        dotspack = self.get_path_meta_folder(spec)
-        filename = os.path.join(dotspack,
-                                spack.store.layout.spec_file_name)
-
-        return get_spec_from_file(filename)
+        key = self._manifest_key(spec)
+        if key not in self.manifest:
+            return None
+        return self._manifest_spec(key)
 
     def link_meta_folder(self, spec):
         src = spack.store.layout.metadata_path(spec)
@@ -527,6 +796,7 @@ def link_meta_folder(self, spec):
         tree = LinkTree(src)
         # there should be no conflicts when linking the meta folder
         tree.merge(tgt, link=self.link)
+        self._record(spec)
 
     def print_conflict(self, spec_active, spec_specified, level="error"):
         "Singular print function for spec conflicts."
@@ -606,8 +876,20 @@ def clean(self):
 
     def unlink_meta_folder(self, spec):
         path = self.get_path_meta_folder(spec)
-        assert os.path.exists(path)
-        shutil.rmtree(path)
+        # The links of uninstalled packages may be cleaned already
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        self._forget(spec)
+
+        # Remove the metadata and projection directories if they are empty
+        for path in (os.path.dirname(path),
+                     self.get_projection_for_spec(spec)):
+            if os.path.normpath(path) == os.path.normpath(self._root):
+                break
+            try:
+                os.rmdir(path)
+            except OSError:
+                break
 
     def _check_no_ext_conflicts(self, spec):
         """
@@ -634,6 +916,124 @@ def get_spec_from_file(filename):
         return None
 
 
+#: Ways to add files to a view
+view_link_types = ('symlink', 'hardlink', 'copy', 'reflink')
+
+#: Link types that make files of their own, which are relocated
+view_copy_types = ('copy', 'reflink')
+
+#: ioctl to clone a file on Linux, _IOW(0x94, 9, int)
+_ficlone = 0x40049409
+
+
+def view_func_parser(link_type):
+    """Function that adds a file to a view with ``link_type``."""
+    if link_type == 'symlink':
+        return view_symlink
+    elif link_type == 'hardlink':
+        return view_hardlink
+    elif link_type == 'copy':
+        return view_copy
+    elif link_type == 'reflink':
+        return view_reflink
+    raise ValueError("invalid view link type: '%s'" % link_type)
+
+
+def view_symlink(src, dst, prefixes=None):
+    os.symlink(src, dst)
+
+
+def view_hardlink(src, dst, prefixes=None):
+    os.link(src, dst)
+
+
+def view_copy(src, dst, prefixes=None):
+    """Copy ``src`` to ``dst``, replacing the ``prefixes`` (a dict from
+    old to new prefix) in its text."""
+    _copy_to_view(src, dst, prefixes, shutil.copyfileobj)
+
+
+def view_reflink(src, dst, prefixes=None):
+    """Like ``view_copy``, but share the data of ``src`` on filesystems
+    that can clone files, like Btrfs and XFS."""
+    _copy_to_view(src, dst, prefixes, _clone_file)
+
+
+def _clone_file(src, dst):
+    try:
+        fcntl.ioctl(dst.fileno(), _ficlone, src.fileno())
+    except (IOError, OSError) as e:
+        tty.debug("Cannot clone %s: %s" % (src.name, e))
+        shutil.copyfileobj(src, dst)
+
+
+def _copy_to_view(src, dst, prefixes, copy_data):
+    prefixes = prefixes or {}
+    if os.path.islink(src):
+        os.symlink(_relocate_target(os.readlink(src), prefixes), dst)
+        return
+
+    with open(src, 'rb') as src_file:
+        with open(dst, 'wb') as dst_file:
+            copy_data(src_file, dst_file)
+    _relocate_text(dst, prefixes)
+    shutil.copystat(src, dst)
+
+
+def _relocate_target(target, prefixes):
+    """The link ``target`` with the first of ``prefixes`` it is in
+    replaced."""
+    for old, new in prefixes.items():
+        if target == old or target.startswith(old + os.sep):
+            return new + target[len(old):]
+    return target
+
+
+def _relocate_file(path, prefixes):
+    """Replace the ``prefixes`` in a file that was copied into a view,
+    or in the target of a link."""
+    if os.path.islink(path):
+        target = os.readlink(path)
+        relocated = _relocate_target(target, prefixes)
+        if relocated != target:
+            os.remove(path)
+            os.symlink(relocated, path)
+    elif os.path.isfile(path):
+        _relocate_text(path, prefixes)
+
+
+def _relocate_text(path, prefixes):
+    """Replace the ``prefixes`` in the file at ``path``, if it is text.
+
+    Files with NUL bytes are left as they are: binaries still find their
+    libraries through RPATHs to the original prefixes.
+    """
+    import spack.relocate
+    if not prefixes:
+        return
+    with open(path, 'rb') as f:
+        data = f.read(8192)
+        if b'\0' in data:
+            return
+        data += f.read()
+    # Longer prefixes first, in case one prefix contains another
+    for old in sorted(prefixes, key=len, reverse=True):
+        if old.encode('utf-8') in data:
+            spack.relocate.replace_prefix_text(path, old, prefixes[old])
+
+
+def _default_view_hooks(pkg):
+    """Whether a package adds its files to views the default way."""
+    import spack.package
+    for name in ('view_file_conflicts', 'add_files_to_view'):
+        method = getattr(type(pkg), name)
+        default = getattr(spack.package.PackageViewMixin, name)
+        if getattr(method, '__func__', method) is not getattr(
+                default, '__func__', default):
+            return False
+    return True
+
+
 def colorize_root(root):
     colorize = ft.partial(tty.color.colorize, color=sys.stdout.isatty())
     pre, post = map(colorize, "@M[@. @M]@.".split())
@@ -16,6 +16,7 @@
 import traceback
 import os.path
 import operator
+import multiprocessing.pool
 
 import six
 
@@ -401,7 +402,7 @@ def get_matching_versions(specs, num_versions=1):
     return matching
 
 
-def create(path, specs):
+def create(path, specs, jobs=1):
     """Create a directory to be used as a spack mirror, and fill it with
     package archives.
 
@@ -409,6 +410,9 @@ def create(path, specs):
         path: Path to create a mirror directory hierarchy in.
         specs: Any package versions matching these specs will be added \
             to the mirror.
+        jobs: Number of specs to fetch concurrently.  Specs that share
+            an archive or a patch are always fetched by the same worker,
+            so each resource is downloaded only once.
 
     Return Value:
         Returns a tuple of lists: (present, mirrored, error)
@@ -440,20 +444,110 @@ def create(path, specs):
             raise MirrorError(
                 "Cannot create directory '%s':" % mirror_root, str(e))
 
-    mirror_cache = spack.caches.MirrorCache(mirror_root)
     mirror_stats = MirrorStats()
+    jobs = max(1, min(jobs or 1, len(specs)))
+    if jobs > 1:
+        groups = _group_by_resource(specs)
+        jobs = min(jobs, len(groups))
+
+    if jobs == 1:
+        mirror_cache = spack.caches.MirrorCache(mirror_root)
+        try:
+            spack.caches.mirror_cache = mirror_cache
+            # Iterate through packages and download all safe tarballs
+            for spec in specs:
+                mirror_stats.next_spec(spec)
+                add_single_spec(spec, mirror_root, mirror_stats)
+        finally:
+            spack.caches.mirror_cache = None
+        return mirror_stats.stats()
+
+    tty.msg('Fetching {0} specs ({1} at a time)'.format(len(specs), jobs))
+    args = [
+        ([(specs[i].to_yaml(), specs[i].concrete) for i in group],
+         mirror_root)
+        for group in groups]
+    pool = multiprocessing.pool.Pool(processes=jobs)
     try:
-        spack.caches.mirror_cache = mirror_cache
-        # Iterate through packages and download all safe tarballs for each
-        for spec in specs:
-            mirror_stats.next_spec(spec)
-            add_single_spec(spec, mirror_root, mirror_stats)
+        results = pool.map(_add_spec_group_wrapper, args)
     finally:
-        spack.caches.mirror_cache = None
+        pool.terminate()
+        pool.join()
+
+    # Tally the results in the original order of the specs
+    tallies = {}
+    for group, group_results in zip(groups, results):
+        tallies.update(zip(group, group_results))
+    for i, spec in enumerate(specs):
+        mirror_stats.merge(spec, *tallies[i])
 
     return mirror_stats.stats()
 
 
+def _group_by_resource(specs):
+    """Partition the indices of ``specs`` so that specs sharing any
+    archive or patch in the mirror end up in the same group.
+
+    Groups are returned in the order of their first spec.
+    """
+    parent = list(range(len(specs)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    owner = {}
+    for i, spec in enumerate(specs):
+        for path in _mirror_storage_paths(spec):
+            j = owner.setdefault(path, i)
+            parent[find(i)] = find(j)
+
+    groups = OrderedDict()
+    for i in range(len(specs)):
+        groups.setdefault(find(i), []).append(i)
+    return list(groups.values())
+
+
+def _mirror_storage_paths(spec):
+    """Paths, relative to the mirror root, of everything stored for
+    ``spec``.  Returns an empty list if they can't be determined."""
+    try:
+        stages = list(spec.package.stage)
+        for patch in spec.package.all_patches():
+            if patch.cache():
+                stages.append(patch.cache())
+        return [s.mirror_paths.storage_path for s in stages
+                if s.mirror_paths]
+    except Exception as e:
+        tty.debug('Cannot compute mirror paths for {0}: {1}'.format(
+            spec.format('{name}{@version}'), str(e)))
+        return []
+
+
+def _add_spec_group_wrapper(args):
+    """Add a group of specs to the mirror in a worker process.
+
+    Specs are passed as YAML since they are not picklable.  Returns a
+    list with one ``(added, existing, error)`` tuple per spec.
+    """
+    spec_yamls, mirror_root = args
+    spack.caches.mirror_cache = spack.caches.MirrorCache(mirror_root)
+    results = []
+    for spec_yaml, concrete in spec_yamls:
+        spec = spack.spec.Spec.from_yaml(spec_yaml)
+        if concrete:
+            spec._mark_concrete()
+        stats = MirrorStats()
+        stats.next_spec(spec)
+        add_single_spec(spec, mirror_root, stats)
+        results.append((len(stats.added_resources),
+                        len(stats.existing_resources),
+                        bool(stats.errors)))
+    return results
+
+
 class MirrorStats(object):
     def __init__(self):
         self.present = {}
@@ -478,6 +572,16 @@ def _tally_current_spec(self):
             self.existing_resources = set()
         self.current_spec = None
 
+    def merge(self, spec, added, existing, error):
+        """Record the outcome of adding ``spec`` in another process."""
+        self._tally_current_spec()
+        if added:
+            self.new[spec] = added
+        if existing:
+            self.present[spec] = existing
+        if error:
+            self.errors.add(spec)
+
     def stats(self):
         self._tally_current_spec()
         return list(self.present), list(self.new), list(self.errors)
@@ -30,7 +30,9 @@
 """
 import copy
 import datetime
+import hashlib
 import inspect
+import json
 import os.path
 import re
 import collections
@@ -92,6 +94,12 @@ def _check_tokens_are_valid(format_string, message):
         raise RuntimeError(msg)
 
 
+#: Options of a module type that apply to all of its module files, and
+#: that are part of the fingerprint of each
+_fingerprint_options = ('naming_scheme', 'hash_length', 'core_compilers',
+                        'hierarchy')
+
+
 def update_dictionary_extending_lists(target, update):
     """Updates a dictionary, but extends lists instead of overriding them.
 
@@ -665,16 +673,10 @@ def environment_modifications(self):
             exclude=spack.util.environment.is_system_path
         )
 
-        # Let the extendee/dependency modify their extensions/dependencies
-        # before asking for package-specific modifications
+        # Modifications of the extendee/dependencies and of the package
+        # itself, cached for installed specs
         env.extend(
-            build_environment.modifications_from_dependencies(
-                self.spec, context='run'
-            )
-        )
-        # Package specific modifications
-        build_environment.set_module_variables_for_package(self.spec.package)
-        self.spec.package.setup_run_environment(env)
+            build_environment.run_environment_modifications(self.spec))
 
         # Modifications required from modules.yaml
         env.extend(self.conf.env)
@@ -768,6 +770,79 @@ def _get_template(self):
         # ... and return the first match
         return choices.pop(0)
 
+    def load_template(self):
+        """Returns the compiled template for this spec.
+
+        Templates are compiled once per process, and shared by the
+        writers that use them.
+        """
+        template_name = self._get_template()
+        import jinja2
+        try:
+            env = tengine.make_environment()
+            return env.get_template(template_name)
+        except jinja2.TemplateNotFound:
+            # If the template was not found raise an exception with a little
+            # more information
+            msg = 'template \'{0}\' was not found for \'{1}\''
+            name = type(self).__name__
+            msg = msg.format(template_name, name)
+            raise ModulesTemplateNotFoundError(msg)
+
+    @property
+    def fingerprint_path(self):
+        """Hidden file next to the module file, with the fingerprint of
+        the inputs it was written from."""
+        dirname, basename = os.path.split(self.layout.filename)
+        return os.path.join(dirname, '.{0}.fingerprint'.format(basename))
+
+    def fingerprint(self):
+        """Returns a digest of the inputs of the module file.
+
+        The inputs are the DAG hash of the spec, the configuration rules
+        that apply to it, the options that apply to all the module files
+        of this type, the templates and the names of the modules of its
+        dependencies.
+        """
+        rules = dict(self.conf.conf)
+        for key in ('autoload', 'prerequisites'):
+            rules[key] = [x.dag_hash() for x in rules[key]]
+
+        configuration = self.module.configuration()
+        options = dict((key, configuration.get(key))
+                       for key in _fingerprint_options)
+        options['prefix_inspections'] = spack.config.get(
+            'modules:prefix_inspections', {})
+
+        module_name = str(self.module.__name__).split('.')[-1]
+        inputs = {
+            'spec': self.spec.dag_hash(),
+            'rules': rules,
+            'options': options,
+            'package_context': getattr(
+                self.spec.package, '{0}_context'.format(module_name), {}),
+            'templates': tengine.template_sources(
+                tengine.make_environment(), self._get_template()),
+            'filename': self.layout.filename,
+            'dependencies': [
+                self.context._create_module_list_of(what)
+                for what in ('specs_to_load', 'specs_to_prereq')],
+        }
+        content = json.dumps(inputs, sort_keys=True)
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def up_to_date(self):
+        """True if the module file was written from the same inputs that
+        it would be written from now."""
+        if not os.path.exists(self.layout.filename):
+            return False
+        try:
+            with open(self.fingerprint_path) as f:
+                fingerprint = f.read().strip()
+        except IOError:
+            return False
+        return fingerprint == self.fingerprint()
+
     def write(self, overwrite=False):
         """Writes the module file.
 
@@ -802,18 +877,7 @@ def write(self, overwrite=False):
             llnl.util.filesystem.mkdirp(module_dir)
 
         # Get the template for the module
-        template_name = self._get_template()
-        import jinja2
-        try:
-            env = tengine.make_environment()
-            template = env.get_template(template_name)
-        except jinja2.TemplateNotFound:
-            # If the template was not found raise an exception with a little
-            # more information
-            msg = 'template \'{0}\' was not found for \'{1}\''
-            name = type(self).__name__
-            msg = msg.format(template_name, name)
-            raise ModulesTemplateNotFoundError(msg)
+        template = self.load_template()
 
         # Construct the context following the usual hierarchy of updates:
         # 1. start with the default context from the module writer class
@@ -837,6 +901,9 @@ def write(self, overwrite=False):
         # Write it to file
         with open(self.layout.filename, 'w') as f:
             f.write(text)
+        # ... along with the fingerprint of its inputs
+        with open(self.fingerprint_path, 'w') as f:
+            f.write(self.fingerprint())
 
         # Set the file permissions of the module to match that of the package
         if os.path.exists(self.layout.filename):
@@ -845,6 +912,8 @@ def write(self, overwrite=False):
     def remove(self):
         """Deletes the module file."""
         mod_file = self.layout.filename
+        if os.path.exists(self.fingerprint_path):
+            os.remove(self.fingerprint_path)
         if os.path.exists(mod_file):
             try:
                 os.remove(mod_file)  # Remove the module file
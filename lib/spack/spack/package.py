@@ -23,6 +23,7 @@
 import sys
 import textwrap
 import time
+from multiprocessing.pool import ThreadPool
 from six import StringIO
 from six import string_types
 from six import with_metaclass
@@ -44,6 +45,7 @@
 import spack.mixins
 import spack.multimethod
 import spack.repo
+import spack.stage
 import spack.url
 import spack.util.environment
 import spack.util.web
@@ -800,7 +802,8 @@ def download_search():
             return [dynamic_fetcher] if dynamic_fetcher else []
 
         stage = Stage(fetcher, mirror_paths=mirror_paths, name=stage_name,
-                      path=self.path, search_fn=download_search)
+                      path=self.path, search_fn=download_search,
+                      footprint=spack.stage.build_footprint(self.name))
         return stage
 
     def _make_stage(self):
@@ -1527,6 +1530,15 @@ def try_install_from_binary_cache(self, explicit):
             self.spec, spack.store.layout, explicit=explicit)
         return True
 
+    def _prefetch_from_binary_cache(self, root=True):
+        """Download binaries for this package, if ``root`` is True, and its
+        dependencies concurrently, skipping whatever is already installed."""
+        specs = [s for s in self.spec.traverse(root=root)
+                 if not (s.external or
+                         s.package.installed_upstream or
+                         s.package.installed)]
+        binary_distribution.prefetch_tarballs(specs)
+
     def bootstrap_compiler(self, **kwargs):
         """Called by do_install to setup ensure Spack has the right compiler.
 
@@ -1640,6 +1652,11 @@ def do_install(self, **kwargs):
 
         self._do_install_pop_kwargs(kwargs)
 
+        # Download all binaries of the DAG at once, so that the installs
+        # below read them from the stage area.
+        if install_deps and kwargs.get('use_cache', True):
+            self._prefetch_from_binary_cache(root=install_self)
+
         # First, install dependencies recursively.
         if install_deps:
             tty.debug('Installing {0} dependencies'.format(self.name))
@@ -1750,6 +1767,15 @@ def build_process():
                 # Run post install hooks before build stage is removed.
                 spack.hooks.post_install(self.spec)
 
+            if not fake:
+                # The package is installed, even if its footprint can't
+                # be recorded
+                try:
+                    spack.stage.record_footprint(self.name, self.stage)
+                except Exception as e:
+                    tty.debug('Cannot record the build footprint of '
+                              '{0}: {1}'.format(self.name, e))
+
             # Stop timer.
             self._total_time = time.time() - start_time
             build_time = self._total_time - self._fetch_time
@@ -2723,6 +2749,43 @@ def possible_dependencies(*pkg_or_spec, **kwargs):
     return visited
 
 
+def find_remote_versions(packages, concurrency=None):
+    """Call ``fetch_remote_versions()`` on many packages at once.
+
+    All together, the packages read at most ``concurrency`` web pages at
+    once (``config:download_jobs`` by default).
+
+    Returns:
+        list: a ``(versions, error)`` tuple for each package, with the dict
+            of its versions to URLs, or None and the error that prevented
+            fetching them
+    """
+    if not packages:
+        return []
+    if concurrency is None:
+        concurrency = spack.config.get('config:download_jobs', 8)
+
+    def fetch(pkg):
+        try:
+            return pkg.fetch_remote_versions(), None
+        except spack.error.SpackError as e:
+            return None, e.message
+        except SystemExit:
+            # fetch_remote_versions() dies, with a message, when it can't
+            # connect
+            return None, "couldn't connect to its URLs"
+        except Exception as e:
+            return None, str(e) or type(e).__name__
+
+    with spack.util.web.request_limit(concurrency):
+        pool = ThreadPool(processes=min(concurrency, len(packages)))
+        try:
+            return pool.map(fetch, packages)
+        finally:
+            pool.terminate()
+            pool.join()
+
+
 def print_pkg(message):
     """Outputs a message with a package icon."""
     from llnl.util.tty.color import cwrite
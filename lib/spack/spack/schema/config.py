@@ -29,6 +29,20 @@
                     {'type': 'array',
                      'items': {'type': 'string'}}],
             },
+            'build_stage_placement': {
+                'type': 'string',
+                'enum': ['first', 'size']
+            },
+            'build_stage_limits': {
+                'type': 'object',
+                'additionalProperties': {
+                    'anyOf': [
+                        {'type': 'integer', 'minimum': 0},
+                        {'type': 'string',
+                         'pattern':
+                         r'^\s*\d+(\.\d+)?\s*[kmgtKMGT]?(i?[bB])?\s*$'}]
+                }
+            },
             'extensions': {
                 'type': 'array',
                 'items': {'type': 'string'}
@@ -54,8 +68,25 @@
                 },
             },
             'source_cache': {'type': 'string'},
+            'source_cache_max_size': {
+                'anyOf': [
+                    {'type': 'integer', 'minimum': 0},
+                    {'type': 'string',
+                     'pattern': r'^\s*\d+(\.\d+)?\s*[kmgtKMGT]?(i?[bB])?\s*$'},
+                    {'type': 'null'}
+                ],
+            },
             'misc_cache': {'type': 'string'},
+            'git_cache': {'type': 'boolean'},
             'verify_ssl': {'type': 'boolean'},
+            'url_fetch_method': {
+                'type': 'string',
+                'enum': ['curl', 'urllib']
+            },
+            'expand_method': {
+                'type': 'string',
+                'enum': ['executable', 'python']
+            },
             'suppress_gpg_warnings': {'type': 'boolean'},
             'install_missing_compilers': {'type': 'boolean'},
             'debug': {'type': 'boolean'},
@@ -64,6 +95,9 @@
             'dirty': {'type': 'boolean'},
             'build_language': {'type': 'string'},
             'build_jobs': {'type': 'integer', 'minimum': 1},
+            'download_jobs': {'type': 'integer', 'minimum': 1},
+            'view_jobs': {'type': 'integer', 'minimum': 1},
+            'probe_mirrors': {'type': 'boolean'},
             'ccache': {'type': 'boolean'},
             'db_lock_timeout': {'type': 'integer', 'minimum': 1},
             'package_lock_timeout': {
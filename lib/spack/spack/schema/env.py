@@ -102,6 +102,18 @@
                                                 'type': 'string',
                                                 'pattern': '(roots|all)',
                                             },
+                                            'update': {
+                                                'type': 'string',
+                                                'enum': ['incremental',
+                                                         'atomic'],
+                                            },
+                                            'link_type': {
+                                                'type': 'string',
+                                                'enum': ['symlink',
+                                                         'hardlink',
+                                                         'copy',
+                                                         'reflink'],
+                                            },
                                             'select': {
                                                 'type': 'array',
                                                 'items': {
@@ -10,8 +10,10 @@
 import sys
 import errno
 import hashlib
+import shutil
 import tempfile
 import getpass
+from multiprocessing.pool import Pool, ThreadPool
 from six import string_types
 from six import iteritems
 
@@ -29,7 +31,10 @@
 import spack.fetch_strategy as fs
 import spack.util.pattern as pattern
 import spack.util.path as sup
+import spack.util.spack_json as sjson
+import spack.util.string
 import spack.util.url as url_util
+import spack.util.web as web_util
 
 from spack.util.crypto import prefix_bits, bit_length
 
@@ -40,6 +45,13 @@
 # The temporary stage name prefix.
 stage_prefix = 'spack-stage-'
 
+#: Expected disk usage of a build never seen before, as a multiple of
+#: the size of its archive
+_archive_expansion = 10
+
+#: Key of the misc_cache entry with the disk usage of past builds
+_footprints_key = os.path.join('stage', 'footprints.json')
+
 
 def _create_stage_root(path):
     """Create the stage root directory and ensure appropriate access perms."""
@@ -149,15 +161,18 @@ def _resolve_paths(candidates):
 _stage_root = None
 
 
+def _stage_candidates():
+    candidates = spack.config.get('config:build_stage')
+    if isinstance(candidates, string_types):
+        candidates = [candidates]
+    return _resolve_paths(candidates)
+
+
 def get_stage_root():
     global _stage_root
 
     if _stage_root is None:
-        candidates = spack.config.get('config:build_stage')
-        if isinstance(candidates, string_types):
-            candidates = [candidates]
-
-        resolved_candidates = _resolve_paths(candidates)
+        resolved_candidates = _stage_candidates()
         path = _first_accessible_path(resolved_candidates)
         if not path:
             raise StageError("No accessible stage paths in:",
@@ -168,6 +183,106 @@ def get_stage_root():
     return _stage_root
 
 
+def _placement_by_size():
+    return spack.config.get('config:build_stage_placement') == 'size'
+
+
+def _stage_roots():
+    """Accessible stage roots, in the order of ``config:build_stage``.
+
+    Only the first of them is used, unless stages are placed by size.
+    """
+    roots = [get_stage_root()]
+    if _placement_by_size():
+        for path in _stage_candidates():
+            if path not in roots and _first_accessible_path([path]):
+                roots.append(path)
+    return roots
+
+
+def _free_space(path):
+    """Bytes available to the user on the file system of ``path``."""
+    st = os.statvfs(path)
+    return st.f_bavail * st.f_frsize
+
+
+def _has_room(root, footprint):
+    """Whether a build using ``footprint`` bytes may be staged in root."""
+    limits = spack.config.get('config:build_stage_limits') or {}
+    for path, limit in zip(_resolve_paths(limits), limits.values()):
+        if path == root and footprint > spack.util.string.parse_size(limit):
+            return False
+    return footprint <= _free_space(root)
+
+
+def _root_with_room(footprint):
+    """The first stage root with room for a build of ``footprint`` bytes,
+    or else the one with the most free space."""
+    roots = _stage_roots()
+    for root in roots:
+        if _has_room(root, footprint):
+            return root
+    return max(roots, key=_free_space)
+
+
+def _stage_root_for(name, footprint):
+    """Pick the root of the stage ``name`` for a build of ``footprint``
+    bytes.  An existing stage is reused, and builds of unknown size go
+    in the first root.
+    """
+    roots = _stage_roots()
+    for root in roots:
+        if os.path.isdir(os.path.join(root, name)):
+            return root
+    return _root_with_room(footprint) if footprint else roots[0]
+
+
+def _disk_usage(path):
+    """Bytes used by the files under ``path``."""
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for name in dirs + files:
+            try:
+                st = os.lstat(os.path.join(root, name))
+            except OSError:
+                continue
+            total += getattr(st, 'st_blocks', 0) * 512 or st.st_size
+    return total
+
+
+def build_footprint(pkg_name):
+    """Disk usage of the last build of a package, in bytes, or None.
+
+    Footprints are only kept when stages are placed by size, see
+    ``record_footprint()``.
+    """
+    if not _placement_by_size():
+        return None
+
+    cache = spack.caches.misc_cache
+    if not cache.init_entry(_footprints_key):
+        return None
+    with cache.read_transaction(_footprints_key) as f:
+        return sjson.load(f).get(pkg_name)
+
+
+def record_footprint(pkg_name, stage):
+    """Remember the disk usage of the build of a package in ``stage``."""
+    if not _placement_by_size():
+        return
+
+    stages = stage if isinstance(stage, StageComposite) else [stage]
+    footprint = sum(_disk_usage(s.path) for s in stages
+                    if s.managed_by_spack and os.path.isdir(s.path))
+
+    cache = spack.caches.misc_cache
+    cache.init_entry(_footprints_key)
+    with cache.write_transaction(_footprints_key) as (old, new):
+        footprints = sjson.load(old) if old else {}
+        footprints[pkg_name] = footprint
+        sjson.dump(footprints, new)
+
+
 def _mirror_roots():
     mirrors = spack.config.get('mirrors')
     return [
@@ -227,7 +342,7 @@ class Stage(object):
     def __init__(
             self, url_or_fetch_strategy,
             name=None, mirror_paths=None, keep=False, path=None, lock=True,
-            search_fn=None):
+            search_fn=None, footprint=None):
         """Create a stage object.
            Parameters:
              url_or_fetch_strategy
@@ -261,6 +376,11 @@ def __init__(
             search_fn
                  The search function that provides the fetch strategy
                  instance.
+
+            footprint
+                 The expected disk usage of the build in bytes, used to
+                 pick the stage root when ``config:build_stage_placement``
+                 is ``size``.
         """
         # TODO: fetch/stage coupling needs to be reworked -- the logic
         # TODO: here is convoluted and not modular enough.
@@ -287,10 +407,15 @@ def __init__(
         if name is None:
             self.name = stage_prefix + next(tempfile._get_candidate_names())
         self.mirror_paths = mirror_paths
+        self.footprint = footprint
 
         # Use the provided path or construct an optionally named stage path.
+        self._placed = path is None and _placement_by_size()
         if path is not None:
             self.path = path
+        elif self._placed:
+            root = _stage_root_for(self.name, self._expected_footprint())
+            self.path = os.path.join(root, self.name)
         else:
             self.path = os.path.join(get_stage_root(), self.name)
 
@@ -446,6 +571,9 @@ def fetch(self, mirror_only=False):
                         extension=extension)
                     fetchers.insert(0, cache_fetcher)
 
+        if spack.config.get('config:probe_mirrors', False):
+            fetchers = _order_by_health(fetchers)
+
         def generate_fetchers():
             for fetcher in fetchers:
                 yield fetcher
@@ -524,11 +652,48 @@ def expand_archive(self):
         archive.  Fail if the stage is not set up or if the archive is not yet
         downloaded."""
         if not self.expanded:
+            if self._placed:
+                self._ensure_room()
             self.fetcher.expand()
             tty.msg("Created stage in %s" % self.path)
         else:
             tty.msg("Already staged %s in %s" % (self.name, self.path))
 
+    def _expected_footprint(self, archive_file=None):
+        """Expected disk usage of the build in bytes, or None if unknown.
+
+        Without an ``archive_file``, the size of the archive in the source
+        cache, if any, is used.
+        """
+        storage_path = getattr(self.mirror_paths, 'storage_path', None)
+        cache_root = getattr(spack.caches.fetch_cache, 'root', None)
+        if not archive_file and storage_path and cache_root:
+            archive_file = os.path.join(cache_root, storage_path)
+
+        footprint = self.footprint or 0
+        if archive_file and os.path.isfile(archive_file):
+            footprint = max(footprint, _archive_expansion *
+                            os.path.getsize(archive_file))
+        return footprint or None
+
+    def _ensure_room(self):
+        """Move the stage to another root if its own lacks the space to
+        expand the archive and build it."""
+        footprint = self._expected_footprint(self.archive_file)
+        root = os.path.dirname(self.path)
+        if not footprint or _has_room(root, footprint):
+            return
+
+        new_root = _root_with_room(footprint)
+        if new_root == root:
+            tty.warn("%s may be too small to build in" % self.path)
+            return
+
+        new_path = os.path.join(new_root, self.name)
+        tty.msg("Moving stage to %s" % new_path)
+        shutil.move(self.path, new_path)
+        self.path = new_path
+
     def restage(self):
         """Removes the expanded archive path if it exists, then re-expands
            the archive.
@@ -565,9 +730,41 @@ def destroy(self):
         self.created = False
 
 
+def _order_by_health(fetchers):
+    """Probe the URLs of ``fetchers`` concurrently and reorder them, so
+    that the URLs answering fastest are tried first.
+
+    Fetchers that can't be probed, e.g. those of the local download cache,
+    keep their position.  URLs that can't be fetched are tried last.
+    """
+    candidates = [i for i, f in enumerate(fetchers)
+                  if isinstance(f, fs.URLFetchStrategy) and
+                  not isinstance(f, fs.CacheURLFetchStrategy)]
+    if len(candidates) < 2:
+        return fetchers
+
+    times = web_util.probe_urls([fetchers[i].url for i in candidates])
+    slots = [i for i in candidates if fetchers[i].url in times]
+
+    def health(i):
+        elapsed = times[fetchers[i].url]
+        return (elapsed is None, elapsed or 0, i)
+
+    ordered = list(fetchers)
+    for slot, i in zip(slots, sorted(slots, key=health)):
+        ordered[slot] = fetchers[i]
+    return ordered
+
+
 class ResourceStage(Stage):
 
     def __init__(self, url_or_fetch_strategy, root, resource, **kwargs):
+        # Resources are staged in the same stage root as their root stage
+        self._with_root = (kwargs.get('path') is None and
+                           kwargs.get('name') is not None and root._placed)
+        if self._with_root:
+            kwargs['path'] = os.path.join(
+                os.path.dirname(root.path), kwargs['name'])
         super(ResourceStage, self).__init__(url_or_fetch_strategy, **kwargs)
         self.root_stage = root
         self.resource = resource
@@ -577,9 +774,21 @@ def restage(self):
         self._add_to_root_stage()
 
     def expand_archive(self):
+        self._follow_root_stage()
         super(ResourceStage, self).expand_archive()
         self._add_to_root_stage()
 
+    def _follow_root_stage(self):
+        """Move the stage next to the root stage, which moves to another
+        stage root if its own lacks the space for the build."""
+        if not self._with_root:
+            return
+        path = os.path.join(os.path.dirname(self.root_stage.path), self.name)
+        if path != self.path:
+            if os.path.exists(self.path):
+                shutil.move(self.path, path)
+            self.path = path
+
     def _add_to_root_stage(self):
         """
         Move the extracted resource to the root stage (according to placement).
@@ -628,8 +837,8 @@ def _add_to_root_stage(self):
 
 
 @pattern.composite(method_list=[
-    'fetch', 'create', 'created', 'check', 'expand_archive', 'restage',
-    'destroy', 'cache_local', 'cache_mirror', 'managed_by_spack'])
+    'fetch', 'create', 'created', 'check', 'restage', 'destroy',
+    'cache_local', 'cache_mirror', 'managed_by_spack'])
 class StageComposite:
     """Composite for Stage type objects. The first item in this composite is
     considered to be the root package, and operations that return a value are
@@ -648,6 +857,45 @@ def __exit__(self, exc_type, exc_val, exc_tb):
             item.keep = getattr(self, 'keep', False)
             item.__exit__(exc_type, exc_val, exc_tb)
 
+    def expand_archive(self):
+        """Expand the archive of the root stage, then those of all the
+        resources at the same time, and move them into the root stage in
+        order.
+
+        The root stage is expanded first because it may move to another
+        stage root to make room for the build, and the resources staged
+        with it follow it there before they are expanded.
+        """
+        def expand(stage):
+            if isinstance(stage, ResourceStage):
+                # Not ResourceStage.expand_archive(), it needs the root
+                Stage.expand_archive(stage)
+            else:
+                stage.expand_archive()
+
+        root, resources = self[0], self[1:]
+        expand(root)
+        for stage in resources:
+            if isinstance(stage, ResourceStage):
+                stage._follow_root_stage()
+
+        jobs = min(len(resources),
+                   spack.config.get('config:download_jobs', 8))
+        if jobs > 1:
+            pool = ThreadPool(jobs)
+            try:
+                pool.map(expand, resources)
+            finally:
+                pool.terminate()
+                pool.join()
+        else:
+            for stage in resources:
+                expand(stage)
+
+        for stage in self:
+            if isinstance(stage, ResourceStage):
+                stage._add_to_root_stage()
+
     #
     # Below functions act only on the *first* stage in the composite.
     #
@@ -732,15 +980,60 @@ def ensure_access(file):
 
 
 def purge():
-    """Remove all build directories in the top-level stage path."""
-    root = get_stage_root()
-    if os.path.isdir(root):
+    """Remove all build directories in the top-level stage paths."""
+    for root in _stage_roots():
+        if not os.path.isdir(root):
+            continue
         for stage_dir in os.listdir(root):
             if stage_dir.startswith(stage_prefix) or stage_dir == '.lock':
                 stage_path = os.path.join(root, stage_dir)
                 remove_linked_tree(stage_path)
 
 
+def _checksum_url(args):
+    """Download an archive in its own stage and return its sha256.
+
+    Returns a tuple of the checksum and of the error message, one of
+    them ``None``.  This runs in a process of ``checksum_urls()``.
+    """
+    url, keep_stage = args
+    try:
+        with Stage(url, keep=keep_stage) as stage:
+            stage.fetch()
+            return spack.util.crypto.checksum(
+                hashlib.sha256, stage.archive_file), None
+    except Exception as e:
+        return None, str(e) or e.__class__.__name__
+
+
+def checksum_urls(urls, keep_stage=False, jobs=None):
+    """Download and checksum many archives at the same time.
+
+    At most ``jobs`` archives (``config:download_jobs`` by default) are
+    downloaded at once, each by its own process.
+
+    Returns:
+        dict: maps each URL to a tuple of its sha256 checksum, or None,
+            and of the reason it could not be downloaded, or None
+    """
+    if jobs is None:
+        jobs = spack.config.get('config:download_jobs', 8)
+    jobs = min(jobs, len(urls))
+
+    args = [(url, keep_stage) for url in urls]
+    if jobs > 1:
+        # Fetchers change the working directory: don't use threads
+        pool = Pool(processes=jobs)
+        try:
+            results = pool.map(_checksum_url, args)
+        finally:
+            pool.terminate()
+            pool.join()
+    else:
+        results = [_checksum_url(a) for a in args]
+    return dict(zip(urls, results))
+
+
 def get_checksums_for_versions(
         url_dict, name, first_stage_function=None, keep_stage=False):
     """Fetches and checksums archives from URLs.
@@ -786,26 +1079,31 @@ def get_checksums_for_versions(
 
     tty.msg("Downloading...")
     version_hashes = []
-    i = 0
-    for url, version in zip(urls, versions):
-        try:
-            with Stage(url, keep=keep_stage) as stage:
-                # Fetch the archive
-                stage.fetch()
-                if i == 0 and first_stage_function:
-                    # Only run first_stage_function the first time,
-                    # no need to run it every time
+    if first_stage_function:
+        # Run first_stage_function on the first archive that downloads
+        while urls:
+            url, version = urls.pop(0), versions.pop(0)
+            try:
+                with Stage(url, keep=keep_stage) as stage:
+                    stage.fetch()
                     first_stage_function(stage, url)
-
-                # Checksum the archive and add it to the list
-                version_hashes.append((version, spack.util.crypto.checksum(
-                    hashlib.sha256, stage.archive_file)))
-                i += 1
-        except FailedDownloadError:
-            tty.msg("Failed to fetch {0}".format(url))
-        except Exception as e:
-            tty.msg("Something failed on {0}, skipping.".format(url),
-                    "  ({0})".format(e))
+                    version_hashes.append((version, spack.util.crypto.checksum(
+                        hashlib.sha256, stage.archive_file)))
+                    break
+            except FailedDownloadError:
+                tty.msg("Failed to fetch {0}".format(url))
+            except Exception as e:
+                tty.msg("Something failed on {0}, skipping.".format(url),
+                        "  ({0})".format(e))
+
+    # Download the other archives at the same time
+    checksums = checksum_urls(urls, keep_stage=keep_stage)
+    for url, version in zip(urls, versions):
+        sha256, error = checksums[url]
+        if sha256:
+            version_hashes.append((version, sha256))
+        else:
+            tty.msg("Failed to fetch {0}".format(url), "  ({0})".format(error))
 
     if not version_hashes:
         tty.die("Could not fetch any versions for {0}".format(name))
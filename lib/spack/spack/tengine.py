@@ -64,8 +64,17 @@ def to_dict(self):
         return dict(d)
 
 
+#: Environments for template rendering, by their template directories.
+#: Each environment caches the templates it compiled, so a template is
+#: compiled once per process, or once before processes are forked.
+_environments = {}
+
+
 def make_environment(dirs=None):
-    """Returns an configured environment for template rendering."""
+    """Returns an configured environment for template rendering.
+
+    Calls with the same template directories share an environment.
+    """
     if dirs is None:
         # Default directories where to search for templates
         builtins = spack.config.get('config:template_dirs')
@@ -73,6 +82,34 @@ def make_environment(dirs=None):
         dirs = [canonicalize_path(d)
                 for d in itertools.chain(builtins, extensions)]
 
+    key = tuple(dirs)
+    if key not in _environments:
+        _environments[key] = _make_environment(dirs)
+    return _environments[key]
+
+
+#: Sources of templates and of the templates they use, by environment
+#: and template name
+_template_sources = {}
+
+
+def template_sources(env, name):
+    """Returns the sources of a template, followed by the sources of the
+    templates it extends, includes or imports, recursively.
+    """
+    key = (env, name)
+    if key not in _template_sources:
+        import jinja2.meta
+        source = env.loader.get_source(env, name)[0]
+        sources = [source]
+        for used in jinja2.meta.find_referenced_templates(env.parse(source)):
+            if used is not None and used != name:
+                sources.extend(template_sources(env, used))
+        _template_sources[key] = sources
+    return _template_sources[key]
+
+
+def _make_environment(dirs):
     # avoid importing this at the top level as it's used infrequently and
     # slows down startup a bit.
     import jinja2
@@ -8,8 +8,12 @@
 import os
 import os.path
 
-import spack.spec
 import spack.binary_distribution
+import spack.caches
+import spack.config
+import spack.spec
+import spack.util.spack_json as sjson
+import spack.util.web
 
 install = spack.main.SpackCommand('install')
 
@@ -39,3 +43,179 @@ def test_build_tarball_overwrite(
 
         with pytest.raises(spack.binary_distribution.NoOverwriteException):
             spack.binary_distribution.build_tarball(spec, '.', unsigned=True)
+
+
+def test_build_tarball_generates_spec_index(
+        install_mockery, mock_fetch, monkeypatch, tmpdir):
+
+    with tmpdir.as_cwd():
+        spec = spack.spec.Spec('trivial-install-test-package').concretized()
+        install(str(spec))
+
+        spack.binary_distribution.build_tarball(
+            spec, '.', unsigned=True, regenerate_index=True)
+
+        cache_prefix = spack.binary_distribution.build_cache_prefix(
+            str(tmpdir))
+        index = spack.binary_distribution.read_spec_index(cache_prefix)
+
+        specfile_name = spack.binary_distribution.tarball_name(
+            spec, '.spec.yaml')
+        assert list(index['specs']) == [specfile_name]
+
+        entry = index['specs'][specfile_name]
+        assert entry['full_hash'] == spec.full_hash()
+        assert spack.spec.Spec.from_dict(entry).dag_hash() == spec.dag_hash()
+
+        # Mirrors with an index are read without spidering them
+        monkeypatch.setattr(spack.binary_distribution, '_cached_specs', None)
+        monkeypatch.setattr(
+            spack.util.web, 'spider',
+            lambda *args, **kwargs: pytest.fail('should use the index'))
+        with spack.config.override(
+                'mirrors', {'test': 'file://' + str(tmpdir)}):
+            specs = spack.binary_distribution.get_specs()
+        assert [s.dag_hash() for s in specs] == [spec.dag_hash()]
+
+
+@pytest.mark.parametrize('regenerate_index', [True, False])
+def test_build_tarball_overwrite_updates_spec_index(
+        install_mockery, mock_fetch, monkeypatch, tmpdir, regenerate_index):
+
+    with tmpdir.as_cwd():
+        spec = spack.spec.Spec('trivial-install-test-package').concretized()
+        install(str(spec))
+        spack.binary_distribution.build_tarball(
+            spec, '.', unsigned=True, regenerate_index=True)
+
+        # Push it again, as if its package had changed since
+        monkeypatch.setattr(spec, 'full_hash', lambda: 'new-full-hash')
+        spack.binary_distribution.build_tarball(
+            spec, '.', force=True, unsigned=True,
+            regenerate_index=regenerate_index)
+
+    cache_prefix = spack.binary_distribution.build_cache_prefix(str(tmpdir))
+    index = spack.binary_distribution.read_spec_index(cache_prefix)
+    specfile_name = spack.binary_distribution.tarball_name(
+        spec, '.spec.yaml')
+    assert list(index['specs']) == [specfile_name]
+    assert index['specs'][specfile_name]['full_hash'] == 'new-full-hash'
+
+
+@pytest.mark.disable_clean_stage_check
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_prefetch_tarballs(
+        install_mockery, mock_fetch, monkeypatch, tmpdir, jobs):
+
+    with tmpdir.as_cwd():
+        spec = spack.spec.Spec('trivial-install-test-package').concretized()
+        install(str(spec))
+        spack.binary_distribution.build_tarball(
+            spec, '.', unsigned=True, regenerate_index=True)
+
+        missing = spack.spec.Spec('libdwarf').concretized()
+
+        monkeypatch.setattr(spack.binary_distribution, '_cached_specs', None)
+        with spack.config.override(
+                'mirrors', {'test': 'file://' + str(tmpdir)}):
+            paths = spack.binary_distribution.prefetch_tarballs(
+                [spec, missing], jobs=jobs)
+
+    # Only specs available in the build cache are downloaded
+    assert list(paths) == [spec.dag_hash()]
+    path = paths[spec.dag_hash()]
+    assert os.path.basename(path) == spack.binary_distribution.tarball_name(
+        spec, '.spack')
+    assert os.path.exists(path)
+
+
+def test_check_specs_against_mirror_index(
+        install_mockery, mock_fetch, monkeypatch, tmpdir):
+
+    with tmpdir.as_cwd():
+        spec = spack.spec.Spec('trivial-install-test-package').concretized()
+        install(str(spec))
+        spack.binary_distribution.build_tarball(
+            spec, '.', unsigned=True, regenerate_index=True)
+
+    missing = spack.spec.Spec('libdwarf').concretized()
+
+    # Only the spec that is not in the index is checked individually
+    checked = []
+
+    def mock_needs_rebuild(spec, mirror_url, rebuild_on_errors=False):
+        checked.append(spec)
+        return True
+
+    monkeypatch.setattr(
+        spack.binary_distribution, 'needs_rebuild', mock_needs_rebuild)
+
+    mirrors = {'test': 'file://' + str(tmpdir)}
+    assert spack.binary_distribution.check_specs_against_mirrors(
+        mirrors, [spec]) == 0
+    assert spack.binary_distribution.check_specs_against_mirrors(
+        mirrors, [spec, missing]) == 1
+    assert checked == [missing]
+
+
+@pytest.mark.disable_clean_stage_check
+def test_build_tarball_dedup(
+        install_mockery, mock_fetch, monkeypatch, tmpdir):
+
+    blob_cache = spack.caches.BlobCache(str(tmpdir.join('blobs')))
+    monkeypatch.setattr(spack.caches, 'blob_cache', blob_cache)
+
+    mirror_dir = tmpdir.ensure('mirror', dir=True)
+    with mirror_dir.as_cwd():
+        spec = spack.spec.Spec('trivial-install-test-package').concretized()
+        install(str(spec))
+        with open(os.path.join(spec.prefix, 'copy'), 'w') as f:
+            f.write('contents')
+        with open(os.path.join(spec.prefix, 'other-copy'), 'w') as f:
+            f.write('contents')
+        files = sorted(os.listdir(spec.prefix))
+
+        spack.binary_distribution.build_tarball(
+            spec, '.', unsigned=True, dedup=True)
+
+    # Identical files are stored as a single blob. The tarball also holds
+    # the relocation info, which is not in the prefix.
+    blobs_dir = mirror_dir.join('build_cache', 'blobs')
+    blobs = [b for d in blobs_dir.listdir() for b in d.listdir()]
+    nfiles = sum(len(f) for _, _, f in os.walk(spec.prefix))
+    assert len(blobs) < nfiles + 1
+
+    spec.package.do_uninstall(force=True)
+    with spack.config.override(
+            'mirrors', {'test': 'file://' + str(mirror_dir)}):
+        tarball = spack.binary_distribution.download_tarball(spec)
+        spack.binary_distribution.extract_tarball(
+            spec, tarball, allow_root=True, unsigned=True)
+
+    assert sorted(os.listdir(spec.prefix)) == files
+    with open(os.path.join(spec.prefix, 'other-copy')) as f:
+        assert f.read() == 'contents'
+
+
+@pytest.mark.parametrize('entries', [
+    [{'path': '../escaped', 'type': 'dir', 'mode': 0o755}],
+    [{'path': '/tmp/escaped', 'type': 'dir', 'mode': 0o755}],
+    [{'path': 'lib/link', 'type': 'link', 'target': '../../escaped'}],
+    # a link to a directory outside, and a file written through it
+    [{'path': 'link', 'type': 'link', 'target': '{outside}'},
+     {'path': 'link/escaped', 'type': 'dir', 'mode': 0o755}],
+])
+def test_restore_from_unsafe_blob_manifest(entries, tmpdir):
+    outside = tmpdir.ensure('outside', dir=True)
+    for entry in entries:
+        if 'target' in entry:
+            entry['target'] = entry['target'].format(outside=outside)
+    manifest_path = str(tmpdir.join('manifest.json'))
+    with open(manifest_path, 'w') as f:
+        sjson.dump({'blob_manifest': {'version': 1, 'entries': entries}}, f)
+
+    with pytest.raises(spack.binary_distribution.UnsafeBlobManifestError):
+        spack.binary_distribution.restore_from_blob_manifest(
+            manifest_path, str(tmpdir.join('prefix')))
+    assert not os.listdir(str(outside))
+    assert not os.path.exists(str(tmpdir.join('escaped')))
@@ -3,14 +3,19 @@
 #
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
+import inspect
 import os
 import platform
 
 import pytest
 
 import spack.build_environment
+import spack.caches
 import spack.config
+import spack.package
 import spack.spec
+import spack.store
+import spack.util.file_cache
 from spack.paths import build_env_path
 from spack.build_environment import dso_suffix, _static_to_shared_library
 from spack.util.executable import Executable
@@ -349,3 +354,58 @@ def test_setting_dtags_based_on_config(
 
         dtags_to_add = modifications['SPACK_DTAGS_TO_ADD'][0]
         assert dtags_to_add.value == expected_flag
+
+
+def test_run_environment_modifications_are_cached(
+        install_mockery, mock_fetch, monkeypatch, tmpdir):
+    monkeypatch.setattr(spack.caches, 'misc_cache',
+                        spack.util.file_cache.FileCache(str(tmpdir)))
+    s = spack.spec.Spec('libelf').concretized()
+    s.package.do_install(fake=True)
+    pkg_cls = type(s.package)
+
+    def setup_run_environment(pkg, env):
+        env.set('LIBELF_RUN', pkg.prefix)
+
+    monkeypatch.setattr(pkg_cls, 'setup_run_environment',
+                        setup_run_environment)
+    env = spack.build_environment.run_environment_modifications(s)
+    assert [x.name for x in env] == ['LIBELF_RUN']
+
+    # The install prefix is left alone
+    assert not os.path.exists(os.path.join(
+        s.prefix, spack.store.layout.metadata_dir, 'run_environment.json'))
+    assert tmpdir.join('run_environment', s.dag_hash() + '.json').exists()
+
+    # The second time the package isn't asked
+    def fail(pkg, env):
+        raise AssertionError('run environment was not cached')
+
+    monkeypatch.setattr(pkg_cls, 'setup_run_environment', fail)
+    env = spack.build_environment.run_environment_modifications(s)
+    assert [(x.name, x.value) for x in env] == [('LIBELF_RUN', s.prefix)]
+
+    # Another prefix isn't in the cache
+    view_spec = s.copy()
+    view_spec.prefix = '/view/libelf'
+    with pytest.raises(AssertionError):
+        spack.build_environment.run_environment_modifications(view_spec)
+
+    # The base classes of packages are part of the key
+    sources = spack.build_environment._package_sources(s)
+    assert inspect.getsourcefile(type(s.package)) in sources
+    assert inspect.getsourcefile(spack.package.PackageBase) in sources
+
+    base = tmpdir.join('base.py')
+    base.write('')
+    monkeypatch.setattr(spack.build_environment, '_package_sources',
+                        lambda spec: set([str(base)]))
+    monkeypatch.setattr(pkg_cls, 'setup_run_environment',
+                        setup_run_environment)
+    spack.build_environment.run_environment_modifications(s)
+
+    monkeypatch.setattr(pkg_cls, 'setup_run_environment', fail)
+    spack.build_environment.run_environment_modifications(s)
+    base.setmtime(base.mtime() + 10)
+    with pytest.raises(AssertionError):
+        spack.build_environment.run_environment_modifications(s)
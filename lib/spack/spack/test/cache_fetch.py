@@ -0,0 +1,140 @@
+# Copyright 2013-2020 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+import os
+
+import pytest
+
+import spack.util.string
+from spack.fetch_strategy import FsCache
+
+
+class MockFetcher(object):
+    """Fetcher that archives a fixed number of bytes."""
+    cachable = True
+
+    def __init__(self, size):
+        self.size = size
+        self.archived = 0
+
+    def archive(self, destination):
+        with open(destination, 'wb') as f:
+            f.write(b'x' * self.size)
+        self.archived += 1
+
+
+def test_fs_cache_store(tmpdir):
+    cache = FsCache(str(tmpdir))
+    fetcher = MockFetcher(10)
+    cache.store(fetcher, 'archive/ab/abcd.tar.gz')
+    cache.store(fetcher, 'archive/ab/abcd.tar.gz')
+
+    # The second store finds the published archive and doesn't copy it
+    assert fetcher.archived == 1
+    assert tmpdir.join('archive', 'ab', 'abcd.tar.gz').size() == 10
+    assert os.listdir(str(tmpdir.join('archive', 'ab'))) == ['abcd.tar.gz']
+    assert cache.size() == 10
+
+
+def test_fs_cache_trim_least_recently_used(tmpdir):
+    cache = FsCache(str(tmpdir))
+    for i, name in enumerate(['old', 'used', 'new']):
+        cache.store(MockFetcher(100), name)
+        os.utime(str(tmpdir.join(name)), (i, i))
+
+    # Using an archive from the cache makes it recent
+    fetcher = cache.fetcher('used', None)
+    fetcher.stage = type('MockStage', (), {
+        'save_filename': str(tmpdir.join('link'))})
+    fetcher.fetch()
+    os.remove(str(tmpdir.join('link')))
+
+    assert cache.trim(250) == 100
+    assert not tmpdir.join('old').exists()
+    assert tmpdir.join('used').exists()
+    assert tmpdir.join('new').exists()
+
+    assert cache.trim(0) == 200
+    assert cache.size() == 0
+
+
+def test_fs_cache_max_size(tmpdir):
+    cache = FsCache(str(tmpdir), max_size=150)
+    cache.store(MockFetcher(100), 'first')
+    os.utime(str(tmpdir.join('first')), (0, 0))
+    cache.store(MockFetcher(100), 'second')
+
+    assert not tmpdir.join('first').exists()
+    assert tmpdir.join('second').exists()
+
+
+def test_fs_cache_trims_only_over_budget(tmpdir, monkeypatch):
+    cache = FsCache(str(tmpdir), max_size=250)
+    trims = []
+    trim = cache.trim
+    monkeypatch.setattr(cache, 'trim', lambda m: trims.append(m) or trim(m))
+
+    cache.store(MockFetcher(100), 'first')
+    cache.store(MockFetcher(100), 'second')
+    cache.store(MockFetcher(100), 'second')
+    assert not trims
+
+    # The running total is kept across instances
+    assert FsCache(str(tmpdir))._add_size(0) == 200
+
+    cache.store(MockFetcher(100), 'third')
+    assert trims == [250]
+    assert cache._add_size(0) == cache.size() == 200
+
+
+def test_fs_cache_staged_archive_survives_trim(tmpdir):
+    cache = FsCache(str(tmpdir.join('cache')), max_size=1000)
+    cache.store(MockFetcher(100), 'archive')
+
+    fetcher = cache.fetcher('archive', None)
+    assert fetcher.cache_lock is cache.lock
+    fetcher.stage = type('MockStage', (), {
+        'save_filename': str(tmpdir.join('staged'))})
+    fetcher.fetch()
+
+    cache.trim(0)
+    assert not tmpdir.join('cache', 'archive').exists()
+    assert tmpdir.join('staged').size() == 100
+
+
+@pytest.mark.parametrize('size,expected', [
+    ('100', 100),
+    (100, 100),
+    ('2K', 2048),
+    ('1.5M', 3 * 2 ** 19),
+    ('10G', 10 * 2 ** 30),
+    ('1 GiB', 2 ** 30),
+])
+def test_parse_size(size, expected):
+    assert spack.util.string.parse_size(size) == expected
+
+
+@pytest.mark.parametrize('size', ['', 'ten', '10X', '-1G'])
+def test_parse_size_invalid(size):
+    with pytest.raises(ValueError):
+        spack.util.string.parse_size(size)
+
+
+@pytest.mark.parametrize('path', [
+    ('git-repos', 'repo-0123.git', 'objects', 'pack', 'p.pack'),
+    ('git-repos', '.lock'),
+    ('git-repos', '.tmp-abcd', 'objects', 'pack', 'p.pack'),
+    ('blobs', 'ab', 'abcd'),
+    ('archive', 'ab', 'other.lock'),
+])
+def test_fs_cache_trim_keeps_other_caches(tmpdir, path):
+    cache = FsCache(str(tmpdir))
+    tmpdir.ensure(*path)
+    cache.store(MockFetcher(100), 'archive/ab/abcd.tar.gz')
+
+    assert cache.size() == 100
+    cache.trim(0)
+    assert not tmpdir.join('archive', 'ab', 'abcd.tar.gz').exists()
+    assert tmpdir.join(*path).exists()
@@ -3,14 +3,18 @@
 #
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
+import os
 import platform
 
 import pytest
 
 import spack.main
 import spack.binary_distribution
+import spack.cmd.buildcache
+import spack.spec
 
 buildcache = spack.main.SpackCommand('buildcache')
+install = spack.main.SpackCommand('install')
 
 
 @pytest.fixture()
@@ -41,3 +45,48 @@ def test_buildcache_list_duplicates(mock_get_specs, capsys):
         output = buildcache('list', 'mpileaks', '@2.3')
 
     assert output.count('mpileaks') == 3
+
+
+@pytest.mark.parametrize('jobs', ['1', '2'])
+def test_buildcache_create_jobs(install_mockery, tmpdir, jobs):
+    install('--fake', 'libdwarf')
+
+    buildcache('create', '-j', jobs, '-u', '-a', '-d', str(tmpdir),
+               'libdwarf')
+
+    # Tarballs for the spec and its dependency, and one index for both
+    cache_prefix = spack.binary_distribution.build_cache_prefix(str(tmpdir))
+    specfiles = [f for f in os.listdir(cache_prefix)
+                 if f.endswith('.spec.yaml')]
+    assert len(specfiles) == 2
+
+    index = spack.binary_distribution.read_spec_index(cache_prefix)
+    assert sorted(index['specs']) == sorted(specfiles)
+
+
+@pytest.mark.parametrize('jobs', ['1', '2'])
+def test_buildcache_create_force_refreshes_index(
+        install_mockery, tmpdir, monkeypatch, jobs):
+    install('--fake', 'libdwarf')
+    buildcache('create', '-j', jobs, '-u', '-a', '-d', str(tmpdir),
+               'libdwarf')
+
+    # Push again, as if the packages had changed since.  The index is
+    # rebuilt once at the end rather than updated by each push.
+    monkeypatch.setattr(spack.spec.Spec, 'full_hash', lambda s: 'new-hash')
+    monkeypatch.setattr(spack.binary_distribution, '_update_spec_index',
+                        lambda *args: pytest.fail('index updated per push'))
+    buildcache('create', '-j', jobs, '-f', '-u', '-a', '-d', str(tmpdir),
+               'libdwarf')
+
+    cache_prefix = spack.binary_distribution.build_cache_prefix(str(tmpdir))
+    index = spack.binary_distribution.read_spec_index(cache_prefix)
+    assert len(index['specs']) == 2
+    assert all(entry['full_hash'] == 'new-hash'
+               for entry in index['specs'].values())
+
+
+def test_buildcache_create_reports_unknown_spec(database):
+    error = spack.cmd.buildcache._create_tarball_wrapper(
+        ('nosuchhash', '.', False, False, True, True, None, False))
+    assert 'nosuchhash' in error
@@ -0,0 +1,45 @@
+# Copyright 2013-2020 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+import hashlib
+
+import pytest
+
+import spack.package
+import spack.util.crypto
+import spack.util.spack_json as sjson
+from spack.main import SpackCommand
+from spack.version import ver
+
+checksum = SpackCommand('checksum')
+
+
+@pytest.mark.disable_clean_stage_check
+def test_checksum_batch(mock_packages, config, mock_archive, monkeypatch):
+    remote_versions = {
+        'libelf': {
+            ver('0.8.13'): 'file:///already/known.tar.gz',
+            ver('9.9'): mock_archive.url,
+            ver('9.8'): 'file:///no/such/archive.tar.gz'},
+        'libdwarf': None}
+
+    def fetch_remote_versions(pkg):
+        if remote_versions[pkg.name] is None:
+            raise SystemExit(1)
+        return remote_versions[pkg.name]
+    monkeypatch.setattr(spack.package.PackageBase, 'fetch_remote_versions',
+                        fetch_remote_versions)
+
+    output = checksum('--batch', 'libelf', 'libdwarf')
+    results = sjson.load(output[output.index('{'):])
+
+    assert list(results) == ['libelf', 'libdwarf']
+    assert results['libdwarf'] == {}
+    assert sorted(results['libelf']) == ['9.8', '9.9']
+    assert results['libelf']['9.9'] == {
+        'url': mock_archive.url,
+        'sha256': spack.util.crypto.checksum(
+            hashlib.sha256, mock_archive.archive_file)}
+    assert 'error' in results['libelf']['9.8']
@@ -3,9 +3,12 @@
 #
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
+import os
+
 import pytest
 import spack.stage
 import spack.caches
+import spack.fetch_strategy
 import spack.main
 import spack.package
 
@@ -52,3 +55,17 @@ def test_function_calls(command_line, counters):
     assert spack.stage.purge.call_count == counters[1]
     assert spack.caches.fetch_cache.destroy.call_count == counters[2]
     assert spack.caches.misc_cache.destroy.call_count == counters[3]
+
+
+@pytest.mark.usefixtures('config')
+def test_clean_downloads_max_size(tmpdir, monkeypatch):
+    cache = spack.fetch_strategy.FsCache(str(tmpdir))
+    monkeypatch.setattr(spack.caches, 'fetch_cache', cache)
+    for name in ('a', 'b'):
+        with open(str(tmpdir.join(name)), 'wb') as f:
+            f.write(b'x' * 2048)
+    os.utime(str(tmpdir.join('a')), (0, 0))
+
+    clean('--downloads', '--max-size', '3K')
+    assert not tmpdir.join('a').exists()
+    assert tmpdir.join('b').exists()
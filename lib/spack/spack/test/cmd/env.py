@@ -4,14 +4,18 @@
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
 import os
+import signal
 from six import StringIO
 
 import pytest
 
 import llnl.util.filesystem as fs
 
+import spack.filesystem_view
 import spack.hash_types as ht
+import spack.error
 import spack.modules
+import spack.package
 import spack.environment as ev
 
 from spack.cmd.env import _env_create
@@ -22,6 +26,7 @@
 from spack.spec_list import SpecListError
 from spack.test.conftest import MockPackage, MockPackageMultiRepo
 import spack.util.spack_json as sjson
+from spack.util.executable import which
 
 
 # everything here uses the mock_env_path
@@ -149,6 +154,77 @@ def test_env_install_all(install_mockery, mock_fetch):
     assert spec.package.installed
 
 
+@pytest.mark.parametrize('jobs', ['1', '2'])
+@pytest.mark.disable_clean_stage_check
+def test_env_install_parallel_keeps_going(
+        jobs, install_mockery, mock_fetch, monkeypatch):
+    do_fake_install = spack.package.PackageBase.do_fake_install
+
+    def fail_libdwarf(pkg):
+        if pkg.name == 'libdwarf':
+            raise spack.error.SpackError('libdwarf is broken')
+        do_fake_install(pkg)
+
+    monkeypatch.setattr(spack.package.PackageBase, 'do_fake_install',
+                        fail_libdwarf)
+
+    env('create', 'test')
+    with ev.read('test') as e:
+        add('dyninst')
+        add('libelf')
+        add('mpich')
+        concretize()
+        out = install('--fake', '-p', jobs, fail_on_error=False)
+
+    assert install.returncode == 1
+    assert '[x] dyninst' in out
+    assert 'depends on libdwarf' in out
+    assert '[+] libelf' in out
+    assert '[+] mpich' in out
+
+    # Everything that doesn't need libdwarf is installed
+    installed = dict((s.name, s.package.installed)
+                     for _, root in e.concretized_specs()
+                     for s in root.traverse())
+    assert not installed.pop('libdwarf')
+    assert not installed.pop('dyninst')
+    assert all(installed.values())
+
+
+@pytest.mark.parametrize('killed', ['build', 'install'])
+@pytest.mark.disable_clean_stage_check
+def test_env_install_parallel_killed_process(
+        killed, install_mockery, mock_fetch, monkeypatch):
+    do_fake_install = spack.package.PackageBase.do_fake_install
+
+    def kill_libdwarf(pkg):
+        if pkg.name == 'libdwarf':
+            # The build runs in a child of the install process
+            if killed == 'install':
+                os.kill(os.getppid(), signal.SIGKILL)
+                os._exit(1)
+            os.kill(os.getpid(), signal.SIGKILL)
+        do_fake_install(pkg)
+
+    monkeypatch.setattr(spack.package.PackageBase, 'do_fake_install',
+                        kill_libdwarf)
+
+    env('create', 'test')
+    with ev.read('test'):
+        add('dyninst')
+        add('libelf')
+        concretize()
+        out = install('--fake', '-p', '2', fail_on_error=False)
+
+    # A process that dies without a result fails its node, and doesn't
+    # stop the install
+    assert install.returncode == 1
+    assert '{0} process'.format(killed) in out
+    assert 'killed by signal {0}'.format(signal.SIGKILL) in out
+    assert '[x] dyninst' in out
+    assert '[+] libelf' in out
+
+
 def test_env_install_single_spec(install_mockery, mock_fetch):
     env('create', 'test')
     install = SpackCommand('install')
@@ -272,6 +348,44 @@ def test_to_lockfile_dict():
     assert e.specs_by_hash == e_copy.specs_by_hash
 
 
+def test_lockfile_specs_are_read_lazily(monkeypatch):
+    e = ev.create('test')
+    e.add('mpileaks')
+    e.add('libelf')
+    e.concretize()
+    e.write()
+    expected_hashes = set(e.all_hashes())
+    expected_lockfile = e._to_lockfile_dict()
+
+    read_nodes = []
+    from_node_dict = Spec.from_node_dict
+
+    def counting_from_node_dict(node):
+        read_nodes.append(node)
+        return from_node_dict(node)
+
+    monkeypatch.setattr(Spec, 'from_node_dict',
+                        staticmethod(counting_from_node_dict))
+
+    # Neither reading nor writing the environment needs the specs
+    e = ev.read('test')
+    assert set(e.all_hashes()) == expected_hashes
+    assert e._to_lockfile_dict() == expected_lockfile
+    assert not read_nodes
+
+    # Only the DAG of the root that is used is read
+    libelf = e.specs_by_hash[e.concretized_order[1]]
+    assert libelf.name == 'libelf'
+    assert len(read_nodes) == 1
+    assert e._to_lockfile_dict() == expected_lockfile
+
+    mpileaks = e.specs_by_hash[e.concretized_order[0]]
+    assert mpileaks.name == 'mpileaks'
+    assert any(s is libelf for s in mpileaks.traverse())
+    assert len(read_nodes) == len(list(mpileaks.traverse()))
+    assert set(e.all_hashes()) == expected_hashes
+
+
 def test_env_repo():
     e = ev.create('test')
     e.add('mpileaks')
@@ -1576,6 +1690,134 @@ def test_view_link_all(tmpdir, mock_fetch, mock_packages, mock_archive,
                                  (spec.version, spec.compiler.name)))
 
 
+def test_view_link_type_copy(tmpdir, mock_fetch, mock_packages,
+                             mock_archive, install_mockery):
+    filename = str(tmpdir.join('spack.yaml'))
+    viewdir = str(tmpdir.join('view'))
+    with open(filename, 'w') as f:
+        f.write("""\
+env:
+  specs:
+    - libdwarf
+  view:
+    default:
+      root: %s
+      link_type: copy""" % viewdir)
+    with tmpdir.as_cwd():
+        env('create', 'test', './spack.yaml')
+        with ev.read('test') as e:
+            install('--fake')
+            assert e.default_view.link_type == 'copy'
+
+    libdwarf = os.path.join(viewdir, 'bin', 'libdwarf')
+    assert os.path.isfile(libdwarf)
+    assert not os.path.islink(libdwarf)
+
+
+def test_view_update_atomic(tmpdir, mock_fetch, mock_packages, mock_archive,
+                            install_mockery):
+    filename = str(tmpdir.join('spack.yaml'))
+    viewdir = str(tmpdir.join('view'))
+    with open(filename, 'w') as f:
+        f.write("""\
+env:
+  specs:
+    - mpileaks
+  view:
+    default:
+      root: %s
+      update: atomic""" % viewdir)
+    with tmpdir.as_cwd():
+        env('create', 'test', './spack.yaml')
+        with ev.read('test'):
+            install('--fake')
+
+    # The view is a link to the only generation of the view
+    generations = str(tmpdir.join('._view'))
+    assert os.path.islink(viewdir)
+    first, = os.listdir(generations)
+    assert os.path.realpath(viewdir) == os.path.join(generations, first)
+    check_mpileaks_and_deps_in_view(tmpdir.join('view'))
+
+    # Writing the environment again doesn't rebuild the view
+    with ev.read('test') as e:
+        e.write()
+    assert os.listdir(generations) == [first]
+
+    # A new generation replaces the old one
+    with ev.read('test'):
+        remove('mpileaks')
+        add('libdwarf')
+        concretize()
+    second, = os.listdir(generations)
+    assert second != first
+    assert os.path.realpath(viewdir) == os.path.join(generations, second)
+    assert os.path.exists(os.path.join(viewdir, '.spack', 'libdwarf'))
+    assert not os.path.exists(os.path.join(viewdir, '.spack', 'mpileaks'))
+
+
+def test_view_update_atomic_reuses_projections(
+        tmpdir, mock_fetch, mock_packages, mock_archive, install_mockery,
+        monkeypatch):
+    filename = str(tmpdir.join('spack.yaml'))
+    viewdir = str(tmpdir.join('view'))
+    with open(filename, 'w') as f:
+        f.write("""\
+env:
+  specs:
+    - libelf
+  view:
+    default:
+      root: %s
+      update: atomic
+      projections:
+        all: '{name}'""" % viewdir)
+    with tmpdir.as_cwd():
+        env('create', 'test', './spack.yaml')
+        with ev.read('test'):
+            install('--fake')
+    install('--fake', 'libdwarf')
+
+    linked = []
+    add_standalones = spack.filesystem_view.YamlFilesystemView._add_standalones
+
+    def record_standalones(view, specs, jobs=1):
+        linked.extend(spec.name for spec in specs)
+        return add_standalones(view, specs, jobs)
+
+    monkeypatch.setattr(spack.filesystem_view.YamlFilesystemView,
+                        '_add_standalones', record_standalones)
+
+    # Only the new package is linked, libelf is copied from the old view
+    with ev.read('test'):
+        add('libdwarf')
+        concretize()
+    assert linked == ['libdwarf']
+    libelf = os.path.join(viewdir, 'libelf', '.spack', 'libelf')
+    assert os.path.islink(os.path.join(libelf, 'spec.yaml'))
+    assert os.path.exists(os.path.join(viewdir, 'libdwarf', '.spack'))
+
+
+def test_view_update_atomic_replaces_directory(
+        tmpdir, mock_fetch, mock_packages, mock_archive, install_mockery):
+    view_dir = tmpdir.mkdir('view')
+    env('create', '--with-view=%s' % view_dir, 'test')
+    with ev.read('test') as e:
+        install('--fake', 'mpileaks')
+        e.default_view.update = 'atomic'
+        e.write()
+
+    assert os.path.islink(str(view_dir))
+    assert len(os.listdir(str(tmpdir.join('._view')))) == 1
+    check_mpileaks_and_deps_in_view(view_dir)
+
+    # Disabling the view removes all its generations
+    with ev.read('test'):
+        env('view', 'disable')
+    assert not os.path.lexists(str(view_dir))
+    assert not tmpdir.join('._view').exists()
+
+
 def test_stack_view_activate_from_default(tmpdir, mock_fetch, mock_packages,
                                           mock_archive, install_mockery,
                                           env_deactivate):
@@ -1725,6 +1967,36 @@ def test_env_activate_csh_prints_shell_output(
     assert "alias despacktivate" in out
 
 
+def test_env_writes_activation_scripts(
+        tmpdir, mock_fetch, mock_packages, mock_archive, install_mockery,
+        env_deactivate, mutable_mock_env_path):
+    """Check that environments keep scripts with the commands of ``spack env
+    activate`` up to date, which work in any shell environment."""
+    env('create', 'test')
+    e = ev.read('test')
+    assert all(os.path.exists(e.activation_script_path(x))
+               for x in ev.script_shells)
+
+    # Installing a package changes the lockfile and the view
+    with e:
+        install('--fake', 'libdwarf')
+    script = e.activation_script_path('sh')
+    assert os.path.getmtime(script) >= os.path.getmtime(e.lock_path)
+
+    sh = which('sh', required=True)
+    output = sh('-c', '. %s; echo "$SPACK_ENV"; echo "$PATH"' % script,
+                env={'PATH': '/some/bin:/other/bin'}, output=str)
+    assert output.splitlines() == [
+        e.path,
+        '%s:/some/bin:/other/bin' % os.path.join(e.default_view.root, 'bin')]
+
+    # Stale scripts are rewritten when the environment is activated
+    os.utime(script, (0, 0))
+    assert not e.activation_scripts_up_to_date()
+    env('activate', '--sh', 'test')
+    assert e.activation_scripts_up_to_date()
+
+
 @pytest.mark.regression('12719')
 def test_env_activate_default_view_root_unconditional(env_deactivate,
                                                       mutable_mock_env_path):
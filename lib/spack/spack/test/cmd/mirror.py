@@ -9,6 +9,7 @@
 from spack.main import SpackCommand, SpackCommandError
 import spack.environment as ev
 import spack.config
+import spack.spec
 
 mirror = SpackCommand('mirror')
 env = SpackCommand('env')
@@ -66,6 +67,23 @@ def test_mirror_from_env(tmpdir, mock_packages, mock_fetch, config,
         assert mirror_res == expected
 
 
+@pytest.mark.disable_clean_stage_check
+def test_mirror_create_jobs(tmpdir, mock_packages, mock_fetch, config):
+    mirror_dir = str(tmpdir)
+    specs = ['trivial-install-test-package', 'git-test',
+             'trivial-install-test-package']
+
+    with spack.config.override('config:checksum', False):
+        mirror('create', '-d', mirror_dir, '-j', '2', *specs)
+
+    assert set(os.listdir(mirror_dir)) == set(specs)
+    for name in set(specs):
+        spec = spack.spec.Spec(name).concretized()
+        mirror_res = os.listdir(os.path.join(mirror_dir, name))
+        expected = ['%s.tar.gz' % spec.format('{name}-{version}')]
+        assert mirror_res == expected
+
+
 def test_mirror_crud(tmp_scope, capsys):
     with capsys.disabled():
         mirror('add', '--scope', tmp_scope, 'mirror', 'http://spack.io')
@@ -96,6 +96,39 @@ def test_remove_and_add(database, module_type):
         assert os.path.exists(item)
 
 
+@pytest.mark.db
+def test_refresh_in_parallel(database):
+    """Tests writing tcl module files with several processes."""
+    module_files = _module_files('tcl', 'mpileaks ^mpich', 'libelf')
+    module('tcl', 'rm', '-y', 'mpileaks', 'libelf')
+    for item in module_files:
+        assert not os.path.exists(item)
+
+    module('tcl', 'refresh', '-y', '-j', '2', 'mpileaks', 'libelf')
+    for item in module_files:
+        assert os.path.exists(item)
+
+
+@pytest.mark.db
+def test_refresh_skips_up_to_date(database):
+    """Tests that only module files whose inputs changed are rewritten."""
+    writer_cls = spack.modules.module_types['tcl']
+    writer = writer_cls(spack.spec.Spec('libelf').concretized())
+    module('tcl', 'refresh', '-y', 'libelf')
+    assert writer.up_to_date()
+
+    os.utime(writer.layout.filename, (0, 0))
+    module('tcl', 'refresh', '-y', 'libelf')
+    assert os.stat(writer.layout.filename).st_mtime == 0
+
+    with open(writer.fingerprint_path, 'w') as f:
+        f.write('stale')
+    assert not writer.up_to_date()
+    module('tcl', 'refresh', '-y', 'libelf')
+    assert os.stat(writer.layout.filename).st_mtime != 0
+    assert writer.up_to_date()
+
+
 @pytest.mark.db
 @pytest.mark.parametrize('cli_args', [
     ['libelf'],
@@ -5,7 +5,11 @@
 
 import pytest
 
+import spack.package
+import spack.util.web
+import spack.util.spack_json as sjson
 from spack.main import SpackCommand
+from spack.version import ver
 
 versions = SpackCommand('versions')
 
@@ -49,3 +53,46 @@ def test_no_versions_no_url():
     """Test a package without versions or a ``url`` attribute."""
 
     versions('opengl')
+
+
+def test_versions_json(mock_packages, monkeypatch):
+    """List the versions of many packages at once."""
+    def fetch_remote_versions(pkg):
+        return {ver('0.8.13'): 'file:///known.tar.gz',
+                ver('9.9'): 'file:///new.tar.gz'}
+    monkeypatch.setattr(spack.package.PackageBase, 'fetch_remote_versions',
+                        fetch_remote_versions)
+
+    results = sjson.load(versions('--json', 'libelf', 'libdwarf'))
+    assert list(results) == ['libelf', 'libdwarf']
+    assert results['libelf']['safe'][0] == '0.8.13'
+    assert results['libelf']['remote'] == ['9.9']
+    assert '0.8.13' in results['libdwarf']['remote']
+
+    results = sjson.load(versions('--json', '--safe-only', 'libelf'))
+    assert list(results['libelf']) == ['safe']
+
+
+def test_versions_fetch_errors(mock_packages, monkeypatch):
+    """Packages whose remote versions can't be fetched are reported, and
+    make the command fail."""
+    def fetch_remote_versions(pkg):
+        if pkg.name == 'libdwarf':
+            raise spack.util.web.NoNetworkConnectionError(
+                'timed out', 'http://example.com')
+        return {ver('9.9'): 'file:///new.tar.gz'}
+    monkeypatch.setattr(spack.package.PackageBase, 'fetch_remote_versions',
+                        fetch_remote_versions)
+
+    output = versions('--json', 'libelf', 'libdwarf', fail_on_error=False)
+    assert versions.returncode == 1
+    results = sjson.load(output[output.index('{'):])
+    assert results['libelf']['remote'] == ['9.9']
+    assert 'timed out' in results['libdwarf']['error']
+    assert 'remote' not in results['libdwarf']
+
+    versions('libelf', 'libdwarf', fail_on_error=False)
+    assert versions.returncode == 1
+
+    versions('libelf')
+    assert versions.returncode == 0
@@ -7,11 +7,13 @@
 
 import pytest
 import spack.util.environment as environment
+import spack.util.spack_json as sjson
 from spack.paths import spack_root
 from spack.util.environment import EnvironmentModifications
 from spack.util.environment import RemovePath, PrependPath, AppendPath
 from spack.util.environment import SetEnv, UnsetEnv
 from spack.util.environment import filter_system_paths, is_system_path
+from spack.util.executable import Executable
 
 
 datadir = os.path.join(spack_root, 'lib', 'spack', 'spack', 'test', 'data')
@@ -437,3 +439,62 @@ def test_from_environment_diff(before, after, search_list):
 
     for item in search_list:
         assert item in mod
+
+
+def test_to_list_and_back(env):
+    """Tests that modifications can be stored as JSON and read back."""
+    env.set('A', 'dummy value')
+    env.unset('B')
+    env.prepend_path('PATH_LIST', '/path/first')
+    env.set_path('C', ['/path/a', '/path/b'])
+    env.append_flags('FLAGS', '-O2')
+
+    copy = EnvironmentModifications.from_list(
+        sjson.load(sjson.dump(env.to_list())))
+
+    assert [type(x) for x in copy] == [type(x) for x in env]
+    assert [x.args for x in copy] == [x.args for x in env]
+
+    copy.apply_modifications()
+    assert os.environ['A'] == 'dummy value'
+    assert 'B' not in os.environ
+    assert os.environ['PATH_LIST'].startswith('/path/first:')
+    assert os.environ['C'] == '/path/a:/path/b'
+
+
+@pytest.mark.parametrize('initial', [
+    {},
+    {'PATH_LIST': '/path/second:/path/third', 'B': 'something',
+     'FLAGS': '-g'},
+    {'PATH_LIST': '', 'FLAGS': ''},
+])
+def test_shell_script(env, initial):
+    """Tests that the script applies the modifications to the environment
+    it is sourced in, not to the current one."""
+    env.set('A', 'dummy value')
+    env.unset('B')
+    env.prepend_path('PATH_LIST', '/path/first')
+    env.append_path('PATH_LIST', '/path/last')
+    env.prune_duplicate_paths('PATH_LIST')
+    env.set_path('C', ['/path/a', '/path/b'])
+    env.append_flags('FLAGS', '-O2')
+    script = env.shell_script('sh')
+
+    names = ('A', 'B', 'C', 'PATH_LIST', 'FLAGS')
+    sh = Executable('sh')
+    output = sh('-c', script + ''.join(
+        'echo "%s=${%s-unset}";' % (name, name) for name in names),
+        env=dict(initial, PATH=os.environ['PATH']), output=str)
+
+    expected = dict(initial)
+    for x in env:
+        x.execute(expected)
+    assert output.splitlines() == [
+        '%s=%s' % (name, expected.get(name, 'unset')) for name in names]
+
+
+def test_shell_script_needs_known_values(env):
+    env.prepend_path('PATH_LIST', '/path/first')
+    env.remove_path('PATH_LIST', '/path/second')
+    with pytest.raises(ValueError):
+        env.shell_script('sh')
@@ -11,8 +11,10 @@
 
 from llnl.util.filesystem import working_dir, touch, mkdirp
 
-import spack.repo
+import spack.caches
 import spack.config
+import spack.fetch_strategy
+import spack.repo
 from spack.spec import Spec
 from spack.stage import Stage
 from spack.version import ver
@@ -136,6 +138,50 @@ def test_fetch(type_of_test,
             assert h('HEAD') == h(t.revision)
 
 
+@pytest.mark.parametrize("type_of_test", ['master', 'branch', 'tag', 'commit'])
+def test_fetch_from_git_cache(type_of_test,
+                              mock_git_repository,
+                              config,
+                              mutable_mock_repo,
+                              monkeypatch,
+                              capfd,
+                              tmpdir):
+    """Stage a repository twice through the git repository cache."""
+    t = mock_git_repository.checks[type_of_test]
+    h = mock_git_repository.hash
+
+    spec = Spec('git-test')
+    spec.concretize()
+    pkg = spack.repo.get(spec)
+    pkg.versions[ver('git')] = t.args
+
+    git = which('git', required=True)
+    outputs = []
+    with spack.config.override('config:git_cache', True):
+        for _ in range(2):
+            # A new cache object, as in a new Spack process
+            cache = spack.fetch_strategy.GitRepoCache(str(tmpdir))
+            monkeypatch.setattr(spack.caches, 'git_repo_cache', cache)
+            with pkg.stage:
+                pkg.do_stage()
+                with working_dir(pkg.stage.source_path):
+                    assert h('HEAD') == h(t.revision)
+                    origin = git('config', 'remote.origin.url', output=str)
+                    assert origin.strip() == mock_git_repository.url
+
+                # The clone is named after the remote, as without the cache
+                assert pkg.stage[0].srcdir == os.path.basename(
+                    mock_git_repository.url)
+            outputs.append(capfd.readouterr()[0])
+
+    assert os.path.isdir(cache.path_for(mock_git_repository.url))
+    assert 'Creating git mirror' in outputs[0]
+
+    # Commits and tags are not fetched again once the mirror has them
+    fetched = 'Updating git mirror' in outputs[1]
+    assert fetched == (type_of_test in ('master', 'branch'))
+
+
 @pytest.mark.parametrize("type_of_test", ['branch', 'commit'])
 def test_debug_fetch(mock_packages, type_of_test, mock_git_repository, config):
     """Fetch the repo with debug enabled."""
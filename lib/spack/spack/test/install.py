@@ -10,9 +10,11 @@
 from llnl.util.filesystem import mkdirp, touch, working_dir
 
 from spack.package import InstallError, PackageBase, PackageStillNeededError
+import spack.binary_distribution
 import spack.error
 import spack.patch
 import spack.repo
+import spack.stage
 import spack.store
 from spack.spec import Spec
 from spack.package import _spack_build_envfile, _spack_build_logfile
@@ -469,3 +471,28 @@ def test_unconcretized_install(install_mockery, mock_fetch, mock_packages):
 
     with pytest.raises(ValueError, match="only patch concrete packages"):
         spec.package.do_patch()
+
+
+@pytest.mark.parametrize('install_package', [True, False])
+def test_prefetch_skips_root_not_installed(
+        install_package, install_mockery, mock_fetch, monkeypatch):
+    prefetched = []
+    monkeypatch.setattr(spack.binary_distribution, 'prefetch_tarballs',
+                        lambda specs: prefetched.extend(specs))
+    spec = Spec('libdwarf').concretized()
+    spec.package.do_install(fake=True, install_package=install_package)
+
+    names = set(s.name for s in prefetched)
+    assert 'libelf' in names
+    assert ('libdwarf' in names) == install_package
+
+
+def test_footprint_errors_dont_fail_install(
+        install_mockery, mock_fetch, monkeypatch):
+    def fail(pkg_name, stage):
+        raise OSError('cannot write the misc cache')
+    monkeypatch.setattr(spack.stage, 'record_footprint', fail)
+
+    spec = Spec('trivial-install-test-package').concretized()
+    spec.package.do_install()
+    assert spec.package.installed
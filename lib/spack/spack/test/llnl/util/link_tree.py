@@ -7,7 +7,7 @@
 
 import pytest
 from llnl.util.filesystem import working_dir, mkdirp, touchp
-from llnl.util.link_tree import LinkTree
+from llnl.util.link_tree import LinkTree, LinkPlan
 from spack.stage import Stage
 
 
@@ -136,6 +136,8 @@ def test_merge_with_empty_directories(stage, link_tree):
     with working_dir(stage.path):
         mkdirp('dest/f/g')
         mkdirp('dest/a/b/h')
+        # an empty directory that gets new subdirectories
+        mkdirp('dest/c')
 
         link_tree.merge('dest')
         link_tree.unmerge('dest')
@@ -150,6 +152,8 @@ def test_merge_with_empty_directories(stage, link_tree):
 
         assert os.path.isdir('dest/a/b/h')
         assert os.path.isdir('dest/f/g')
+        assert os.path.isdir('dest/c')
+        assert not os.path.exists('dest/c/d')
 
 
 def test_ignore(stage, link_tree):
@@ -166,3 +170,50 @@ def test_ignore(stage, link_tree):
 
         assert os.path.isfile('source/.spec')
         assert os.path.isfile('dest/.spec')
+
+
+@pytest.mark.parametrize('jobs', [1, 4])
+def test_link_plan(stage, jobs):
+    with working_dir(stage.path):
+        touchp('other/1')
+        touchp('other/a/8')
+        touchp('dest/c/9')
+
+        source, other = os.path.abspath('source'), os.path.abspath('other')
+        with LinkPlan(jobs=jobs) as plan:
+            plan.add_trees([(source, 'dest', None)])
+            other_map, = plan.add_trees([
+                (other, 'dest', lambda x: x == '1')])
+            assert other_map == {os.path.join(other, 'a', '8'): 'dest/a/8'}
+            assert plan.files['dest/1'] == os.path.join(source, '1')
+
+            # Only the files in existing directories are looked up
+            assert plan.check_destination() == set()
+            assert not plan.conflicts
+
+            plan.make_directories()
+            plan.link_files(sorted((s, d) for d, s in plan.files.items()))
+
+        check_file_link('dest/1', 'source/1')
+        check_file_link('dest/a/8', 'other/a/8')
+        check_file_link('dest/c/d/e/7', 'source/c/d/e/7')
+        assert os.path.isfile('dest/c/9')
+
+
+def test_link_plan_conflicts(stage):
+    with working_dir(stage.path):
+        touchp('other/a/b')
+        touchp('other/1')
+        touchp('dest/c/d')
+        mkdirp('dest/c/4')
+
+        with LinkPlan() as plan:
+            plan.add_trees([('source', 'dest', None),
+                            ('other', 'dest', None)])
+            assert plan.duplicates == ['dest/1']
+            plan.check_destination()
+
+        assert sorted(plan.conflicts) == [
+            'Directory blocks file: dest/a/b',
+            'Directory blocks file: dest/c/4',
+            'File blocks directory: dest/c/d']
@@ -196,6 +196,16 @@ def successful_apply(*args, **kwargs):
         ]) - files_cached_in_mirror)
 
 
+def test_mirror_group_by_resource(mock_packages, config):
+    specs = [Spec('trivial-install-test-package@1.0'),
+             Spec('git-test@git'),
+             Spec('trivial-install-test-package@1.0')]
+
+    # Specs sharing an archive must be fetched by the same worker
+    groups = spack.mirror._group_by_resource(specs)
+    assert groups == [[0, 2], [1]]
+
+
 class MockFetcher(object):
     """Mock fetcher object which implements the necessary functionality for
        testing MirrorCache
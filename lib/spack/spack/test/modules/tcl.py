@@ -155,6 +155,24 @@ def test_naming_scheme(self, factory, module_configuration):
 
         assert writer.conf.naming_scheme == expected
 
+    def test_fingerprint(self, factory, module_configuration):
+        """Tests that fingerprints change only with the inputs of each
+        module file."""
+        module_configuration('autoload_direct')
+        mpileaks, _ = factory('mpileaks')
+        libelf, _ = factory('libelf')
+        mpileaks_fingerprint = mpileaks.fingerprint()
+        libelf_fingerprint = libelf.fingerprint()
+        assert mpileaks_fingerprint != libelf_fingerprint
+
+        # Prerequisites instead of autoloads only change the inputs of the
+        # modules with dependencies
+        module_configuration('prerequisites_direct')
+        mpileaks, _ = factory('mpileaks')
+        libelf, _ = factory('libelf')
+        assert mpileaks.fingerprint() != mpileaks_fingerprint
+        assert libelf.fingerprint() == libelf_fingerprint
+
     def test_invalid_naming_scheme(self, factory, module_configuration):
         """Tests the evaluation of an invalid naming scheme."""
 
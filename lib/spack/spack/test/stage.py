@@ -16,9 +16,14 @@
 
 from llnl.util.filesystem import mkdirp, partition_path, touch, working_dir
 
+import spack.caches
+import spack.config
+import spack.fetch_strategy
 import spack.paths
 import spack.stage
 import spack.util.executable
+import spack.util.file_cache
+import spack.util.web
 
 from spack.resource import Resource
 from spack.stage import Stage, StageComposite, ResourceStage, DIYStage
@@ -932,3 +937,130 @@ def test_cannot_access():
     with pytest.raises(SystemExit, matches='Insufficient permissions'):
         # It's far more portable to use a non-existent filename.
         spack.stage.ensure_access('/no/such/file')
+
+
+def test_order_fetchers_by_health(monkeypatch):
+    urls = ['http://fast.org/a.tgz', 'http://down.org/a.tgz',
+            'http://slow.org/a.tgz', 'file:///local/a.tgz']
+    times = {urls[0]: 0.1, urls[1]: None, urls[2]: 0.5}
+    monkeypatch.setattr(spack.util.web, 'probe_urls',
+                        lambda urls: dict((u, times[u]) for u in urls
+                                          if u in times))
+
+    cache = spack.fetch_strategy.CacheURLFetchStrategy('file:///cache/a.tgz')
+    fetchers = [cache] + [spack.fetch_strategy.URLFetchStrategy(u)
+                          for u in reversed(urls)]
+    ordered = spack.stage._order_by_health(fetchers)
+
+    # The cache and the local file keep their place, the others are
+    # sorted by response time, with the failed probe last
+    assert [f.url for f in ordered] == [
+        'file:///cache/a.tgz', 'file:///local/a.tgz', 'http://fast.org/a.tgz',
+        'http://slow.org/a.tgz', 'http://down.org/a.tgz']
+
+
+@pytest.fixture
+def sized_stage_roots(tmpdir, clear_stage_root, monkeypatch):
+    """Place stages by size in a 'small' and a 'big' stage root."""
+    candidates = [str(tmpdir.join('small')), str(tmpdir.join('big'))]
+    with spack.config.override('config:build_stage', candidates):
+        with spack.config.override('config:build_stage_placement', 'size'):
+            monkeypatch.setattr(spack.stage, '_stage_root', None)
+            small, big = spack.stage._resolve_paths(candidates)
+            free = {small: 1000, big: 10 ** 6}
+            monkeypatch.setattr(spack.stage, '_free_space', free.get)
+            yield small, big
+
+
+@pytest.mark.parametrize('footprint,root', [
+    (None, 0), (500, 0), (5000, 1), (10 ** 7, 1)
+])
+def test_stage_placement_by_size(sized_stage_roots, footprint, root):
+    stage = Stage('file:///no/such/file.tar.gz', name='test-stage',
+                  footprint=footprint)
+    assert stage.path == os.path.join(sized_stage_roots[root], 'test-stage')
+
+
+def test_stage_placement_reuses_existing_stage(sized_stage_roots):
+    small, big = sized_stage_roots
+    mkdirp(os.path.join(big, 'test-stage'))
+
+    stage = Stage('file:///no/such/file.tar.gz', name='test-stage',
+                  footprint=1)
+    assert stage.path == os.path.join(big, 'test-stage')
+
+
+def test_stage_placement_limits(sized_stage_roots, tmpdir):
+    small, big = sized_stage_roots
+    limits = {str(tmpdir.join('small')): '100'}
+    with spack.config.override('config:build_stage_limits', limits):
+        stage = Stage('file:///no/such/file.tar.gz', footprint=500)
+        assert os.path.dirname(stage.path) == big
+
+
+def test_resource_stage_placed_with_root(sized_stage_roots):
+    small, big = sized_stage_roots
+    root = Stage('file:///no/such/file.tar.gz', name='test-stage',
+                 footprint=5000)
+    resource = ResourceStage('file:///no/such/resource.tar.gz', root, None,
+                             name='test-resource')
+    assert resource.path == os.path.join(big, 'test-resource')
+
+
+@pytest.mark.disable_clean_stage_check
+def test_resources_follow_root_stage(
+        mock_stage_archive, mock_expand_resource, sized_stage_roots):
+    small, big = sized_stage_roots
+    archive = mock_stage_archive()
+
+    composite = StageComposite()
+    root = Stage(archive.url, name='test-stage')
+    composite.append(root)
+    fetcher = spack.fetch_strategy.from_kwargs(url=mock_expand_resource.url)
+    resource = Resource('test_resource', fetcher, '', 'resource-dir')
+    composite.append(ResourceStage(
+        fetcher, root, resource, name='test-resource'))
+    assert os.path.dirname(composite[1].path) == small
+
+    # Both move to the root with room for the build before expanding
+    composite.create()
+    composite.fetch()
+    composite.expand_archive()
+
+    assert os.path.dirname(root.path) == big
+    assert os.path.dirname(composite[1].path) == big
+    assert os.listdir(small) == []
+    for fname in mock_expand_resource.files:
+        assert os.path.exists(os.path.join(
+            root.source_path, 'resource-dir', fname))
+
+
+def test_stage_moved_before_expansion(mock_stage_archive, sized_stage_roots):
+    small, big = sized_stage_roots
+    archive = mock_stage_archive()
+
+    # The size of the build is unknown until the archive is fetched
+    with Stage(archive.url, name='test-stage') as stage:
+        assert os.path.dirname(stage.path) == small
+
+        stage.fetch()
+        assert os.path.getsize(stage.archive_file) * 10 > 1000
+        stage.expand_archive()
+
+        assert os.path.dirname(stage.path) == big
+        assert os.path.exists(os.path.join(stage.source_path, _readme_fn))
+        assert not os.path.exists(os.path.join(small, 'test-stage'))
+
+
+def test_record_footprint(sized_stage_roots, tmpdir, monkeypatch):
+    monkeypatch.setattr(spack.caches, 'misc_cache',
+                        spack.util.file_cache.FileCache(str(tmpdir)))
+    assert spack.stage.build_footprint('test-package') is None
+
+    stage = Stage('file:///no/such/file.tar.gz', path=str(tmpdir.join('s')))
+    stage.create()
+    with open(os.path.join(stage.path, 'output'), 'wb') as f:
+        f.write(b'x' * 10000)
+
+    spack.stage.record_footprint('test-package', stage)
+    assert spack.stage.build_footprint('test-package') >= 10000
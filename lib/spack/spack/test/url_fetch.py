@@ -4,14 +4,21 @@
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
 import collections
+import hashlib
 import os
+import re
+import threading
+
 import pytest
 
+from six.moves import BaseHTTPServer
+
 from llnl.util.filesystem import working_dir, is_exe
 
 import spack.repo
 import spack.config
 import spack.fetch_strategy as fs
+import spack.util.compression
 from spack.spec import Spec
 from spack.stage import Stage
 from spack.version import ver
@@ -43,6 +50,57 @@ def fn(v):
     return factory
 
 
+@pytest.fixture
+def archive_server():
+    """Serves archives over HTTP, with support for range requests.
+
+    Yields the URL of the server, a dict of the files it serves, and a
+    list of the ``(client address, range header)`` of every request.
+    """
+    files = {}
+    requests = []
+
+    class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep connections alive
+
+        def do_GET(self):
+            data = files.get(self.path.lstrip('/'))
+            byte_range = self.headers.get('Range')
+            requests.append((self.client_address, byte_range))
+            if data is None:
+                self.send_response(404)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+
+            match = re.match(r'bytes=(\d+)-$', byte_range or '')
+            if match:
+                data = data[int(match.group(1)):]
+                self.send_response(206)
+            else:
+                self.send_response(200)
+            self.send_header('Content-Type', 'application/x-gzip')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    try:
+        yield 'http://127.0.0.1:%d' % server.server_port, files, requests
+    finally:
+        # The server handles one connection at a time: close the kept
+        # alive connection of the fetcher so that it can shut down
+        fs._connection_cache().close()
+        server.shutdown()
+        server.server_close()
+
+
 def test_urlfetchstrategy_sans_url():
     """Ensure constructor with no URL fails."""
     with pytest.raises(ValueError):
@@ -70,9 +128,11 @@ def test_urlfetchstrategy_bad_url(tmpdir):
                           ('.tar.bz2', 'j'), ('.tbz2', 'j'),
                           ('.tar.xz', 'J'), ('.txz', 'J')],
                          indirect=True)
+@pytest.mark.parametrize('fetch_method', ['curl', 'urllib'])
 def test_fetch(
         mock_archive,
         secure,
+        fetch_method,
         checksum_type,
         config,
         mutable_mock_repo
@@ -98,7 +158,9 @@ def test_fetch(
     # Enter the stage directory and check some properties
     with pkg.stage:
         with spack.config.override('config:verify_ssl', secure):
-            pkg.do_stage()
+            with spack.config.override('config:url_fetch_method',
+                                       fetch_method):
+                pkg.do_stage()
 
         with working_dir(pkg.stage.source_path):
             assert os.path.exists('configure')
@@ -110,6 +172,27 @@ def test_fetch(
             assert 'echo Building...' in contents
 
 
+@pytest.mark.parametrize('mock_archive',
+                         [('.tar.gz', 'z'), ('.tar.bz2', 'j'),
+                          ('.tar.xz', 'J'), ('.txz', 'J')],
+                         indirect=True)
+@pytest.mark.parametrize('fetch_method', ['curl', 'urllib'])
+def test_fetch_python_expand(mock_archive, fetch_method, tmpdir, config):
+    """Fetch and expand an archive without running tar."""
+    digest = crypto.checksum(hashlib.sha256, mock_archive.archive_file)
+    fetcher = fs.URLFetchStrategy(mock_archive.url, digest)
+    with spack.config.override('config:url_fetch_method', fetch_method):
+        with spack.config.override('config:expand_method', 'python'):
+            with Stage(fetcher, path=str(tmpdir)) as stage:
+                stage.fetch()
+                stage.check()
+                stage.expand_archive()
+
+                configure = os.path.join(stage.source_path, 'configure')
+                assert is_exe(configure)
+                assert not os.path.exists(fetcher._tarball_container)
+
+
 @pytest.mark.parametrize('spec,url,digest', [
     ('url-list-test @0.0.0', 'foo-0.0.0.tar.gz', 'abc000'),
     ('url-list-test @1.0.0', 'foo-1.0.0.tar.gz', 'abc100'),
@@ -191,3 +274,118 @@ def test_candidate_urls(pkg_factory, url, urls, version, expected):
     pkg = pkg_factory(url, urls)
     f = fs._from_merged_attrs(fs.URLFetchStrategy, pkg, version)
     assert f.candidate_urls == expected
+
+
+def test_urllib_fetch_reuses_connections(archive_server, tmpdir, config):
+    url, files, requests = archive_server
+    files['a.tar.gz'] = b'first archive'
+    files['b.tar.gz'] = b'second archive'
+
+    with spack.config.override('config:url_fetch_method', 'urllib'):
+        for i, name in enumerate(sorted(files)):
+            digest = hashlib.sha256(files[name]).hexdigest()
+            fetcher = fs.URLFetchStrategy(url + '/' + name, digest)
+            with Stage(fetcher, path=str(tmpdir.join(str(i)))):
+                fetcher.fetch()
+                fetcher.check()
+                with open(fetcher.archive_file, 'rb') as f:
+                    assert f.read() == files[name]
+
+    assert len(requests) == 2
+    assert len(set(client for client, _ in requests)) == 1
+
+
+def test_urllib_fetch_continues_partial_file(archive_server, tmpdir, config):
+    url, files, requests = archive_server
+    files['a.tar.gz'] = data = b'0123456789' * 1000
+    digest = hashlib.sha256(data).hexdigest()
+
+    fetcher = fs.URLFetchStrategy(url + '/a.tar.gz', digest)
+    with spack.config.override('config:url_fetch_method', 'urllib'):
+        with Stage(fetcher, path=str(tmpdir)) as stage:
+            with open(stage.save_filename + '.part', 'wb') as f:
+                f.write(data[:4000])
+
+            fetcher.fetch()
+            fetcher.check()
+            with open(fetcher.archive_file, 'rb') as f:
+                assert f.read() == data
+
+    assert [r for _, r in requests] == ['bytes=4000-']
+
+
+def test_urllib_fetch_checksum_error(archive_server, tmpdir, config):
+    url, files, _ = archive_server
+    files['a.tar.gz'] = b'not what was expected'
+
+    fetcher = fs.URLFetchStrategy(url + '/a.tar.gz', 'abc' * 21 + 'a')
+    with spack.config.override('config:url_fetch_method', 'urllib'):
+        with Stage(fetcher, path=str(tmpdir)):
+            fetcher.fetch()
+            with pytest.raises(fs.ChecksumError):
+                fetcher.check()
+
+
+def test_urllib_fetch_not_found(archive_server, tmpdir, config):
+    url, _, _ = archive_server
+
+    fetcher = fs.URLFetchStrategy(url + '/missing.tar.gz')
+    with spack.config.override('config:url_fetch_method', 'urllib'):
+        with Stage(fetcher, path=str(tmpdir)):
+            with pytest.raises(fs.FailedDownloadError):
+                fetcher.fetch()
+
+
+def test_check_reads_archive_once(tmpdir, mock_archive, monkeypatch):
+    """Ensure the archive is not read again once its digest is known."""
+    digest = crypto.checksum(hashlib.sha256, mock_archive.archive_file)
+
+    fetcher = fs.URLFetchStrategy(mock_archive.url, digest)
+    with Stage(fetcher, path=str(tmpdir)) as stage:
+        stage.fetch()
+        fetcher.check()
+
+        def fail(*args, **kwargs):
+            raise AssertionError('archive was checksummed again')
+        monkeypatch.setattr(crypto, 'checksum', fail)
+
+        fetcher.check()
+
+
+def test_urllib_fetch_expands_while_fetching(
+        archive_server, mock_archive, tmpdir, config, monkeypatch):
+    url, files, _ = archive_server
+    with open(mock_archive.archive_file, 'rb') as f:
+        files['a.tar.gz'] = f.read()
+    digest = hashlib.sha256(files['a.tar.gz']).hexdigest()
+
+    fetcher = fs.URLFetchStrategy(url + '/a.tar.gz', digest)
+    with spack.config.override('config:url_fetch_method', 'urllib'):
+        with spack.config.override('config:expand_method', 'python'):
+            with Stage(fetcher, path=str(tmpdir)) as stage:
+                fetcher.fetch()
+                assert os.path.isdir(fetcher._tarball_container)
+
+                def fail(*args, **kwargs):
+                    raise AssertionError('archive was extracted again')
+                monkeypatch.setattr(
+                    spack.util.compression, 'extract_archive', fail)
+
+                fetcher.check()
+                fetcher.expand()
+                assert is_exe(os.path.join(stage.source_path, 'configure'))
+
+
+def test_urllib_fetch_falls_back_to_expanding_archive(
+        archive_server, tmpdir, config):
+    """Data that isn't a tarball is not expanded while it's fetched."""
+    url, files, _ = archive_server
+    files['a.tar.gz'] = b'not a tarball'
+
+    fetcher = fs.URLFetchStrategy(url + '/a.tar.gz')
+    with spack.config.override('config:url_fetch_method', 'urllib'):
+        with spack.config.override('config:expand_method', 'python'):
+            with Stage(fetcher, path=str(tmpdir)):
+                fetcher.fetch()
+                assert not os.path.exists(fetcher._tarball_container)
+                assert fetcher._expanded_container is None
@@ -0,0 +1,98 @@
+# Copyright 2013-2020 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+"""Test archive extraction."""
+import io
+import os
+import tarfile
+
+import pytest
+
+from llnl.util.filesystem import is_exe
+from spack.util.compression import extract_archive, StreamingExtractor
+from spack.util.executable import which
+
+
+@pytest.fixture()
+def source_tree(tmpdir):
+    """A directory with an executable, a plain file and a link"""
+    src = tmpdir.ensure('src', dir=True)
+    src.ensure('sub', 'data.txt').write('data')
+    configure = src.join('configure')
+    configure.write('#!/bin/sh\n')
+    configure.chmod(0o755)
+    os.symlink(os.path.join('sub', 'data.txt'), str(src.join('link')))
+    return tmpdir
+
+
+def check_tree(path):
+    assert is_exe(os.path.join(path, 'src', 'configure'))
+    assert os.path.islink(os.path.join(path, 'src', 'link'))
+    with open(os.path.join(path, 'src', 'link')) as f:
+        assert f.read() == 'data'
+
+
+@pytest.mark.parametrize('native', [False, True])
+def test_extract_tarball(source_tree, native):
+    with source_tree.as_cwd():
+        which('tar', required=True)('czf', 'src.tar.gz', 'src')
+
+    dest = str(source_tree.join('dest'))
+    os.mkdir(dest)
+    extract_archive(str(source_tree.join('src.tar.gz')), dest, native=native)
+    check_tree(dest)
+
+
+@pytest.mark.parametrize('native', [False, True])
+def test_extract_zip(source_tree, native):
+    unzip = which('unzip')
+    zip = which('zip')
+    if not unzip or not zip:
+        pytest.skip('zip and unzip are required')
+    with source_tree.as_cwd():
+        zip('-qry', 'src.zip', 'src')
+
+    dest = str(source_tree.join('dest'))
+    os.mkdir(dest)
+    extract_archive(str(source_tree.join('src.zip')), dest, native=native)
+    check_tree(dest)
+
+
+def test_extract_skips_members_outside_destination(tmpdir):
+    archive = str(tmpdir.join('evil.tar'))
+    with tarfile.open(archive, 'w') as tar:
+        for name in ('../outside', '/absolute', 'link/escaped', 'inside'):
+            info = tarfile.TarInfo(name)
+            if name == 'link/escaped':
+                link = tarfile.TarInfo('link')
+                link.type = tarfile.SYMTYPE
+                link.linkname = str(tmpdir)
+                tar.addfile(link)
+            tar.addfile(info, io.BytesIO())
+
+    dest = tmpdir.ensure('dest', dir=True)
+    extract_archive(archive, str(dest), native=True)
+    assert sorted(os.listdir(str(dest))) == ['inside', 'link']
+    assert not tmpdir.join('outside').exists()
+    assert not tmpdir.join('escaped').exists()
+
+
+def test_streaming_extractor(source_tree):
+    with source_tree.as_cwd():
+        which('tar', required=True)('cjf', 'src.tar.bz2', 'src')
+
+    extractor = StreamingExtractor(str(source_tree.join('dest')))
+    with open(str(source_tree.join('src.tar.bz2')), 'rb') as f:
+        for chunk in iter(lambda: f.read(100), b''):
+            extractor.write(chunk)
+    assert extractor.close()
+    check_tree(str(source_tree.join('dest')))
+
+
+def test_streaming_extractor_error(tmpdir):
+    extractor = StreamingExtractor(str(tmpdir.join('dest')))
+    extractor.write(b'not a tarball' * 100000)
+    assert not extractor.close()
+    assert extractor.error
@@ -4,7 +4,12 @@
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
 import os
+import pytest
 
+from llnl.util.filesystem import mkdirp
+from llnl.util.link_tree import LinkTree
+
+import spack.filesystem_view
 from spack.spec import Spec
 from spack.directory_layout import YamlDirectoryLayout
 from spack.filesystem_view import YamlFilesystemView
@@ -41,3 +46,111 @@ def test_remove_extensions_ordered(install_mockery, mock_fetch, tmpdir):
 
     e1 = e2['extension1']
     view.remove_specs(e1, e2)
+
+
+def test_view_manifest(install_mockery, mock_fetch, tmpdir, monkeypatch):
+    view_dir = str(tmpdir.join('view'))
+    layout = YamlDirectoryLayout(view_dir)
+    view = YamlFilesystemView(view_dir, layout)
+    spec = Spec('libdwarf').concretized()
+    spec.package.do_install(fake=True)
+    os.makedirs(os.path.join(spec.prefix, 'share', 'libdwarf'))
+    view.add_specs(spec)
+    assert os.path.exists(view.manifest_path)
+
+    # Specs are listed and removed without reading their metadata or
+    # walking their prefix again
+    def fail(*args, **kwargs):
+        raise AssertionError('the view was scanned')
+    monkeypatch.setattr(spack.filesystem_view, 'get_spec_from_file', fail)
+    monkeypatch.setattr(LinkTree, 'get_file_map', fail)
+
+    view = YamlFilesystemView(view_dir, layout)
+    assert set(s.name for s in view.get_all_specs()) == set(
+        ['libdwarf', 'libelf'])
+    assert view.get_spec(spec) == spec
+
+    view.remove_specs(spec, with_dependents=False)
+    assert set(s.name for s in view.get_all_specs()) == set(['libelf'])
+    assert not os.path.exists(os.path.join(view_dir, 'bin', 'libdwarf'))
+    assert os.path.exists(os.path.join(view_dir, 'bin', 'libelf'))
+    assert not os.path.exists(os.path.join(view_dir, 'share', 'libdwarf'))
+    assert not os.path.exists(os.path.join(view_dir, '.spack', 'libdwarf'))
+
+
+def test_view_without_manifest(install_mockery, mock_fetch, tmpdir):
+    view_dir = str(tmpdir.join('view'))
+    layout = YamlDirectoryLayout(view_dir)
+    view = YamlFilesystemView(view_dir, layout)
+    spec = Spec('libdwarf').concretized()
+    spec.package.do_install(fake=True)
+    view.add_specs(spec)
+
+    # Views made before manifests are scanned for their specs
+    os.remove(view.manifest_path)
+    view = YamlFilesystemView(view_dir, layout)
+    assert set(s.name for s in view.get_all_specs()) == set(
+        ['libdwarf', 'libelf'])
+
+    view.remove_specs(spec, with_dependents=False)
+    assert not os.path.exists(os.path.join(view_dir, '.spack', 'libdwarf'))
+    assert os.path.exists(view.manifest_path)
+
+
+@pytest.mark.parametrize('link_type', ['copy', 'reflink'])
+def test_view_copy_relocates(install_mockery, mock_fetch, tmpdir, link_type):
+    view_dir = str(tmpdir.join('view'))
+    layout = YamlDirectoryLayout(view_dir)
+    view = YamlFilesystemView(view_dir, layout, link_type=link_type,
+                              projections={'all': '{name}'})
+    spec = Spec('libdwarf').concretized()
+    spec.package.do_install(fake=True)
+    pc_file = os.path.join(spec.prefix, 'lib', 'pkgconfig', 'libdwarf.pc')
+    mkdirp(os.path.dirname(pc_file))
+    with open(pc_file, 'w') as f:
+        f.write('prefix=%s\nRequires: %s/lib\n' % (
+            spec.prefix, spec['libelf'].prefix))
+    view.add_specs(spec)
+
+    copied = os.path.join(view_dir, 'libdwarf', 'lib', 'pkgconfig',
+                          'libdwarf.pc')
+    assert not os.path.islink(os.path.join(view_dir, 'libdwarf', 'bin',
+                                           'libdwarf'))
+    with open(copied) as f:
+        assert f.read() == 'prefix=%s\nRequires: %s/lib\n' % (
+            os.path.join(view_dir, 'libdwarf'),
+            os.path.join(view_dir, 'libelf'))
+
+    view.remove_specs(spec, with_dependents=False)
+    assert not os.path.exists(os.path.join(view_dir, 'libdwarf'))
+
+
+def test_view_copy_relocates_dependents(install_mockery, mock_fetch, tmpdir):
+    view_dir = str(tmpdir.join('view'))
+    layout = YamlDirectoryLayout(view_dir)
+    view = YamlFilesystemView(view_dir, layout, link_type='copy',
+                              projections={'all': '{name}'})
+    spec = Spec('libdwarf').concretized()
+    spec.package.do_install(fake=True)
+    libelf_prefix = spec['libelf'].prefix
+    pc_file = os.path.join(spec.prefix, 'lib', 'pkgconfig', 'libdwarf.pc')
+    mkdirp(os.path.dirname(pc_file))
+    with open(pc_file, 'w') as f:
+        f.write('Requires: %s/lib\n' % libelf_prefix)
+    os.symlink(os.path.join(libelf_prefix, 'bin', 'libelf'),
+               os.path.join(spec.prefix, 'bin', 'libelf'))
+
+    # Files copied before their dependencies are in the view are
+    # relocated when the dependencies are added
+    view.add_specs(spec, with_dependencies=False)
+    copied = os.path.join(view_dir, 'libdwarf', 'lib', 'pkgconfig',
+                          'libdwarf.pc')
+    with open(copied) as f:
+        assert f.read() == 'Requires: %s/lib\n' % libelf_prefix
+
+    view.add_specs(spec['libelf'])
+    with open(copied) as f:
+        assert f.read() == 'Requires: %s/lib\n' % os.path.join(
+            view_dir, 'libelf')
+    assert os.readlink(os.path.join(view_dir, 'libdwarf', 'bin', 'libelf')) \
+        == os.path.join(view_dir, 'libelf', 'bin', 'libelf')
@@ -5,11 +5,18 @@
 
 """Tests for web.py."""
 import os
+import socket
+import threading
+
 import pytest
 
 from ordereddict_backport import OrderedDict
+from six.moves import BaseHTTPServer, SimpleHTTPServer
 
+import spack.caches
 import spack.paths
+import spack.util.file_cache
+import spack.util.url as url_util
 import spack.util.web as web_util
 from spack.version import ver
 
@@ -106,6 +113,114 @@ def test_spider_3():
     assert page_4 in links
 
 
+@pytest.fixture()
+def web_server(monkeypatch):
+    """Serves the test web pages over HTTP and counts the connections."""
+    connections = []
+
+    class Handler(SimpleHTTPServer.SimpleHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep connections alive
+
+        def setup(self):
+            connections.append(self.client_address)
+            SimpleHTTPServer.SimpleHTTPRequestHandler.setup(self)
+
+        def log_message(self, *args):
+            pass
+
+    monkeypatch.setattr(web_util, '_page_cache', {})
+    cwd = os.getcwd()
+    os.chdir(web_data_path)
+    server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    try:
+        yield 'http://127.0.0.1:%d' % server.server_port, connections
+    finally:
+        server.shutdown()
+        server.server_close()
+        os.chdir(cwd)
+
+
+def test_spider_http_reuses_connections(web_server):
+    url, connections = web_server
+
+    pages, links = web_util.spider(url + '/index.html', depth=3,
+                                   concurrency=1)
+    assert len(pages) == 5
+    assert "This is page 4." in pages[url + '/4.html']
+    assert len(connections) == 1
+
+    # Pages are not fetched again in the same run
+    web_util.spider(url + '/index.html', depth=3, concurrency=1)
+    assert len(connections) == 1
+
+
+def test_spiders_share_request_limit(monkeypatch):
+    monkeypatch.setattr(web_util, '_page_cache', {})
+    active = []
+    most_active = []
+    spider_page = web_util._spider_page
+
+    def tracked_spider_page(*args):
+        active.append(None)
+        most_active.append(len(active))
+        try:
+            return spider_page(*args)
+        finally:
+            active.pop()
+    monkeypatch.setattr(web_util, '_spider_page', tracked_spider_page)
+
+    with web_util.request_limit(1):
+        versions = web_util.find_versions_of_archive(
+            root_tarball, root, list_depth=3)
+    assert ver('4.5') in versions
+    assert max(most_active) == 1
+    assert web_util._request_slots is None
+
+
+def test_probe_urls(web_server, monkeypatch, tmpdir):
+    url, _ = web_server
+    monkeypatch.setattr(web_util, '_unreachable_hosts', set())
+    monkeypatch.setattr(spack.caches, 'misc_cache',
+                        spack.util.file_cache.FileCache(str(tmpdir)))
+
+    # Find a port nothing listens on
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    down = 'http://127.0.0.1:%d/1.html' % sock.getsockname()[1]
+    sock.close()
+
+    times = web_util.probe_urls(
+        [url + '/1.html', url + '/missing.html', down, page_2])
+    assert times[url + '/1.html'] is not None
+    assert times[url + '/missing.html'] is None
+    assert times[down] is None
+    assert page_2 not in times
+
+    # The host that didn't answer is not probed again
+    assert web_util._unreachable_hosts == set([url_util.parse(down).netloc])
+
+    # Not even by another process, e.g. a forked build process
+    probed = []
+
+    def probe_down(req, **kwargs):
+        probed.append(req)
+        raise web_util.URLError('down')
+
+    monkeypatch.setattr(web_util, '_unreachable_hosts', set())
+    monkeypatch.setattr(web_util, '_urlopen', probe_down)
+    assert web_util.probe_urls([down]) == {down: None}
+    assert not probed
+
+    # Until the record expires
+    monkeypatch.setattr(web_util, '_unreachable_hosts', set())
+    monkeypatch.setattr(web_util, '_unreachable_hosts_expiry', 0)
+    web_util.probe_urls([down])
+    assert len(probed) == 1
+
+
 def test_find_versions_of_archive_0():
     versions = web_util.find_versions_of_archive(
         root_tarball, root, list_depth=0)
@@ -5,7 +5,14 @@
 
 import re
 import os
+import stat
+import tarfile
+import threading
+import zipfile
+from contextlib import closing
 from itertools import product
+
+from llnl.util.filesystem import mkdirp
 from spack.util.executable import which
 
 # Supported archive extensions.
@@ -17,6 +24,9 @@
 ALLOWED_ARCHIVE_TYPES = [".".join(l) for l in product(
     PRE_EXTS, EXTS)] + PRE_EXTS + EXTS + NOTAR_EXTS
 
+#: Size of the blocks read from a pipe when extracting a stream
+_chunk_size = 2 ** 20
+
 
 def allowed_archive(path):
     return any(path.endswith(t) for t in ALLOWED_ARCHIVE_TYPES)
@@ -37,6 +47,177 @@ def decompressor_for(path, extension=None):
     return tar
 
 
+def _is_zip(path, extension=None):
+    return bool((extension and re.match(r'\.?zip$', extension)) or
+                path.endswith('.zip'))
+
+
+def _is_gzip(extension=None):
+    return bool(extension and re.match(r'gz', extension))
+
+
+def extract_archive(path, destination, extension=None, native=False):
+    """Extract the archive at ``path`` into the ``destination`` directory.
+
+    Archives are extracted with ``tar`` or ``unzip``, or with Python's own
+    ``tarfile`` and ``zipfile`` modules if ``native`` is True.  Formats
+    those can't read (e.g. ``.Z``) are always extracted with ``tar``.
+    This never changes the working directory, so different threads can
+    extract archives at the same time.
+    """
+    if native and _extract_natively(path, destination, extension):
+        return
+
+    decompress = decompressor_for(path, extension)
+    if _is_zip(path, extension):
+        decompress(path, '-d', destination)
+    elif _is_gzip(extension):
+        # gunzip decompresses the file next to the archive
+        decompress(path)
+    else:
+        decompress(path, '-C', destination)
+
+
+def _extract_natively(path, destination, extension=None):
+    """Extract an archive with tarfile or zipfile; False if they can't."""
+    if _is_zip(path, extension):
+        if not zipfile.is_zipfile(path):
+            return False
+        with closing(zipfile.ZipFile(path)) as archive:
+            _extract_zip(archive, destination)
+        return True
+
+    if _is_gzip(extension):
+        return False
+
+    try:
+        archive = tarfile.open(path, 'r:*')
+    except (tarfile.ReadError, tarfile.CompressionError):
+        # e.g. .Z, or .xz without the lzma module
+        return False
+    with closing(archive):
+        _extract_tar(archive, destination)
+    return True
+
+
+def path_inside(destination, name, checked):
+    """Whether extracting the member ``name`` writes within ``destination``,
+    which must be a real path.
+
+    Like ``tar``, refuse absolute paths, ``..`` components, and paths that
+    lead outside through a symbolic link extracted earlier.  ``checked``
+    caches the parent directories already looked at.
+    """
+    if name.startswith('/') or '..' in name.split('/'):
+        return False
+    parent = os.path.dirname(os.path.normpath(name))
+    if parent not in checked:
+        real = os.path.realpath(os.path.join(destination, parent))
+        checked[parent] = (real == destination or
+                           real.startswith(destination + os.sep))
+    return checked[parent]
+
+
+def _extract_tar(tar, destination):
+    mkdirp(destination)
+    destination = os.path.realpath(destination)
+
+    def members():
+        checked = {}
+        for member in tar:
+            if not path_inside(destination, member.name, checked):
+                continue
+            if member.islnk() and not path_inside(
+                    destination, member.linkname, checked):
+                continue
+            if member.issym():
+                # A link may replace a directory checked before
+                checked.clear()
+            yield member
+
+    kwargs = {}
+    if hasattr(tarfile, 'fully_trusted_filter'):
+        # Members were checked above, don't let Python warn about it
+        kwargs['filter'] = 'fully_trusted'
+    tar.extractall(destination, members=members(), **kwargs)
+
+
+def _extract_zip(archive, destination):
+    mkdirp(destination)
+    destination = os.path.realpath(destination)
+
+    checked = {}
+    for info in archive.infolist():
+        if not path_inside(destination, info.filename, checked):
+            continue
+
+        # zipfile ignores the permissions and links that unzip restores
+        mode = info.external_attr >> 16 if info.create_system == 3 else 0
+        target = os.path.join(destination, info.filename)
+        if stat.S_ISLNK(mode):
+            mkdirp(os.path.dirname(target))
+            os.symlink(archive.read(info).decode('utf-8'), target)
+            checked.clear()
+            continue
+
+        archive.extract(info, destination)
+        if stat.S_ISREG(mode):
+            os.chmod(target, stat.S_IMODE(mode))
+
+
+def streamable(path, ext=None):
+    """Whether an archive can be extracted while it is being written.
+
+    This is the case for tarballs, see ``StreamingExtractor``.
+    """
+    ext = (ext or extension(path) or '').lower()
+    return 'tar' in ext or ext in ('tgz', 'tbz2', 'txz')
+
+
+class StreamingExtractor(object):
+    """Extracts a tarball in a background thread while it is written.
+
+    Pass the archive to ``write()`` chunk by chunk as it arrives, e.g. from
+    the network, and it is extracted into ``destination`` by the time it
+    is complete.  ``close()`` waits for the extraction and returns whether
+    it succeeded; if it didn't, extract the saved archive instead.
+    """
+
+    def __init__(self, destination):
+        self.destination = destination
+        self.error = None
+
+        read_fd, write_fd = os.pipe()
+        self._input = os.fdopen(read_fd, 'rb')
+        self._output = os.fdopen(write_fd, 'wb')
+        self._thread = threading.Thread(target=self._extract)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _extract(self):
+        try:
+            tar = tarfile.open(fileobj=self._input, mode='r|*')
+            with closing(tar):
+                _extract_tar(tar, self.destination)
+        except Exception as e:
+            self.error = e
+        finally:
+            # Drain the pipe so that write() never blocks after a failure
+            while self._input.read(_chunk_size):
+                pass
+            self._input.close()
+
+    def write(self, data):
+        self._output.write(data)
+
+    def close(self):
+        """Wait for the extraction to finish, True if it succeeded."""
+        if not self._output.closed:
+            self._output.close()
+        self._thread.join()
+        return self.error is None
+
+
 def strip_extension(path):
     """Get the part of a path that does not include its compressed
        type extension."""
@@ -41,6 +41,34 @@
 }
 
 
+def _shell_extend_commands(shell, name, separator, before, after):
+    """Returns commands that put ``before`` and ``after`` around the value
+    of a variable, joined by ``separator``."""
+    quoted_separator = cmd_quote(separator)
+    if shell == 'csh':
+        value = separator.join(x for x in (before, after) if x)
+        extended = quoted_separator.join(
+            x for x in (cmd_quote(before) if before else '',
+                        '"${{{0}}}"'.format(name),
+                        cmd_quote(after) if after else '') if x)
+        return ('if ( $?{0} ) then\n'
+                '    setenv {0} {1};\n'
+                'else\n'
+                '    setenv {0} {2};\n'
+                'endif\n').format(name, extended, cmd_quote(value))
+
+    # Use the separator next to the old value only if it isn't empty
+    if before:
+        extended = cmd_quote(before) + '"${{{0}:+{1}${{{0}}}}}"'.format(
+            name, separator)
+        if after:
+            extended += cmd_quote(separator + after)
+    else:
+        extended = '"${{{0}:+${{{0}}}{1}}}"'.format(name, separator) + \
+            cmd_quote(after)
+    return 'export {0}={1};\n'.format(name, extended)
+
+
 def is_system_path(path):
     """Predicate that given a path returns True if it is a system path,
     False otherwise.
@@ -296,6 +324,12 @@ def execute(self, env):
         env[self.name] = self.separator.join(directories)
 
 
+#: Types of modifications, by name
+_modifier_types = dict((cls.__name__, cls) for cls in (
+    SetEnv, AppendFlagsEnv, UnsetEnv, RemoveFlagsEnv, SetPath, AppendPath,
+    PrependPath, RemovePath, DeprioritizeSystemPaths, PruneDuplicatePaths))
+
+
 class EnvironmentModifications(object):
     """Keeps track of requests to modify the current environment.
 
@@ -463,6 +497,22 @@ def prune_duplicate_paths(self, name, **kwargs):
         item = PruneDuplicatePaths(name, **kwargs)
         self.env_modifications.append(item)
 
+    def to_list(self):
+        """Returns the modifications as a list of dictionaries, which can
+        be written as JSON or YAML.
+        """
+        return [{'type': type(x).__name__, 'args': dict(x.args)}
+                for x in self]
+
+    @staticmethod
+    def from_list(modifications):
+        """Returns the modifications in a list made by ``to_list()``."""
+        env = EnvironmentModifications()
+        for item in modifications:
+            cls = _modifier_types[item['type']]
+            env.env_modifications.append(cls(**item['args']))
+        return env
+
     def group_by_name(self):
         """Returns a dict of the modifications grouped by variable name.
 
@@ -556,6 +606,52 @@ def shell_modifications(self, shell='sh'):
                         name, cmd_quote(new_env[name]))
         return cmds
 
+    def shell_script(self, shell='sh'):
+        """Return shell code that applies the modifications to the
+        environment it runs in, which need not be the current one.
+
+        Raises:
+            ValueError: if some modification removes or reorders entries
+                of a variable, which can't be done without knowing its
+                value
+        """
+        unsupported = [x for x in self if isinstance(
+            x, (RemoveFlagsEnv, RemovePath, DeprioritizeSystemPaths))]
+        if unsupported:
+            raise ValueError('cannot write a script that modifies {0}'.format(
+                ', '.join(sorted(set(x.name for x in unsupported)))))
+
+        # Stand-ins for the values the variables will have, which can't
+        # appear in the values of real variables
+        modifications = self.group_by_name()
+        old_values = dict((name, '\0{0}\0'.format(name))
+                          for name in modifications)
+        new_env = dict(old_values)
+        for name, actions in sorted(modifications.items()):
+            for x in actions:
+                x.execute(new_env)
+
+        cmds = ''
+        for name, actions in sorted(modifications.items()):
+            new, old = new_env.get(name, None), old_values[name]
+            if new == old:
+                continue
+            if new is None:
+                cmds += _shell_unset_strings[shell].format(name)
+                continue
+
+            separator = actions[-1].separator
+            values = new.split(separator)
+            if old not in values:
+                cmds += _shell_set_strings[shell].format(name, cmd_quote(new))
+                continue
+
+            index = values.index(old)
+            cmds += _shell_extend_commands(
+                shell, name, separator, separator.join(values[:index]),
+                separator.join(values[index + 1:]))
+        return cmds
+
     @staticmethod
     def from_sourcing_file(filename, *arguments, **kwargs):
         """Constructs an instance of a
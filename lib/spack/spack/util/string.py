@@ -3,6 +3,8 @@
 #
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
+import re
+
 
 def comma_list(sequence, article=''):
     if type(sequence) != list:
@@ -55,3 +57,30 @@ def plural(n, singular, plural=None, show_n=True):
         return "%s%s" % (number, plural)
     else:
         return "%s%ss" % (number, singular)
+
+
+#: Multipliers of the unit suffixes accepted by parse_size()
+_size_units = {'': 1, 'k': 2 ** 10, 'm': 2 ** 20, 'g': 2 ** 30, 't': 2 ** 40}
+
+
+def parse_size(size):
+    """Convert a size like ``500M`` or ``10G`` to a number of bytes.
+
+    Arguments:
+        size (str or int): a number of bytes, optionally followed by a
+            ``K``, ``M``, ``G`` or ``T`` suffix (powers of 1024)
+
+    Returns:
+        (int): the size in bytes
+
+    Raises:
+        ValueError: if the size can't be parsed
+    """
+    if isinstance(size, int):
+        return size
+    match = re.match(r'^\s*(\d+(?:\.\d+)?)\s*([kmgt]?)(?:i?b)?\s*$',
+                     str(size), re.IGNORECASE)
+    if not match:
+        raise ValueError('Invalid size: %s' % size)
+    number, unit = match.groups()
+    return int(float(number) * _size_units[unit.lower()])
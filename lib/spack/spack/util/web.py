@@ -6,17 +6,24 @@
 from __future__ import print_function
 
 import codecs
+import contextlib
 import errno
 import re
 import os
 import os.path
 import shutil
+import socket
 import ssl
 import sys
+import threading
+import time
 import traceback
 
-from six.moves.urllib.request import urlopen, Request
-from six.moves.urllib.error import URLError
+from six.moves import http_client
+from six.moves.urllib.parse import urljoin
+from six.moves.urllib.request import (
+    urlopen, Request, getproxies, proxy_bypass)
+from six.moves.urllib.error import URLError, HTTPError
 import multiprocessing.pool
 
 try:
@@ -33,12 +40,14 @@ class HTMLParseError(Exception):
 from llnl.util.filesystem import mkdirp
 import llnl.util.tty as tty
 
+import spack
 import spack.cmd
 import spack.config
 import spack.error
 import spack.url
 import spack.util.crypto
 import spack.util.s3 as s3_util
+import spack.util.spack_json as sjson
 import spack.util.url as url_util
 
 from spack.util.compression import ALLOWED_ARCHIVE_TYPES
@@ -63,34 +72,6 @@ def handle_starttag(self, tag, attrs):
                     self.links.append(val)
 
 
-class NonDaemonProcess(multiprocessing.Process):
-    """Process that allows sub-processes, so pools can have sub-pools."""
-    @property
-    def daemon(self):
-        return False
-
-    @daemon.setter
-    def daemon(self, value):
-        pass
-
-
-if sys.version_info[0] < 3:
-    class NonDaemonPool(multiprocessing.pool.Pool):
-        """Pool that uses non-daemon processes"""
-        Process = NonDaemonProcess
-else:
-
-    class NonDaemonContext(type(multiprocessing.get_context())):
-        Process = NonDaemonProcess
-
-    class NonDaemonPool(multiprocessing.pool.Pool):
-        """Pool that uses non-daemon processes"""
-
-        def __init__(self, *args, **kwargs):
-            kwargs['context'] = NonDaemonContext()
-            super(NonDaemonPool, self).__init__(*args, **kwargs)
-
-
 def uses_ssl(parsed_url):
     if parsed_url.scheme == 'https':
         return True
@@ -113,8 +94,8 @@ def uses_ssl(parsed_url):
     ))(sys.version_info)
 
 
-def read_from_url(url, accept_content_type=None):
-    url = url_util.parse(url)
+def _ssl_context(url):
+    """SSL context to use for the given (parsed) URL, or None."""
     context = None
 
     verify_ssl = spack.config.get('config:verify_ssl')
@@ -134,7 +115,23 @@ def read_from_url(url, accept_content_type=None):
             # verification.
             context = ssl._create_unverified_context()
 
-    req = Request(url_util.format(url))
+    return context
+
+
+def read_from_url(url, accept_content_type=None, headers=None):
+    """Open a URL for reading.
+
+    Returns a tuple ``(url, headers, response)``.  If ``accept_content_type``
+    is given and the resource has another content type, all three values
+    are ``None``.  Extra request ``headers`` may be passed, e.g. to make a
+    conditional request with ``If-None-Match``; when the server answers
+    ``304 Not Modified`` the response is ``None`` but the URL and headers
+    are returned.
+    """
+    url = url_util.parse(url)
+    context = _ssl_context(url)
+
+    req = Request(url_util.format(url), headers=headers or {})
     content_type = None
     is_web_url = url.scheme in ('http', 'https')
     if accept_content_type and is_web_url:
@@ -154,6 +151,10 @@ def read_from_url(url, accept_content_type=None):
     try:
         response = _urlopen(req, timeout=_timeout, context=context)
     except URLError as err:
+        if getattr(err, 'code', None) == 304:
+            # Conditional request and the resource has not changed
+            return url_util.format(url), err.headers, None
+
         raise SpackWebError('Download failed: {ERROR}'.format(
             ERROR=str(err)))
 
@@ -334,73 +335,172 @@ def list_url(url):
             for key in _iter_s3_prefix(s3, url)))
 
 
-def _spider(url, visited, root, depth, max_depth, raise_on_error):
-    """Fetches URL and any pages it links to up to max_depth.
+class ConnectionCache(object):
+    """Keeps persistent HTTP(S) connections, one per host and thread.
 
-       depth should initially be zero, and max_depth is the max depth of
-       links to follow from the root.
+    Requests to a host reuse the connection, and so the TLS session, of
+    the previous request made to that host by the same thread.  Hosts
+    that must be reached through a proxy are not handled here; see
+    ``handles()``.
+    """
 
-       Prints out a warning only if the root can't be fetched; it ignores
-       errors with pages that the root links to.
+    #: Maximum number of redirects followed by a single request
+    max_redirects = 10
 
-       Returns a tuple of:
-       - pages: dict of pages visited (URL) mapped to their full text.
-       - links: set of links encountered while visiting the pages.
-    """
-    pages = {}     # dict from page URL -> text content.
-    links = set()  # set of all links seen on visited pages.
+    def __init__(self, timeout=None):
+        self.timeout = _timeout if timeout is None else timeout
+        self._local = threading.local()
+        self._all = []
+        self._lock = threading.Lock()
 
-    try:
-        response_url, _, response = read_from_url(url, 'text/html')
-        if not response_url or not response:
-            return pages, links
-
-        page = codecs.getreader('utf-8')(response).read()
-        pages[response_url] = page
-
-        # Parse out the links in the page
-        link_parser = LinkParser()
-        subcalls = []
-        link_parser.feed(page)
-
-        while link_parser.links:
-            raw_link = link_parser.links.pop()
-            abs_link = url_util.join(
-                response_url,
-                raw_link.strip(),
-                resolve_href=True)
-            links.add(abs_link)
-
-            # Skip stuff that looks like an archive
-            if any(raw_link.endswith(suf) for suf in ALLOWED_ARCHIVE_TYPES):
-                continue
+    @staticmethod
+    def handles(url):
+        """Whether requests for ``url`` can go through this cache."""
+        url = url_util.parse(url)
+        if url.scheme not in ('http', 'https'):
+            return False
+        return url.scheme not in getproxies() or proxy_bypass(url.hostname)
 
-            # Skip things outside the root directory
-            if not abs_link.startswith(root):
+    @property
+    def _connections(self):
+        if not hasattr(self._local, 'connections'):
+            self._local.connections = {}
+        return self._local.connections
+
+    def _connection(self, url):
+        key = (url.scheme, url.netloc)
+        if key not in self._connections:
+            context = _ssl_context(url)
+            if url.scheme == 'https' and context is not None:
+                conn = http_client.HTTPSConnection(
+                    url.netloc, timeout=self.timeout, context=context)
+            elif url.scheme == 'https':
+                conn = http_client.HTTPSConnection(
+                    url.netloc, timeout=self.timeout)
+            else:
+                conn = http_client.HTTPConnection(
+                    url.netloc, timeout=self.timeout)
+
+            self._connections[key] = conn
+            with self._lock:
+                self._all.append(conn)
+        return self._connections[key]
+
+    def discard(self, url):
+        """Close this thread's connection to the host of ``url``.
+
+        This must be called instead of reading the body of a response
+        that is not wanted, before the connection is used again.
+        """
+        url = url_util.parse(url)
+        conn = self._connections.pop((url.scheme, url.netloc), None)
+        if conn is not None:
+            conn.close()
+
+    def close(self):
+        """Close all the connections, from all threads."""
+        with self._lock:
+            for conn in self._all:
+                conn.close()
+            del self._all[:]
+
+    def _request(self, url, headers):
+        conn = self._connection(url)
+        path = url.path or '/'
+        if url.query:
+            path += '?' + url.query
+        conn.request('GET', path, headers=headers)
+        return conn.getresponse()
+
+    def urlopen(self, url, headers=None):
+        """Send a GET request for ``url``, following redirects.
+
+        Returns a tuple of the final URL and the response.  Raises
+        ``HTTPError`` for error responses and ``URLError`` if the host
+        cannot be reached.
+        """
+        request_headers = {'User-Agent': 'Spack/%s' % spack.spack_version}
+        request_headers.update(headers or {})
+
+        url = url_util.format(url)
+        for _ in range(self.max_redirects + 1):
+            parsed = url_util.parse(url)
+            try:
+                try:
+                    response = self._request(parsed, request_headers)
+                except (http_client.HTTPException, socket.error):
+                    # The server may have closed a kept-alive connection
+                    self.discard(parsed)
+                    response = self._request(parsed, request_headers)
+            except (http_client.HTTPException, socket.error) as e:
+                self.discard(parsed)
+                raise URLError(e)
+
+            if response.status in (301, 302, 303, 307, 308):
+                response.read()
+                url = urljoin(url, response.getheader('Location'))
                 continue
 
-            # Skip already-visited links
-            if abs_link in visited:
-                continue
+            if response.status >= 400:
+                response.read()
+                raise HTTPError(url, response.status, response.reason,
+                                response.msg, None)
 
-            # If we're not at max depth, follow links.
-            if depth < max_depth:
-                subcalls.append((abs_link, visited, root,
-                                 depth + 1, max_depth, raise_on_error))
-                visited.add(abs_link)
+            return url, response
 
-        if subcalls:
-            pool = NonDaemonPool(processes=len(subcalls))
-            try:
-                results = pool.map(_spider_wrapper, subcalls)
+        raise URLError('Too many redirects for %s' % url)
+
+
+#: Pages fetched by spider() during this run of Spack, by URL
+_page_cache = {}
+
+
+def _read_page(url, connections):
+    """Read an HTML page, using the connection cache when possible.
+
+    Returns the URL of the page after redirects and its text, or a pair of
+    ``None`` if the URL is not an HTML page.
+    """
+    if not connections.handles(url):
+        response_url, _, response = read_from_url(url, 'text/html')
+        if not response_url or not response:
+            return None, None
+        return response_url, codecs.getreader('utf-8')(response).read()
+
+    response_url, response = connections.urlopen(url)
+    content_type = response.getheader('Content-Type')
+    if content_type is None or not content_type.startswith('text/html'):
+        # Don't download what is not a web page
+        connections.discard(response_url)
+        tty.debug("ignoring page {0}{1}{2}".format(
+            response_url,
+            " with content type " if content_type is not None else "",
+            content_type or ""))
+        return None, None
 
-                for sub_pages, sub_links in results:
-                    pages.update(sub_pages)
-                    links.update(sub_links)
+    return response_url, response.read().decode('utf-8')
 
-            finally:
-                pool.terminate()
-                pool.join()
+
+def _spider_page(url, connections, raise_on_error):
+    """Fetches a single page for spider() and parses out its links.
+
+       Returns a tuple of:
+       - the URL of the page after redirects, or None on errors
+       - the text of the page
+       - the list of raw links on the page
+    """
+    key = url_util.format(url)
+    if key in _page_cache:
+        return _page_cache[key]
+
+    result = None, None, []
+    try:
+        response_url, page = _read_page(url, connections)
+        if response_url:
+            # Parse out the links in the page
+            link_parser = LinkParser()
+            link_parser.feed(page)
+            result = response_url, page, link_parser.links
 
     except URLError as e:
         tty.debug(e)
@@ -414,6 +514,9 @@ def _spider(url, visited, root, depth, max_depth, raise_on_error):
         if raise_on_error:
             raise NoNetworkConnectionError(str(e), url)
 
+        # Don't cache network errors, they may be transient
+        return result
+
     except HTMLParseError as e:
         # This error indicates that Python's HTML parser sucks.
         msg = "Got an error parsing HTML."
@@ -426,15 +529,11 @@ def _spider(url, visited, root, depth, max_depth, raise_on_error):
 
     except Exception as e:
         # Other types of errors are completely ignored, except in debug mode.
-        tty.debug("Error in _spider: %s:%s" % (type(e), e),
+        tty.debug("Error in spider: %s:%s" % (type(e), e),
                   traceback.format_exc())
 
-    return pages, links
-
-
-def _spider_wrapper(args):
-    """Wrapper for using spider with multiprocessing."""
-    return _spider(*args)
+    _page_cache[key] = result
+    return result
 
 
 def _urlopen(req, *args, **kwargs):
@@ -458,18 +557,204 @@ def _urlopen(req, *args, **kwargs):
     return opener(req, *args, **kwargs)
 
 
-def spider(root, depth=0):
+#: Hosts that did not answer a probe during this run of Spack
+_unreachable_hosts = set()
+
+#: Key of the misc_cache entry with the hosts that did not answer a probe,
+#: shared with other Spack processes such as forked build processes
+_unreachable_hosts_key = os.path.join('web', 'unreachable_hosts.json')
+
+#: Seconds during which a host that did not answer is not probed again
+_unreachable_hosts_expiry = 600
+
+
+def _recent(hosts):
+    now = time.time()
+    return dict((host, when) for host, when in hosts.items()
+                if 0 <= now - when < _unreachable_hosts_expiry)
+
+
+def _load_unreachable_hosts():
+    """Hosts recorded as unreachable by any Spack process, which have not
+    expired yet."""
+    import spack.caches
+    cache = spack.caches.misc_cache
+    if not cache.init_entry(_unreachable_hosts_key):
+        return {}
+    with cache.read_transaction(_unreachable_hosts_key) as f:
+        return _recent(sjson.load(f) or {})
+
+
+def _record_unreachable_hosts(hosts):
+    """Share ``hosts`` that did not answer with other Spack processes."""
+    import spack.caches
+    cache = spack.caches.misc_cache
+    cache.init_entry(_unreachable_hosts_key)
+    with cache.write_transaction(_unreachable_hosts_key) as (old, new):
+        recorded = _recent(sjson.load(old) or {}) if old else {}
+        now = time.time()
+        recorded.update((host, now) for host in hosts)
+        sjson.dump(recorded, new)
+
+
+def _probe_url(args):
+    """Send a HEAD request for ``url``.
+
+    Returns the response time in seconds, or ``None`` if the resource
+    can't be fetched.  Hosts that can't be reached are remembered.
+    """
+    url, timeout = args
+    parsed = url_util.parse(url)
+    if parsed.netloc in _unreachable_hosts:
+        return None
+
+    req = Request(url)
+    req.get_method = lambda: "HEAD"
+    start = time.time()
+    try:
+        _urlopen(req, timeout=timeout, context=_ssl_context(parsed)).close()
+    except HTTPError:
+        # The host answered, but doesn't have this resource
+        return None
+    except (URLError, socket.error, http_client.HTTPException) as e:
+        tty.debug('Could not reach {0}: {1}'.format(parsed.netloc, e))
+        _unreachable_hosts.add(parsed.netloc)
+        return None
+    return time.time() - start
+
+
+def probe_urls(urls, timeout=2, concurrency=None):
+    """Check concurrently which of ``urls`` can be downloaded.
+
+    Only HTTP(S) URLs are probed.  Hosts that don't answer within
+    ``timeout`` seconds are considered down, and are not probed again
+    for the rest of the session, nor by other Spack processes for
+    ``_unreachable_hosts_expiry`` seconds.
+
+    Returns:
+        dict: maps each probed URL to its response time in seconds, or
+            to ``None`` if it can't be fetched
+    """
+    urls = [u for u in urls
+            if url_util.parse(u).scheme in ('http', 'https')]
+    if not urls:
+        return {}
+
+    if concurrency is None:
+        concurrency = spack.config.get('config:download_jobs', 8)
+    _unreachable_hosts.update(_load_unreachable_hosts())
+    known = set(_unreachable_hosts)
+
+    pool = multiprocessing.pool.ThreadPool(
+        processes=max(1, min(concurrency, len(urls))))
+    try:
+        times = pool.map(_probe_url, [(u, timeout) for u in urls])
+    finally:
+        pool.terminate()
+        pool.join()
+
+    if _unreachable_hosts - known:
+        _record_unreachable_hosts(_unreachable_hosts - known)
+    return dict(zip(urls, times))
+
+
+#: Bounds the pages read at once by all spiders, see request_limit()
+_request_slots = None
+
+
+@contextlib.contextmanager
+def request_limit(concurrency):
+    """Context in which all spiders, e.g. running in different threads,
+    read at most ``concurrency`` pages at once in total."""
+    global _request_slots
+    saved = _request_slots
+    _request_slots = threading.BoundedSemaphore(concurrency)
+    try:
+        yield
+    finally:
+        _request_slots = saved
+
+
+def spider(root, depth=0, concurrency=None, raise_on_error=False):
     """Gets web pages from a root URL.
 
        If depth is specified (e.g., depth=2), then this will also follow
        up to <depth> levels of links from the root.
 
-       This will spawn processes to fetch the children, for much improved
-       performance over a sequential fetch.
+       Pages are fetched by a pool of at most ``concurrency`` threads
+       (``config:download_jobs`` by default), which keep their connections
+       to each host alive.  Pages are cached for the rest of the Spack run,
+       so spidering them again does not touch the network.  The pages read
+       at once are bounded further within ``request_limit()``.
+
+       Prints out a warning only if the root can't be fetched; it ignores
+       errors with pages that the root links to.
 
+       Returns a tuple of:
+       - pages: dict of pages visited (URL) mapped to their full text.
+       - links: set of links encountered while visiting the pages.
     """
     root = url_util.parse(root)
-    pages, links = _spider(root, set(), root, 0, depth, False)
+    if concurrency is None:
+        concurrency = spack.config.get('config:download_jobs', 8)
+
+    pages = {}     # dict from page URL -> text content.
+    links = set()  # set of all links seen on visited pages.
+    visited = set([url_util.format(root)])
+
+    request_slots = _request_slots
+
+    def spider_page(url):
+        if request_slots is None:
+            return _spider_page(url, connections, raise_on_error)
+        with request_slots:
+            return _spider_page(url, connections, raise_on_error)
+
+    connections = ConnectionCache()
+    pool = multiprocessing.pool.ThreadPool(processes=concurrency)
+    try:
+        urls = [root]
+        for current_depth in range(depth + 1):
+            results = pool.map(spider_page, urls)
+
+            urls = []
+            for response_url, page, raw_links in results:
+                if not response_url:
+                    continue
+                pages[response_url] = page
+
+                for raw_link in raw_links:
+                    abs_link = url_util.join(
+                        response_url,
+                        raw_link.strip(),
+                        resolve_href=True)
+                    links.add(abs_link)
+
+                    # Skip stuff that looks like an archive
+                    if any(raw_link.endswith(suf)
+                           for suf in ALLOWED_ARCHIVE_TYPES):
+                        continue
+
+                    # Skip things outside the root directory
+                    if not abs_link.startswith(root):
+                        continue
+
+                    # Skip already-visited links
+                    if abs_link in visited:
+                        continue
+
+                    # If we're not at max depth, follow links.
+                    if current_depth < depth:
+                        urls.append(abs_link)
+                        visited.add(abs_link)
+
+            if not urls:
+                break
+    finally:
+        pool.terminate()
+        pool.join()
+        connections.close()
+
     return pages, links
 
 
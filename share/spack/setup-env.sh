@@ -113,6 +113,13 @@ spack() {
                         then
                             # no args or args contain -h/--help, --sh, or --csh: just execute
                             command spack env activate "$@"
+                        elif [ -z "$_sp_flags" ] && [ $# -eq 1 ] && \
+                             [ -z "${SPACK_ENV+x}" ] && \
+                             _spack_env_activation_script "$1";
+                        then
+                            # the environment wrote its activation script
+                            # and hasn't changed since: source it
+                            . "$_sp_env_script"
                         else
                             # actual call to activate: source the output
                             eval $(command spack $_sp_flags env activate --sh "$@")
@@ -215,6 +222,32 @@ _spack_pathadd() {
 }
 
 
+########################################################################
+# Finds the script that an environment writes to activate itself, and
+# sets _sp_env_script to it if it is newer than the spack.yaml and the
+# spack.lock of the environment.
+#      _spack_env_activation_script ENV    # ENV is a name or a directory
+########################################################################
+_spack_env_activation_script() {
+    case "$1" in
+        -*) return 1 ;;
+        */*) _sp_env_dir="$1" ;;
+        *)
+            _sp_env_dir="$SPACK_ROOT/var/spack/environments/$1"
+            if [ ! -f "$_sp_env_dir/spack.yaml" ]; then
+                _sp_env_dir="$1"
+            fi
+            ;;
+    esac
+
+    _sp_env_script="$_sp_env_dir/.spack-env/activate.sh"
+    [ -f "$_sp_env_dir/spack.yaml" ] && \
+    [ "$_sp_env_script" -nt "$_sp_env_dir/spack.yaml" ] && \
+    { [ ! -f "$_sp_env_dir/spack.lock" ] || \
+      [ "$_sp_env_script" -nt "$_sp_env_dir/spack.lock" ]; }
+}
+
+
 # Determine which shell is being used
 _spack_determine_shell() {
     if [ -f "/proc/$$/exe" ]; then
@@ -167,7 +167,7 @@ _spack_buildcache () {
 _spack_buildcache_create () {
     if $list_options
     then
-        compgen -W "-h --help -r --rel -f --force -u --unsigned -a --allow-root -k --key -d --directory --no-rebuild-index -y --spec-yaml --no-deps" -- "$cur"
+        compgen -W "-h --help -r --rel -f --force -u --unsigned -a --allow-root -k --key -d --directory --no-rebuild-index --dedup -j --jobs -y --spec-yaml --no-deps" -- "$cur"
     else
         compgen -W "$(_all_packages)" -- "$cur"
     fi
@@ -240,7 +240,7 @@ _spack_cd () {
 _spack_checksum () {
     if $list_options
     then
-        compgen -W "-h --help --keep-stage" -- "$cur"
+        compgen -W "-h --help --keep-stage -b --batch" -- "$cur"
     else
         compgen -W "$(_all_packages)" -- "$cur"
     fi
@@ -249,7 +249,7 @@ _spack_checksum () {
 _spack_clean () {
     if $list_options
     then
-        compgen -W "-h --help -s --stage -d --downloads -m --misc-cache -p --python-cache -a --all" -- "$cur"
+        compgen -W "-h --help -s --stage -d --downloads --max-size -m --misc-cache -p --python-cache -a --all" -- "$cur"
     else
         compgen -W "$(_all_packages)" -- "$cur"
     fi
@@ -668,7 +668,7 @@ _spack_info () {
 _spack_install () {
     if $list_options
     then
-        compgen -W "-h --help --only -u --until -j --jobs --overwrite --keep-prefix --keep-stage --dont-restage --use-cache --no-cache --cache-only --show-log-on-error --source -n --no-checksum -v --verbose --fake --only-concrete -f --file --clean --dirty --test --run-tests --log-format --log-file --help-cdash -y --yes-to-all --cdash-upload-url --cdash-build --cdash-site --cdash-track --cdash-buildstamp" -- "$cur"
+        compgen -W "-h --help --only -u --until -j --jobs --overwrite --keep-prefix --keep-stage --dont-restage --use-cache --no-cache --cache-only --show-log-on-error --source -n --no-checksum -v --verbose --fake --only-concrete -p --parallel -f --file --clean --dirty --test --run-tests --log-format --log-file --help-cdash -y --yes-to-all --cdash-upload-url --cdash-build --cdash-site --cdash-track --cdash-buildstamp" -- "$cur"
     else
         compgen -W "$(_all_packages)" -- "$cur"
     fi
@@ -746,7 +746,7 @@ _spack_mirror () {
 _spack_mirror_create () {
     if $list_options
     then
-        compgen -W "-h --help -d --directory -a --all -f --file -D --dependencies -n --versions-per-spec" -- "$cur"
+        compgen -W "-h --help -d --directory -a --all -f --file -D --dependencies -n --versions-per-spec -j --jobs" -- "$cur"
     else
         compgen -W "$(_all_packages)" -- "$cur"
     fi
@@ -807,7 +807,7 @@ _spack_module_lmod () {
 _spack_module_lmod_refresh () {
     if $list_options
     then
-        compgen -W "-h --help --delete-tree --upstream-modules -y --yes-to-all" -- "$cur"
+        compgen -W "-h --help --delete-tree --upstream-modules -y --yes-to-all -j --jobs" -- "$cur"
     else
         compgen -W "$(_installed_packages)" -- "$cur"
     fi
@@ -862,7 +862,7 @@ _spack_module_tcl () {
 _spack_module_tcl_refresh () {
     if $list_options
     then
-        compgen -W "-h --help --delete-tree --upstream-modules -y --yes-to-all" -- "$cur"
+        compgen -W "-h --help --delete-tree --upstream-modules -y --yes-to-all -j --jobs" -- "$cur"
     else
         compgen -W "$(_installed_packages)" -- "$cur"
     fi
@@ -1185,7 +1185,7 @@ _spack_verify () {
 _spack_versions () {
     if $list_options
     then
-        compgen -W "-h --help -s --safe-only" -- "$cur"
+        compgen -W "-h --help -s --safe-only -j --json" -- "$cur"
     else
         compgen -W "$(_all_packages)" -- "$cur"
     fi
@@ -1196,7 +1196,7 @@ _spack_view () {
     then
         compgen -W "-h --help -v --verbose -e --exclude -d --dependencies" -- "$cur"
     else
-        compgen -W "symlink add soft hardlink hard remove rm statlink status check" -- "$cur"
+        compgen -W "symlink add soft hardlink hard copy relocate reflink clone remove rm statlink status check" -- "$cur"
     fi
 }
 
@@ -1229,6 +1229,30 @@ _spack_view_hard () {
     _spack_view_hardlink
 }
 
+_spack_view_copy () {
+    if $list_options
+    then
+        compgen -W "-h --help --projection-file -i --ignore-conflicts" -- "$cur"
+    fi
+}
+
+_spack_view_relocate () {
+    # Alias for `spack view copy`
+    _spack_view_copy
+}
+
+_spack_view_reflink () {
+    if $list_options
+    then
+        compgen -W "-h --help --projection-file -i --ignore-conflicts" -- "$cur"
+    fi
+}
+
+_spack_view_clone () {
+    # Alias for `spack view reflink`
+    _spack_view_reflink
+}
+
 _spack_view_remove () {
     if $list_options
     then